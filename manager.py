@@ -14,7 +14,6 @@ elif load_dotenv(find_dotenv()) and not os.getenv("TODOIST_API_KEY"):
 
 from typing import TypedDict, Sequence
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from langchain_core.load import dumps
 from langgraph.graph import StateGraph
 from src.tools.tools_project_manager import add_task, modify_task, finish_project_planning, reorder_tasks
 from src.tools.tools_coder_pipeline import (
@@ -37,14 +36,19 @@ from src.utilities.langgraph_common_functions import (
 from src.utilities.start_project_functions import set_up_dot_clean_coder_dir
 from src.utilities.llms import init_llms_medium_intelligence
 from src.utilities.print_formatters import print_formatted
+from src.utilities.tracing import traced
+from src.utilities.context_window import ContextWindow
 from src.tools.rag.retrieval import vdb_available
-import json
 import os
 import uuid
 
 
 class AgentState(TypedDict):
     messages: Sequence[BaseMessage]
+    # bookkeeping updated by call_model and call_tool, so steps do not scan all messages
+    last_ai_message: BaseMessage
+    last_tool_message: BaseMessage
+    wrong_tool_calls_in_row: int
 
 
 class Manager:
@@ -58,16 +62,18 @@ class Manager:
 
         self.tools = self.prepare_tools()
         self.llms = init_llms_medium_intelligence(tools=self.tools, run_name="Manager")
+        self.context_window = ContextWindow()
         self.manager = self.setup_workflow()
-        self.saved_messages_path = join_paths(self.work_dir, ".clean_coder/manager_messages.json")
+        self.saved_messages_path = join_paths(self.work_dir, ".clean_coder/manager_messages.jsonl")
 
+    @traced("node")
     def call_model_manager(self, state):
         save_state_history_to_disk(state, self.saved_messages_path)
-        state = call_model(state, self.llms)
-        state = self.cut_off_context(state)
+        state = call_model(state, self.llms, context_window=self.context_window)
+        # history is trimmed too, so it does not grow without limits in long sessions
+        state["messages"] = self.context_window.fit(state["messages"])
 
-        ai_messages = [msg for msg in state["messages"] if msg.type == "ai"]
-        last_ai_message = ai_messages[-1]
+        last_ai_message = state["last_ai_message"]
         # in case model will return empty message (that strange thing happens for 3.5 and 3.7 sonnet after task execution),
         # we will replace it with tool call message to go with next task
         if not last_ai_message.content and not last_ai_message.tool_calls:
@@ -83,6 +89,7 @@ class Manager:
                     }
                 ]
             ))
+            state["last_ai_message"] = state["messages"][-1]
         state = call_tool(state, self.tools)
         if len(last_ai_message.tool_calls) == 0:
             state["messages"].append(HumanMessage(content=no_tools_msg))
@@ -101,37 +108,8 @@ class Manager:
         return "tool"
 
     # just functions
-    def cut_off_context(self, state):
-        """
-        Trims the message history in the state to keep only the most recent context for the agent.
-        Keeps the last ~30 messages, starting from the most recent 'ai' message, and always includes the system message at the beginning.
-        """
-        approx_nr_msgs_to_save = 30
-        if len(state["messages"]) > approx_nr_msgs_to_save:
-            last_messages = state["messages"][-approx_nr_msgs_to_save:]
-
-            # Find the index of the first 'ai' message from the end in the last 30 messages
-            ai_message_index_in_last_msgs = next(
-                (i for i, message in enumerate(last_messages) if message.type == "ai"), None
-            )
-            # Calculate the actual index of the 'ai' message in the original list
-            ai_message_index = len(state["messages"]) - approx_nr_msgs_to_save + ai_message_index_in_last_msgs
-            # Collect all messages starting from the 'ai' message
-            last_messages_excluding_system = [
-                msg for msg in state["messages"][ai_message_index:] if msg.type != "system"
-            ]
-
-            system_message = state["messages"][0]
-            state["messages"] = [system_message] + last_messages_excluding_system
-
-        return state
-
     def save_messages_to_disk(self, state):
-        # remove system message
-        messages = state["messages"][1:]
-        messages_string = dumps(messages)
-        with open(self.saved_messages_path, "w") as f:
-            json.dump(messages_string, f)
+        save_state_history_to_disk(state, self.saved_messages_path)
 
     def prepare_tools(self):
         list_dir = prepare_list_dir_tool(self.work_dir)
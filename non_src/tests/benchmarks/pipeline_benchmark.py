@@ -0,0 +1,331 @@
+"""
+End-to-end benchmark of the pipeline on synthetic repositories. LLMs are replaced with canned responses (cassette
+replay, see src/utilities/llm_cassette.py), Chroma's embedding model with deterministic hashed bag of words, and
+human approves every step, so the numbers show where Clean Coder itself spends time: indexing, retrieval,
+research, planning, execution and debugging. Nothing is downloaded, so the benchmark runs offline.
+
+For every step reports wall time, its split between LLM wait and local overhead, number of LLM calls, bytes of
+prompts sent and peak Python memory. Results are saved as JSON, to compare releases.
+
+Usage:
+    python non_src/tests/benchmarks/pipeline_benchmark.py --sizes 100 1000 10000 --output benchmark.json
+
+Every repository size runs in its own process, as agents read WORK_DIR when imported.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+repo_directory = Path(__file__).parents[3].resolve()
+sys.path.append(str(repo_directory))
+
+TASK = "Add docstring to the user registration module."
+RETRIEVAL_QUERY = "Where is the user registration logic?"
+FILES_PER_FOLDER = 25
+TARGET_FILE = "pkg_0/sub_0/module_0.py"
+EMBEDDING_DIMENSIONS = 256
+WORDS = ["user", "order", "invoice", "payment", "session", "report", "cache", "queue", "profile", "token"]
+
+
+def module_code(index, rng):
+    """Code of synthetic module, around 40 lines, with a few functions and a class."""
+    noun, other = rng.sample(WORDS, 2)
+    lines = [f'"""Module {index}: {noun} handling."""', "import os", "import json", ""]
+    for number in range(3):
+        lines += [
+            f"def process_{noun}_{number}(data, limit={rng.randint(1, 100)}):",
+            f'    """Process {noun} data with {other} lookup."""',
+            "    result = []",
+            "    for item in data[:limit]:",
+            f"        if item.get('{other}'):",
+            "            result.append(item)",
+            "    return result",
+            "",
+        ]
+    lines += [
+        f"class {noun.capitalize()}{index}:",
+        "    def __init__(self, path):",
+        "        self.path = path",
+        "",
+        "    def load(self):",
+        "        with open(self.path) as f:",
+        "            return json.load(f)",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def generate_repo(work_dir, n_files, seed=0):
+    """Write n_files python modules into work_dir, FILES_PER_FOLDER per folder, in two levels of folders."""
+    rng = random.Random(seed)
+    for index in range(n_files):
+        folder = Path(work_dir, f"pkg_{index // FILES_PER_FOLDER ** 2}", f"sub_{index // FILES_PER_FOLDER % FILES_PER_FOLDER}")
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"module_{index}.py").write_text(module_code(index, rng), encoding="utf-8")
+    Path(work_dir, ".coderrules").write_text("Synthetic project for benchmarking.", encoding="utf-8")
+
+
+def tool_call_message(name, args, call_id):
+    return {
+        "type": "ai",
+        "data": {
+            "content": "",
+            "tool_calls": [{"name": name, "args": args, "id": call_id, "type": "tool_call"}],
+        },
+    }
+
+
+def text_message(content):
+    return {"type": "ai", "data": {"content": content}}
+
+
+def canned_interactions():
+    """Scripted LLM responses of every agent, in order of calls. Describer and ranker answer always the same."""
+    target_line = module_code(0, random.Random(0)).splitlines()[0]
+    plan = f"1. In {TARGET_FILE} extend the module docstring:\n```python\n{target_line[:-3]} Registration logic.\"\"\"\n```"
+    scripted = [
+        ("Researcher", tool_call_message("see_file", {"filename": TARGET_FILE}, "research_1")),
+        (
+            "Researcher",
+            tool_call_message(
+                "final_response_researcher",
+                {"files_to_work_on": [TARGET_FILE], "reference_files": [], "template_images": []},
+                "research_2",
+            ),
+        ),
+        ("Planner", text_message("Logic: extend the module docstring of the registration module.")),
+        ("Plan finalizer", text_message(plan)),
+        (
+            "Executor",
+            tool_call_message(
+                "replace_code",
+                {
+                    "filename": TARGET_FILE,
+                    "start_line": 1,
+                    "end_line": 1,
+                    "code": f'{target_line[:-3]} Registration logic."""',
+                },
+                "execute_1",
+            ),
+        ),
+        ("Executor", tool_call_message("final_response_executor", {"test_instruction": "Read the docstring."}, "execute_2")),
+        ("Debugger", tool_call_message("see_file", {"filename": TARGET_FILE}, "debug_1")),
+        ("Debugger", tool_call_message("final_response_debugger", {"test_instruction": "Read the docstring."}, "debug_2")),
+    ]
+    interactions = [{"run_name": run_name, "key": None, "response": response} for run_name, response in scripted]
+    interactions.append(
+        {"run_name": "File Describer", "key": None, "repeat": True, "response": text_message("Module processing user data.")}
+    )
+    interactions.append(
+        {
+            "run_name": "BinaryRanker",
+            "key": None,
+            "repeat": True,
+            "response": tool_call_message(
+                "BinaryRankingResult", {"reasoning": "Module handles users.", "is_relevant": True}, "rank_1"
+            ),
+        }
+    )
+    return interactions
+
+
+def write_cassette(path):
+    with open(path, "w", encoding="utf-8") as f:
+        for interaction in canned_interactions():
+            f.write(json.dumps(interaction) + "\n")
+
+
+def hashing_embedding_function():
+    """
+    Chroma embedding function hashing words into EMBEDDING_DIMENSIONS buckets. Deterministic and local, so indexing
+    and retrieval do not depend on downloading the default embedding model, while their cost stays realistic.
+    """
+    import numpy as np
+    from chromadb.api.types import EmbeddingFunction
+
+    class HashingEmbeddingFunction(EmbeddingFunction):
+        def __init__(self):
+            pass
+
+        @staticmethod
+        def name():
+            return "benchmark_hashing"
+
+        def get_config(self):
+            return {}
+
+        @staticmethod
+        def build_from_config(config):
+            return HashingEmbeddingFunction()
+
+        def __call__(self, input):
+            embeddings = []
+            for text in input:
+                vector = np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+                for word in re.findall(r"\w+", text.lower()):
+                    vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % EMBEDDING_DIMENSIONS] += 1.0
+                norm = np.linalg.norm(vector)
+                embeddings.append(vector / norm if norm else vector)
+            return embeddings
+
+    return HashingEmbeddingFunction()
+
+
+def busy_time(calls):
+    """Wall time during which at least one LLM call was pending (calls of concurrent steps overlap)."""
+    total = 0.0
+    covered_until = None
+    for call in sorted(calls, key=lambda call: call["started"]):
+        end = call["started"] + call["seconds"]
+        if covered_until is None or call["started"] >= covered_until:
+            total += call["seconds"]
+        elif end > covered_until:
+            total += end - covered_until
+        covered_until = end if covered_until is None else max(covered_until, end)
+    return total
+
+
+def run_worker(work_dir, result_path):
+    """Run all steps against work_dir (already set as WORK_DIR) and write their measurements to result_path."""
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    # human approves every change and plan
+    sys.stdin = io.StringIO("ok\n" * 10000)
+
+    from src.utilities.llm_cassette import Cassette
+    from src.utilities.objects import CodeFile
+    from src.utilities.start_project_functions import set_up_dot_clean_coder_dir
+
+    set_up_dot_clean_coder_dir(work_dir)
+    from src.tools.rag.index_file_descriptions import collect_files_to_describe, write_and_index_descriptions
+    from src.tools.rag.retrieval import ChromaRegistry, retrieve
+    from src.agents.researcher_agent import Researcher
+    from src.agents.planner_agent import planning
+    from src.agents.executor_agent import Executor
+    from src.agents.debugger_agent import Debugger
+
+    ChromaRegistry.embedding_function = hashing_embedding_function()
+    cassette = Cassette.for_path(os.environ["LLM_CASSETTE"], "replay")
+    steps = {}
+
+    def measure(name, function):
+        calls_before = len(cassette.calls)
+        tracemalloc.start()
+        start = time.perf_counter()
+        result, error = None, None
+        try:
+            result = function()
+        except (Exception, SystemExit) as e:
+            error = f"{type(e).__name__}: {e}"
+        wall = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        calls = cassette.calls[calls_before:]
+        llm_wait = busy_time(calls)
+        steps[name] = {
+            "wall_seconds": round(wall, 4),
+            "llm_wait_seconds": round(llm_wait, 4),
+            "local_seconds": round(max(wall - llm_wait, 0.0), 4),
+            "llm_calls": len(calls),
+            "prompt_bytes": sum(call["prompt_bytes"] for call in calls),
+            "peak_memory_bytes": peak,
+            "error": error,
+        }
+        return result
+
+    measure("write_and_index_descriptions", lambda: write_and_index_descriptions(collect_files_to_describe(work_dir)))
+    measure("retrieve", lambda: retrieve(RETRIEVAL_QUERY))
+    research = measure("research_task", lambda: Researcher(silent=True, task_id="benchmark").research_task(TASK))
+    files, image_paths = research or ({CodeFile(TARGET_FILE)}, [])
+    plan = measure("planning", lambda: planning(TASK, files, image_paths, work_dir)) or ""
+    files = measure("executor_do_task", lambda: Executor(files, work_dir).do_task(TASK, plan)) or files
+    measure("debugger_do_task", lambda: Debugger(files, work_dir, "Looks good.", []).do_task(TASK, plan))
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump({"steps": steps, "max_rss_bytes": max_rss if sys.platform == "darwin" else max_rss * 1024}, f)
+
+
+def benchmark_size(n_files, latency):
+    """Generate repository of n_files and run the benchmark on it in a separate process."""
+    with tempfile.TemporaryDirectory(prefix=f"clean_coder_benchmark_{n_files}_") as tmp_dir:
+        work_dir = os.path.join(tmp_dir, "project")
+        generate_repo(work_dir, n_files)
+        cassette_path = os.path.join(tmp_dir, "cassette.jsonl")
+        write_cassette(cassette_path)
+        result_path = os.path.join(tmp_dir, "result.json")
+        env = dict(
+            os.environ,
+            WORK_DIR=work_dir,
+            LLM_CASSETTE=cassette_path,
+            LLM_CASSETTE_MODE="replay",
+            LLM_REPLAY_LATENCY=latency,
+        )
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, __file__, "--worker", work_dir, "--result", result_path],
+            cwd=repo_directory,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0 or not os.path.exists(result_path):
+            return {"files": n_files, "error": process.stderr[-2000:]}
+        with open(result_path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        return {"files": n_files, "total_wall_seconds": round(time.perf_counter() - start, 4), **result}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=repo_directory, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Clean Coder pipeline on synthetic repositories.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="Numbers of files.")
+    parser.add_argument("--latency", default="0", help="Synthetic LLM latency in seconds, e.g. 1.5 or 0.5-3.")
+    parser.add_argument("--output", default="benchmark.json", help="Path of JSON file with results.")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.result)
+        return
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "llm_latency": args.latency,
+        "repositories": [],
+    }
+    for n_files in args.sizes:
+        print(f"Benchmarking repository of {n_files} files...")
+        results["repositories"].append(benchmark_size(n_files, args.latency))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from src.utilities import blob_store
+from src.utilities.blob_store import BlobStore, blob_dir_for
+from src.utilities.message_log import MessageLog
+from src.utilities.util_functions import load_state_history_from_disk, save_state_history_to_disk
+
+
+@pytest.fixture(autouse=True)
+def fresh_stores(monkeypatch):
+    monkeypatch.setattr(MessageLog, "instances", {})
+    monkeypatch.setattr(BlobStore, "instances", {})
+
+
+def blob_files(folder):
+    return [fname for prefix in os.listdir(folder) for fname in os.listdir(os.path.join(folder, prefix))]
+
+
+def test_file_contents_are_stored_once_for_all_histories(tmp_path):
+    clean_coder_dir = tmp_path / ".clean_coder"
+    file_contents = "def main():\n    pass\n" * 500
+    manager_path = str(clean_coder_dir / "manager_messages.jsonl")
+    research_path = str(clean_coder_dir / "research_histories" / "research_history_task_1.jsonl")
+    for path in (manager_path, research_path):
+        messages = [SystemMessage(content="system"), HumanMessage(content=file_contents, contains_file_contents=True)]
+        save_state_history_to_disk({"messages": messages}, path)
+
+    assert blob_dir_for(research_path) == str(clean_coder_dir / "blobs")
+    assert len(blob_files(clean_coder_dir / "blobs")) == 1
+    assert os.path.getsize(research_path) < 300
+
+    MessageLog.instances, BlobStore.instances = {}, {}
+    restored = load_state_history_from_disk(research_path)
+    assert restored[0].content == file_contents and restored[0].contains_file_contents
+
+
+def test_unreferenced_blobs_are_removed(tmp_path, monkeypatch):
+    store = BlobStore.for_dir(str(tmp_path / "blobs"))
+    history_path = tmp_path / "history.jsonl"
+    kept_key = store.put("kept " * 1000)
+    store.put("removed " * 1000)
+    history_path.write_text(f'{{"message": {{"data": {{"content": {{"$blob": "{kept_key}"}}}}}}}}\n')
+
+    store.remove_unreferenced([str(history_path)])
+    assert len(blob_files(store.folder)) == 2
+
+    monkeypatch.setattr(blob_store, "UNREFERENCED_GRACE_SECONDS", -1)
+    store.remove_unreferenced([str(history_path)])
+    assert [fname.split(".")[0] for fname in blob_files(store.folder)] == [kept_key]
+
+
+def test_tool_results_below_threshold_stay_in_history(tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    short = ToolMessage(content="ok", tool_call_id="call_1")
+    save_state_history_to_disk({"messages": [SystemMessage(content="system"), short]}, path)
+    assert not os.path.exists(tmp_path / "blobs")
+    assert '"content": "ok"' in open(path).read()
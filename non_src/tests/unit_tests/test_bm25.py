@@ -0,0 +1,43 @@
+from src.tools.rag.bm25 import BM25, tokenize
+
+
+def test_tokenize_splits_identifiers():
+    tokens = tokenize("getUserProfile and get_user_profile")
+    assert "getuserprofile" in tokens
+    assert "get_user_profile" in tokens
+    assert tokens.count("profile") == 2
+
+
+def test_tokenize_keeps_css_classes_and_paths():
+    tokens = tokenize(".btn-primary /api/users")
+    assert {"btn-primary", "btn", "primary", "api", "users"} <= set(tokens)
+
+
+def test_exact_identifier_scores_highest():
+    bm25 = BM25(
+        [
+            "Endpoint returning profile of user, implemented in getUserProfile.",
+            "Styles of primary buttons.",
+            "Database migrations.",
+        ]
+    )
+    scores = bm25.scores("getUserProfile")
+    assert scores[0] > 0
+    assert scores[1] == scores[2] == 0
+
+
+def test_empty_corpus():
+    assert BM25([]).scores("anything") == []
+
+
+def test_search_after_adding_and_removing_documents():
+    bm25 = BM25()
+    bm25.add("src/auth.py", "Login endpoint /api/login")
+    bm25.add("src/users.py", "User profile endpoint /api/users")
+    assert bm25.search("login", 5) == ["src/auth.py"]
+
+    bm25.add("src/auth.py", "Logout endpoint")
+    assert bm25.search("login", 5) == []
+    bm25.remove("src/users.py")
+    assert bm25.search("users", 5) == []
+    assert bm25.postings.keys() == {"logout", "endpoint"}
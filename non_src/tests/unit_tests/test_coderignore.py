@@ -0,0 +1,76 @@
+import os
+
+import pytest
+from src.utilities.start_work_functions import CoderIgnore, Work, dir_ignored, file_folder_ignored, walk_not_ignored
+
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    """Fixture providing a work directory with .coderignore, and CoderIgnore state reset around the test."""
+    (tmp_path / ".clean_coder").mkdir()
+    (tmp_path / ".clean_coder" / ".coderignore").write_text("# comment\nnode_modules/\n*.log\nbuild\nsrc/secret.py\n")
+    monkeypatch.setattr(Work, "work_dir", str(tmp_path))
+    monkeypatch.setattr(CoderIgnore, "spec", None)
+    monkeypatch.setattr(CoderIgnore, "results", {})
+    monkeypatch.setattr(CoderIgnore, "MTIME_CHECK_INTERVAL", 0)
+    return tmp_path
+
+
+def test_matching(work_dir):
+    assert CoderIgnore.get_forbidden() == ["node_modules/", "*.log", "build", "src/secret.py"]
+    assert file_folder_ignored("node_modules")
+    assert file_folder_ignored("node_modules/")
+    assert file_folder_ignored("logs/debug.log")
+    assert file_folder_ignored("src/build")
+    assert file_folder_ignored("src/secret.py")
+    assert not file_folder_ignored("src/main.py")
+    assert not file_folder_ignored("secret.py")
+
+
+def test_patterns_recompiled_when_coderignore_changes(work_dir):
+    assert not file_folder_ignored("src/main.py")
+    assert CoderIgnore.results == {"src/main.py": False}
+
+    coderignore = work_dir / ".clean_coder" / ".coderignore"
+    coderignore.write_text("src/\n")
+    stat = coderignore.stat()
+    os.utime(coderignore, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert file_folder_ignored("src/main.py")
+    assert CoderIgnore.get_forbidden() == ["src/"]
+
+
+def test_walk_does_not_enter_ignored_directories(work_dir, monkeypatch):
+    for path in ["src/main.py", "src/secret.py", "src/build/out.py", "node_modules/lib/index.js", "debug.log"]:
+        (work_dir / path).parent.mkdir(parents=True, exist_ok=True)
+        (work_dir / path).write_text("")
+
+    checked_dirs = []
+    monkeypatch.setattr(
+        "src.utilities.start_work_functions.dir_ignored",
+        lambda path: checked_dirs.append(path) or dir_ignored(path),
+    )
+    walked = {rel_root: sorted(files) for _, _, files, rel_root in walk_not_ignored(str(work_dir))}
+
+    assert walked == {".": [], ".clean_coder": [".coderignore"], "src": ["main.py"]}
+    # content of ignored directories is never listed
+    assert "node_modules/lib" not in checked_dirs
+    assert "src/build" in checked_dirs
+
+
+def test_anchored_directory_pattern_prunes_only_its_directory(work_dir):
+    (work_dir / ".clean_coder" / ".coderignore").write_text("/dist\nsrc/generated\n")
+    for path in ["dist/bundle.js", "pkg/dist/index.py", "src/generated/models.py", "lib/src/generated/api.py"]:
+        (work_dir / path).parent.mkdir(parents=True, exist_ok=True)
+        (work_dir / path).write_text("")
+
+    walked = {
+        os.path.join(rel_root, f).replace(os.sep, "/")
+        for _, _, files, rel_root in walk_not_ignored(str(work_dir))
+        for f in files
+        if not rel_root.startswith(".clean_coder")
+    }
+    assert walked == {"pkg/dist/index.py", "lib/src/generated/api.py"}
+    # pruning agrees with checks of single files
+    assert all(not file_folder_ignored(path) for path in walked)
+    assert file_folder_ignored("dist/bundle.js") and file_folder_ignored("src/generated/models.py")
@@ -0,0 +1,67 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from src.utilities.context_window import ContextWindow, Tokenizer
+
+
+@pytest.fixture(autouse=True)
+def char_tokenizer(monkeypatch):
+    # 4 characters per token estimate, as without tiktoken encoding files
+    monkeypatch.setattr(Tokenizer, "encoding", None)
+    monkeypatch.setattr(Tokenizer, "loaded", True)
+    monkeypatch.setattr(Tokenizer, "cache", Tokenizer.cache.__class__())
+
+
+def see_file_exchange(nr, output_size):
+    call = {"name": "see_file", "args": {"filename": f"file_{nr}.py"}, "id": f"call_{nr}", "type": "tool_call"}
+    return [
+        AIMessage(content="", tool_calls=[call]),
+        ToolMessage(content="x" * output_size, tool_call_id=f"call_{nr}"),
+    ]
+
+
+def conversation(n_exchanges, output_size):
+    messages = [
+        SystemMessage(content="You are coder."),
+        HumanMessage(content="Task: fix the bug"),
+        HumanMessage(content="File contents: " + "y" * 2000, contains_file_contents=True),
+    ]
+    for nr in range(n_exchanges):
+        messages += see_file_exchange(nr, output_size)
+    return messages
+
+
+def total_tokens(messages):
+    return sum(Tokenizer.message_tokens(message) for message in messages)
+
+
+def orphan_tool_messages(messages):
+    called = {call["id"] for message in messages for call in getattr(message, "tool_calls", None) or []}
+    return [message for message in messages if message.type == "tool" and message.tool_call_id not in called]
+
+
+def test_small_conversation_is_not_changed():
+    messages = conversation(3, 100)
+    assert ContextWindow(max_tokens=10000).fit(messages) is messages
+
+
+def test_old_tool_outputs_are_removed_first():
+    messages = conversation(10, 4000)
+    fitted = ContextWindow(max_tokens=8000).fit(messages)
+
+    assert total_tokens(fitted) <= 8000
+    assert len(fitted) == len(messages)
+    assert "was removed to save context" in fitted[4].content
+    # the newest results are kept, as agent works with them now
+    assert fitted[-1].content == "x" * 4000
+    # input messages are not modified
+    assert messages[4].content == "x" * 4000
+
+
+def test_old_exchanges_are_removed_whole_and_pinned_messages_kept():
+    messages = conversation(40, 4000)
+    fitted = ContextWindow(max_tokens=2000).fit(messages)
+
+    assert total_tokens(fitted) <= 2000
+    assert fitted[:3] == messages[:3]
+    assert orphan_tool_messages(fitted) == []
+    assert fitted[-2:] == messages[-2:]
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from src.tools.rag.description_engine import parse_rate_limits, run_jobs
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits("openrouter=5, openai=0.5") == {"openrouter": 5.0, "openai": 0.5}
+    assert parse_rate_limits("openai=fast,ollama,anthropic=0") == {}
+    assert parse_rate_limits(None) == {}
+
+
+def test_run_jobs_keeps_concurrency_bounded():
+    running = 0
+    max_running = 0
+    done = []
+
+    async def worker(job):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01 * (job % 3))
+        running -= 1
+        done.append(job)
+
+    run_jobs(list(range(20)), worker, concurrency=4)
+    assert sorted(done) == list(range(20))
+    assert max_running == 4
+
+
+def test_run_jobs_without_jobs():
+    run_jobs([], None)
+
+
+def test_llm_calls_continue_while_files_are_uploaded(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORK_DIR", str(tmp_path))
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    from src.tools.rag import index_file_descriptions
+    from src.utilities.objects import CodeFile
+
+    monkeypatch.setattr(index_file_descriptions, "work_dir", str(tmp_path))
+    monkeypatch.setenv("INDEXING_CONCURRENCY", "2")
+    files = []
+    for nr in range(4):
+        (tmp_path / f"module_{nr}.py").write_text(f"x = {nr}\n")
+        files.append(CodeFile(f"module_{nr}.py"))
+    llm_calls, uploads = [], []
+
+    class SlowChain:
+        async def ainvoke(self, inputs):
+            start = time.monotonic()
+            await asyncio.sleep(0.05)
+            llm_calls.append((start, time.monotonic()))
+            return "Description."
+
+    class Manifest:
+        def reusable_chunk_descriptions(self, filename, model):
+            return {}
+
+        def record(self, filename, file_hash, chunk_hashes, model):
+            pass
+
+    def slow_upsert(file_list, manifest):
+        start = time.monotonic()
+        time.sleep(0.2)
+        uploads.append((start, time.monotonic()))
+
+    monkeypatch.setattr(index_file_descriptions, "load_describing_chain", lambda prompt_name: SlowChain())
+    monkeypatch.setattr(index_file_descriptions, "read_coderrules", lambda: "")
+    monkeypatch.setattr(index_file_descriptions, "upsert_file_list", slow_upsert)
+
+    index_file_descriptions.write_descriptions(files, Manifest(), "mini")
+    assert len(uploads) == 4
+    # some descriptions arrived while the first file was being upserted
+    assert any(upload_start < call_end < upload_end for _, call_end in llm_calls for upload_start, upload_end in uploads)
@@ -0,0 +1,52 @@
+import os
+from collections import OrderedDict
+
+import pytest
+from src.utilities.file_content_cache import FileContentCache
+from src.utilities.start_work_functions import CoderIgnore, Work
+from src.utilities.util_functions import watch_file
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(FileContentCache, "entries", OrderedDict())
+
+
+def test_rendering(tmp_path, monkeypatch):
+    monkeypatch.setattr(Work, "work_dir", str(tmp_path))
+    monkeypatch.setattr(CoderIgnore, "spec", None)
+    monkeypatch.setattr(CoderIgnore, "results", {})
+    path = tmp_path / "main.py"
+    path.write_text("def main():\n    pass  \n")
+    assert FileContentCache.rendered(str(path)) == "1|def main(): |1\n2|    pass |2\n"
+    assert FileContentCache.rendered(str(path), line_numbers=False) == "def main():\n    pass\n"
+    assert watch_file("main.py", str(tmp_path)) == "main.py:\n\n1|def main(): |1\n2|    pass |2\n"
+    assert watch_file("missing.py", str(tmp_path)) == "File not exists."
+
+
+def test_unchanged_file_is_not_read_again(tmp_path, monkeypatch):
+    path = tmp_path / "main.py"
+    path.write_text("a = 1\n")
+    rendered = FileContentCache.rendered(str(path))
+
+    monkeypatch.setattr("builtins.open", lambda *args, **kwargs: pytest.fail("file read again"))
+    assert FileContentCache.rendered(str(path)) is rendered
+
+
+def test_changed_file_is_rendered_again(tmp_path):
+    path = tmp_path / "main.py"
+    path.write_text("a = 1\n")
+    FileContentCache.rendered(str(path))
+
+    path.write_text("a = 2\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert FileContentCache.rendered(str(path)) == "1|a = 2 |1\n"
+
+
+def test_least_recently_used_files_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(FileContentCache, "MAX_ENTRIES", 2)
+    for name in ["a.py", "b.py", "c.py"]:
+        (tmp_path / name).write_text(name)
+        FileContentCache.lines(str(tmp_path / name))
+    assert list(FileContentCache.entries) == [str(tmp_path / "b.py"), str(tmp_path / "c.py")]
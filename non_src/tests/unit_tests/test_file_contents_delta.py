@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+from src.utilities.file_content_cache import FileContentCache
+from src.utilities.objects import CodeFile
+from src.utilities.start_work_functions import CoderIgnore, Work
+from src.utilities.util_functions import exchange_file_contents, format_file_delta
+
+BIG_FILE = "".join(f"value_{nr} = {nr}\n" for nr in range(100))
+
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    """Fixture providing a work directory with two files, in diff refresh mode."""
+    (tmp_path / "big.py").write_text(BIG_FILE)
+    (tmp_path / "small.py").write_text("x = 1\n")
+    monkeypatch.setenv("FILE_CONTENTS_REFRESH", "diff")
+    monkeypatch.setattr(Work, "work_dir", str(tmp_path))
+    monkeypatch.setattr(CoderIgnore, "spec", None)
+    monkeypatch.setattr(CoderIgnore, "results", {})
+    monkeypatch.setattr(FileContentCache, "entries", OrderedDict())
+    return tmp_path
+
+
+def test_format_file_delta_shows_changed_hunks_with_new_line_numbers():
+    old_lines = [f"line {nr}\n" for nr in range(1, 31)]
+    new_lines = old_lines[:2] + ["new A\n", "new B\n"] + old_lines[2:]
+    assert format_file_delta("abc.py", old_lines, new_lines) == (
+        "abc.py (changed parts only):\n\n"
+        "@@ lines 2-5 (previously 2-3) @@\n2|line 2 |2\n3|new A |3\n4|new B |4\n5|line 3 |5\n"
+        "Lines below changed places moved accordingly, file has 32 lines now (previously 30).\n"
+    )
+    assert format_file_delta("abc.py", old_lines, None) == "abc.py:\n\nFile not exists."
+    assert format_file_delta("abc.py", None, ["a\n"]) == "abc.py:\n\n1|a |1\n"
+
+
+def test_only_changes_are_appended_and_earlier_messages_stay_untouched(work_dir):
+    files = {CodeFile("big.py"), CodeFile("small.py")}
+    state = {"messages": [SystemMessage(content="system"), HumanMessage(content="task")]}
+    state = exchange_file_contents(state, files, str(work_dir))
+    assert len(state["messages"]) == 3
+    full_contents = state["messages"][2].content
+
+    # nothing changed, nothing to send
+    state = exchange_file_contents(state, files, str(work_dir))
+    assert len(state["messages"]) == 3
+
+    (work_dir / "big.py").write_text(BIG_FILE.replace("value_50 = 50", "value_50 = 500"))
+    FileContentCache.invalidate(str(work_dir / "big.py"))
+    state = exchange_file_contents(state, files, str(work_dir))
+    assert state["messages"][2].content == full_contents
+    delta = state["messages"][3].content
+    assert "@@ lines 50-52 (previously 50-52) @@" in delta
+    assert "51|value_50 = 500 |51" in delta
+    assert "small.py" not in delta
+
+
+def test_big_deltas_are_compacted_into_full_contents(work_dir):
+    files = {CodeFile("small.py")}
+    state = {"messages": [SystemMessage(content="system"), HumanMessage(content="task")]}
+    state = exchange_file_contents(state, files, str(work_dir))
+
+    (work_dir / "small.py").write_text("y = 2\n")
+    FileContentCache.invalidate(str(work_dir / "small.py"))
+    state = exchange_file_contents(state, files, str(work_dir))
+
+    assert len(state["messages"]) == 3
+    assert state["messages"][2].content.startswith("Find most actual file contents here")
+    assert "1|y = 2 |1" in state["messages"][2].content
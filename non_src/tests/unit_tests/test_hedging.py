@@ -0,0 +1,78 @@
+import asyncio
+import time
+from typing import Optional
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from src.utilities.hedging import HedgeBudget, hedged_invoke
+from src.utilities.llm_health import LLMHealth, model_key
+
+
+class SlowModel(FakeMessagesListChatModel):
+    model_name: str
+    delay: float = 0.0
+    error: Optional[Exception] = None
+    calls: int = 0
+    cancelled: bool = False
+
+    async def _agenerate(self, *args, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return self._generate(*args, **kwargs)
+
+
+def slow_model(name, delay=0.0, error=None):
+    return SlowModel(model_name=name, responses=[AIMessage(content=f"answer of {name}")], delay=delay, error=error)
+
+
+@pytest.fixture
+def health(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.utilities.hedging.DEFAULT_HEDGE_DELAY", 0.05)
+    monkeypatch.setattr(HedgeBudget, "calls", 0)
+    monkeypatch.setattr(HedgeBudget, "hedges", 0)
+    return LLMHealth(str(tmp_path))
+
+
+MESSAGES = [HumanMessage(content="Hi")]
+
+
+def test_fast_primary_is_not_hedged(health):
+    primary, secondary = slow_model("primary"), slow_model("secondary")
+    assert hedged_invoke(primary, secondary, MESSAGES, health).content == "answer of primary"
+    assert secondary.calls == 0
+    assert HedgeBudget.hedges == 0
+
+
+def test_slow_primary_is_hedged_and_cancelled(health):
+    primary, secondary = slow_model("primary", delay=5.0), slow_model("secondary")
+    assert hedged_invoke(primary, secondary, MESSAGES, health).content == "answer of secondary"
+    assert HedgeBudget.hedges == 1
+    # cancellation happens in the hedging loop thread
+    for _ in range(100):
+        if primary.cancelled:
+            break
+        time.sleep(0.01)
+    assert primary.cancelled
+    assert health.models[model_key(primary)]["latency"] >= 0.05
+
+
+def test_budget_caps_hedging(health, monkeypatch):
+    monkeypatch.setattr(HedgeBudget, "hedges", 1)
+    primary, secondary = slow_model("primary", delay=0.2), slow_model("secondary")
+    assert hedged_invoke(primary, secondary, MESSAGES, health).content == "answer of primary"
+    assert secondary.calls == 0
+
+
+def test_secondary_is_fallback_when_primary_fails(health):
+    primary = slow_model("primary", error=ValueError("Bad gateway"))
+    secondary = slow_model("secondary")
+    assert hedged_invoke(primary, secondary, MESSAGES, health).content == "answer of secondary"
+    assert HedgeBudget.hedges == 0
+    assert health.models[model_key(primary)]["failures_in_row"] == 1
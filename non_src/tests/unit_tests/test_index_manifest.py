@@ -0,0 +1,106 @@
+import os
+
+import pytest
+from src.tools.rag.index_manifest import (
+    IndexManifest,
+    content_hash,
+    description_file_name,
+    description_id,
+    description_name_from_id,
+    description_source,
+)
+
+
+@pytest.fixture
+def work_dir(tmp_path):
+    """Fixture providing a work directory with one source file and descriptions folder."""
+    (tmp_path / ".clean_coder" / "files_and_folders_descriptions").mkdir(parents=True)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("print('hello')\n")
+    return tmp_path
+
+
+def write_description(work_dir, name, text):
+    (work_dir / ".clean_coder" / "files_and_folders_descriptions" / name).write_text(text)
+
+
+def test_description_names_and_ids():
+    assert description_file_name("src/main.py") == "src=main.py.txt"
+    assert description_file_name("src/main.py", 3) == "src=main.py_chunk3.txt"
+    assert description_id("src=main.py_chunk3.txt") == "src/main.py_chunk3"
+    assert description_name_from_id("src/main.py_chunk3") == "src=main.py_chunk3.txt"
+    assert description_source("src=main.py_chunk12.txt") == "src/main.py"
+    assert description_source("src=main.py.txt") == "src/main.py"
+
+
+def test_unchanged_file_is_up_to_date_after_reload(work_dir):
+    manifest = IndexManifest(str(work_dir))
+    file_hash = content_hash("print('hello')\n")
+    manifest.record("src/main.py", file_hash, [file_hash], "mini-model")
+    write_description(work_dir, "src=main.py.txt", "Prints hello.")
+    manifest.save()
+
+    reloaded = IndexManifest(str(work_dir))
+    assert reloaded.is_up_to_date("src/main.py", file_hash, "mini-model")
+    assert not reloaded.is_up_to_date("src/main.py", content_hash("changed"), "mini-model")
+    assert not reloaded.is_up_to_date("src/main.py", file_hash, "other-model")
+
+
+def test_missing_description_file_forces_redescribing(work_dir):
+    manifest = IndexManifest(str(work_dir))
+    file_hash = content_hash("print('hello')\n")
+    manifest.record("src/main.py", file_hash, [file_hash], "mini-model")
+    assert not manifest.is_up_to_date("src/main.py", file_hash, "mini-model")
+
+
+def test_reusable_chunk_descriptions(work_dir):
+    manifest = IndexManifest(str(work_dir))
+    chunk_hashes = [content_hash("a"), content_hash("b")]
+    manifest.record("src/main.py", content_hash("ab"), chunk_hashes, "mini-model")
+    write_description(work_dir, "src=main.py_chunk0.txt", "Chunk a.")
+    write_description(work_dir, "src=main.py_chunk1.txt", "Chunk b.")
+
+    assert manifest.reusable_chunk_descriptions("src/main.py", "mini-model") == {
+        chunk_hashes[0]: "Chunk a.",
+        chunk_hashes[1]: "Chunk b.",
+    }
+    assert manifest.reusable_chunk_descriptions("src/main.py", "other-model") == {}
+
+
+def test_missing_files_and_remove(work_dir):
+    manifest = IndexManifest(str(work_dir))
+    manifest.record("src/main.py", content_hash("x"), [], "mini-model")
+    manifest.record("src/deleted.py", content_hash("y"), [content_hash("1"), content_hash("2")], "mini-model")
+
+    assert manifest.missing_files(lambda path: False) == ["src/deleted.py"]
+    assert manifest.missing_files(lambda path: path.startswith("src/")) == ["src/main.py", "src/deleted.py"]
+    assert manifest.remove("src/deleted.py") == [
+        "src=deleted.py.txt",
+        "src=deleted.py_chunk0.txt",
+        "src=deleted.py_chunk1.txt",
+    ]
+    assert manifest.remove("src/deleted.py") == []
+
+
+def test_corrupted_manifest_is_ignored(work_dir):
+    with open(os.path.join(work_dir, ".clean_coder", "index_manifest.json"), "w") as f:
+        f.write("{not json")
+    assert IndexManifest(str(work_dir)).files == {}
+
+
+def test_unsaved_changes_are_replayed_from_journal(work_dir):
+    manifest = IndexManifest(str(work_dir))
+    manifest.record("src/main.py", content_hash("x"), [], "mini-model")
+    manifest.record("src/other.py", content_hash("y"), [], "mini-model")
+    manifest.remove("src/other.py")
+    # simulate crash in the middle of writing next journal line
+    with open(manifest.journal_path, "a") as f:
+        f.write('{"file": "src/cut.py", "ent')
+
+    resumed = IndexManifest(str(work_dir))
+    assert resumed.indexing_interrupted()
+    assert list(resumed.files) == ["src/main.py"]
+
+    resumed.save()
+    assert not resumed.indexing_interrupted()
+    assert list(IndexManifest(str(work_dir)).files) == ["src/main.py"]
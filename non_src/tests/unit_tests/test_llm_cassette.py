@@ -0,0 +1,126 @@
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.tools import tool
+from pydantic import BaseModel
+from src.utilities.llm_cassette import Cassette, interaction_key, serialized_conversation
+from src.utilities.llms import init_llms_mini, llm_provider
+from src.utilities.streaming import EarlyToolCalls, stream_response
+
+
+class FakeModel(FakeMessagesListChatModel):
+    model_name: str = "fake"
+    bound_tools: list = []
+
+    def bind_tools(self, tools, **kwargs):
+        self.bound_tools.extend(tools)
+        return self
+
+
+class Verdict(BaseModel):
+    """Is the file relevant."""
+
+    relevant: bool
+
+
+@pytest.fixture
+def cassette(tmp_path, monkeypatch):
+    path = tmp_path / "session.jsonl"
+    monkeypatch.setattr(Cassette, "instances", {})
+    monkeypatch.setenv("LLM_CASSETTE", str(path))
+    for key in ("OPENROUTER_API_KEY", "OLLAMA_MODEL", "LOCAL_MODEL_API_BASE", "OPENAI_API_KEY", "LLM_REPLAY_LATENCY"):
+        monkeypatch.delenv(key, raising=False)
+    return path
+
+
+def record(monkeypatch, responses, tools=None):
+    """Record session of fake model answering with responses."""
+    fake = FakeModel(responses=responses)
+    monkeypatch.setenv("LLM_CASSETTE_MODE", "record")
+    monkeypatch.setattr("src.utilities.llms.ChatOpenAI", lambda **kwargs: fake)
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    llms = init_llms_mini(tools, run_name="Tester")
+    monkeypatch.delenv("OPENAI_API_KEY")
+    monkeypatch.setenv("LLM_CASSETTE_MODE", "replay")
+    return llms, fake
+
+
+def test_tool_calls_are_replayed_without_llms(cassette, monkeypatch):
+    tool_call = {"name": "see_file", "args": {"filename": "a.py"}, "id": "call_1", "type": "tool_call"}
+    llms, fake = record(monkeypatch, [AIMessage(content="", tool_calls=[tool_call]), AIMessage(content="Done")])
+    conversation = [SystemMessage(content="You are coder"), HumanMessage(content="Fix a.py")]
+    first = llms[0].invoke(conversation)
+    second = llms[0].invoke(conversation + [first, HumanMessage(content="Next")])
+
+    Cassette.instances = {}
+    replay_llms = init_llms_mini(run_name="Tester")
+    assert len(replay_llms) == 1 and llm_provider(replay_llms[0]) == "cassette"
+    # cache breakpoints added for some providers don't change the conversation
+    marked = [SystemMessage(content=[{"type": "text", "text": "You are coder", "cache_control": {"type": "ephemeral"}}])]
+    assert replay_llms[0].invoke(marked + conversation[1:]).tool_calls == [tool_call]
+    assert replay_llms[0].invoke(conversation + [second]).content == "Done"
+    with pytest.raises(LookupError):
+        replay_llms[0].invoke(conversation)
+
+
+def test_structured_output_and_latency_are_replayed(cassette, monkeypatch):
+    verdict_call = {"name": "Verdict", "args": {"relevant": True}, "id": "call_1", "type": "tool_call"}
+    llms, fake = record(monkeypatch, [AIMessage(content="", tool_calls=[verdict_call])])
+    question = [HumanMessage(content="Is a.py relevant?")]
+    assert llms[0].with_structured_output(Verdict).invoke(question) == Verdict(relevant=True)
+    assert fake.bound_tools == [Verdict]
+
+    Cassette.instances = {}
+    monkeypatch.setenv("LLM_REPLAY_LATENCY", "0.1-0.2")
+    start = time.monotonic()
+    replay_llms = init_llms_mini(run_name="Tester")
+    # as rankers use it
+    llm = replay_llms[0].with_fallbacks(replay_llms[1:])
+    assert llm.with_structured_output(Verdict).invoke(question) == Verdict(relevant=True)
+    assert 0.1 <= time.monotonic() - start < 1.0
+
+
+def key(run_name, messages):
+    return interaction_key(serialized_conversation(run_name, messages))
+
+
+def test_key_ignores_message_ids():
+    assert key("Tester", [AIMessage(content="Hi", id="run-1")]) == key("Tester", [AIMessage(content="Hi", id="run-2")])
+    assert key("Tester", [HumanMessage(content="Hi")]) != key("Other", [HumanMessage(content="Hi")])
+
+
+def test_repeated_interaction_answers_any_number_of_times(cassette, monkeypatch):
+    cassette.write_text(
+        '{"run_name": "Tester", "key": null, "repeat": true, "response": {"type": "ai", "data": {"content": "Same"}}}\n'
+    )
+    monkeypatch.setenv("LLM_CASSETTE_MODE", "replay")
+    llm = init_llms_mini(run_name="Tester")[0]
+    for question in ["First", "Second", "Third"]:
+        assert llm.invoke([HumanMessage(content=question)]).content == "Same"
+    calls = Cassette.instances[str(cassette)].calls
+    assert [call["run_name"] for call in calls] == ["Tester"] * 3
+    assert all(call["prompt_bytes"] > 0 for call in calls)
+
+
+def test_tool_calls_are_replayed_in_streaming_mode(cassette, monkeypatch):
+    tool_call = {"name": "see_file", "args": {"filename": "a.py"}, "id": "call_1", "type": "tool_call"}
+    record(monkeypatch, [AIMessage(content="Checking.", tool_calls=[tool_call])])[0][0].invoke([HumanMessage(content="Fix")])
+
+    @tool
+    def see_file(filename: str):
+        """Check contents of code file."""
+        return f"content of {filename}"
+
+    Cassette.instances = {}
+    EarlyToolCalls.clear()
+    monkeypatch.setenv("LLM_STREAMING", "1")
+    texts = []
+    response = stream_response(
+        init_llms_mini([see_file], run_name="Tester")[0], [HumanMessage(content="Fix")], [see_file], texts.append
+    )
+    assert response.content == "Checking." and texts == ["Checking."]
+    assert response.tool_calls == [tool_call]
+    # safe tool call was started as soon as it arrived
+    assert EarlyToolCalls.pop(tool_call).content == "content of a.py"
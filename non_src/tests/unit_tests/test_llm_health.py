@@ -0,0 +1,93 @@
+from typing import Optional
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from src.utilities.llm_health import LLMHealth, model_key
+from src.utilities.start_work_functions import Work
+
+
+class FakeModel(FakeMessagesListChatModel):
+    model_name: str
+    error: Optional[Exception] = None
+    calls: int = 0
+
+    def _generate(self, *args, **kwargs):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return super()._generate(*args, **kwargs)
+
+
+def fake_model(name, error=None):
+    return FakeModel(model_name=name, responses=[AIMessage(content=f"answer of {name}")] * 10, error=error)
+
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    (tmp_path / ".clean_coder").mkdir()
+    monkeypatch.setattr(Work, "work_dir", str(tmp_path))
+    monkeypatch.setattr(LLMHealth, "instances", {})
+    return tmp_path
+
+
+def test_timeout_opens_circuit_and_survives_restart(work_dir):
+    slow, fast = fake_model("slow"), fake_model("fast")
+    health = LLMHealth(str(work_dir))
+    assert health.ordered([slow, fast]) == [slow, fast]
+
+    health.record_failure(slow, 90.0, timeout=True)
+    assert health.ordered([slow, fast]) == [fast, slow]
+
+    reloaded = LLMHealth(str(work_dir))
+    assert reloaded.ordered([slow, fast]) == [fast, slow]
+    assert reloaded.models[model_key(slow)]["timeouts"] == 1
+
+
+def test_circuit_opens_after_failures_in_row_and_closes_after_success(work_dir):
+    flaky, other = fake_model("flaky"), fake_model("other")
+    health = LLMHealth(str(work_dir))
+    health.record_failure(flaky, 1.0)
+    health.record_failure(flaky, 1.0)
+    assert health.tier(flaky) == 1
+    health.record_failure(flaky, 1.0)
+    assert health.tier(flaky) == 2
+
+    health.models[model_key(flaky)]["open_until"] = 0.0
+    # half-open after cooldown: still tried after healthy models
+    assert health.ordered([flaky, other]) == [other, flaky]
+    for _ in range(5):
+        health.record_success(flaky, 2.0)
+    assert health.ordered([flaky, other]) == [flaky, other]
+
+
+def test_degraded_provider_costs_one_timeout(work_dir, monkeypatch):
+    # agent modules set up LLMs on import
+    monkeypatch.setenv("WORK_DIR", str(work_dir))
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    from src.utilities import langgraph_common_functions
+
+    slow = fake_model("slow", error=TimeoutError("Request timed out."))
+    fast = fake_model("fast")
+    messages = [HumanMessage(content="Hi")]
+
+    for _ in range(3):
+        response = langgraph_common_functions._get_llm_response([slow, fast], messages, printing=False)
+        assert response.content == "answer of fast"
+    assert slow.calls == 1
+    assert fast.calls == 3
+
+
+def test_failing_health_bookkeeping_keeps_response(work_dir, monkeypatch):
+    monkeypatch.setenv("WORK_DIR", str(work_dir))
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    from src.utilities import langgraph_common_functions
+
+    def broken_disk(self, llm, latency):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(LLMHealth, "record_success", broken_disk)
+    first, second = fake_model("first"), fake_model("second")
+    response = langgraph_common_functions._get_llm_response([first, second], [HumanMessage(content="Hi")], printing=False)
+    assert response.content == "answer of first"
+    assert second.calls == 0
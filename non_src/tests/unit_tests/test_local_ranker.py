@@ -0,0 +1,37 @@
+import pytest
+
+
+DOCUMENTS = [
+    "Login endpoint. Checks user password and returns session token from login_user function.",
+    "Styles of primary buttons and page header.",
+    "Database migrations adding orders table.",
+]
+
+
+@pytest.fixture
+def ranker(monkeypatch, tmp_path):
+    monkeypatch.setenv("WORK_DIR", str(tmp_path))
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    from src.tools.rag.retrieval import LocalRanker
+
+    return LocalRanker()
+
+
+def retrieval(distances=None):
+    result = {"ids": [["auth.py", "styles.css", "migrations.py"]], "documents": [DOCUMENTS]}
+    if distances is not None:
+        result["distances"] = [distances]
+    return result
+
+
+def test_matching_document_is_relevant(ranker):
+    ranking = ranker.rank("login_user password", retrieval())
+    assert ranking == [("auth.py", True), ("styles.css", False), ("migrations.py", False)]
+
+
+@pytest.mark.parametrize("distances", [None, [1.2, 1.3, 1.4]])
+def test_nothing_relevant_when_documents_barely_match(ranker, distances):
+    # the best candidate shares a single word with the question only
+    ranking = ranker.rank("export invoices of user to pdf", retrieval(distances))
+    assert ranking[0][0] == "auth.py"
+    assert not any(is_relevant for _, is_relevant in ranking)
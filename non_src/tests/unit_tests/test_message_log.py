@@ -0,0 +1,80 @@
+import json
+
+import pytest
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from src.utilities import message_log
+from src.utilities.message_log import MessageLog
+from src.utilities.util_functions import load_state_history_from_disk, save_state_history_to_disk
+
+
+@pytest.fixture(autouse=True)
+def fresh_logs(monkeypatch):
+    monkeypatch.setattr(MessageLog, "instances", {})
+
+
+def conversation():
+    tool_call = {"name": "see_file", "args": {"filename": "a.py"}, "id": "call_1", "type": "tool_call"}
+    return [
+        SystemMessage(content="You are manager"),
+        HumanMessage(content="Tasks: none", tasks_and_progress_message=True),
+        AIMessage(content="", tool_calls=[tool_call]),
+        ToolMessage(content="print('a')", tool_call_id="call_1"),
+    ]
+
+
+def reloaded(path):
+    MessageLog.instances = {}
+    return load_state_history_from_disk(str(path))
+
+
+def test_only_changes_are_appended(tmp_path):
+    path = tmp_path / "manager_messages.jsonl"
+    state = {"messages": conversation()}
+    save_state_history_to_disk(state, str(path))
+    size = path.stat().st_size
+
+    state["messages"].append(AIMessage(content="Done"))
+    save_state_history_to_disk(state, str(path))
+    with open(path) as f:
+        lines = f.readlines()
+    assert len(lines) == 4 and len("".join(lines[:3])) == size
+    assert json.loads(lines[-1])["message"]["data"]["content"] == "Done"
+
+    # tasks message refreshed and old exchange trimmed, as Manager does
+    messages = state["messages"]
+    refreshed = HumanMessage(content="Tasks: one", tasks_and_progress_message=True)
+    state["messages"] = [messages[0], refreshed] + messages[4:]
+    save_state_history_to_disk(state, str(path))
+    restored = reloaded(path)
+    assert [message.content for message in restored] == ["Tasks: one", "Done"]
+    assert restored[0].tasks_and_progress_message
+
+
+def test_resumed_history_is_appended_and_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(message_log, "MIN_COMPACTION_BYTES", 0)
+    path = tmp_path / "research_history_task_1.jsonl"
+    state = {"messages": conversation()}
+    save_state_history_to_disk(state, str(path))
+
+    state = {"messages": [SystemMessage(content="You are researcher")] + reloaded(path)}
+    state["messages"].append(AIMessage(content="More"))
+    save_state_history_to_disk(state, str(path))
+    assert len(path.read_text().splitlines()) == 4
+
+    # replacing the whole history makes log bigger than history it holds, so it is rewritten
+    state["messages"] = state["messages"][:1] + [HumanMessage(content="Fresh start")]
+    save_state_history_to_disk(state, str(path))
+    assert len(path.read_text().splitlines()) == 1
+    assert [message.content for message in reloaded(path)] == ["Fresh start"]
+
+
+def test_legacy_history_is_converted(tmp_path):
+    legacy_path = tmp_path / "research_history_task_2.json"
+    with open(legacy_path, "w") as f:
+        json.dump(dumps(conversation()[1:]), f)
+    path = tmp_path / "research_history_task_2.jsonl"
+
+    assert [message.type for message in load_state_history_from_disk(str(path))] == ["human", "ai", "tool"]
+    assert not legacy_path.exists()
+    assert [message.content for message in reloaded(path)] == ["Tasks: none", "", "print('a')"]
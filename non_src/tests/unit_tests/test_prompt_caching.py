@@ -0,0 +1,67 @@
+from langchain_anthropic import ChatAnthropic
+from langchain_anthropic.chat_models import _format_messages
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from src.utilities.llms import llm_open_router, supports_cache_control
+from src.utilities.prompt_caching import add_cache_breakpoints, cache_usage
+
+
+def conversation():
+    return [
+        SystemMessage(content="You are a coder."),
+        HumanMessage(content="Task: fix a bug."),
+        HumanMessage(content="File contents: ..."),
+        AIMessage(content="", tool_calls=[{"name": "see_file", "args": {"filename": "a.py"}, "id": "call_1"}]),
+        ToolMessage(content="a.py:\n\n1|x = 1 |1", tool_call_id="call_1"),
+    ]
+
+
+def test_breakpoints_on_system_stable_prefix_and_last_message():
+    messages = conversation()
+    marked = add_cache_breakpoints(messages)
+
+    cached = [i for i, msg in enumerate(marked) if isinstance(msg.content, list)]
+    assert cached == [0, 2, 4]
+    assert marked[2].content == [
+        {"type": "text", "text": "File contents: ...", "cache_control": {"type": "ephemeral"}}
+    ]
+    assert marked[4].tool_call_id == "call_1"
+    # original messages stay untouched
+    assert messages == conversation()
+
+
+def test_breakpoints_survive_anthropic_formatting():
+    system, formatted = _format_messages(add_cache_breakpoints(conversation()))
+    assert system[-1]["cache_control"] == {"type": "ephemeral"}
+    assert formatted[0]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+    tool_result = formatted[-1]["content"][0]
+    assert tool_result["type"] == "tool_result"
+    assert tool_result["content"][-1]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_supports_cache_control(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "key")
+    assert supports_cache_control(ChatAnthropic(model="claude-opus-4-20250514", api_key="key"))
+    assert supports_cache_control(llm_open_router("anthropic/claude-sonnet-4").with_config({"run_name": "Coder"}))
+    assert not supports_cache_control(llm_open_router("openai/gpt-4.1"))
+
+
+def test_cache_usage_of_anthropic_and_openai_responses():
+    anthropic_response = AIMessage(
+        content="ok",
+        response_metadata={
+            "usage": {"input_tokens": 20, "cache_read_input_tokens": 1500, "cache_creation_input_tokens": 100}
+        },
+    )
+    assert cache_usage(anthropic_response) == {"input": 20, "cache_read": 1500, "cache_write": 100}
+
+    openai_response = AIMessage(
+        content="ok",
+        usage_metadata={
+            "input_tokens": 2000,
+            "output_tokens": 10,
+            "total_tokens": 2010,
+            "input_token_details": {"cache_read": 1024},
+        },
+    )
+    assert cache_usage(openai_response) == {"input": 976, "cache_read": 1024, "cache_write": 0}
+    assert cache_usage(AIMessage(content="ok")) is None
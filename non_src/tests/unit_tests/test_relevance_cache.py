@@ -0,0 +1,53 @@
+from src.tools.rag.relevance_cache import RelevanceCache, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  Login   Endpoint?") == "login endpoint"
+    assert normalize_query("login endpoint") == normalize_query("Login endpoint.")
+
+
+def test_verdicts_survive_reload(tmp_path):
+    cache = RelevanceCache(str(tmp_path))
+    cache.put("Login endpoint", "src/auth.py", "Handles login.", True)
+    cache.put("Login endpoint", "src/styles.css", "Button styles.", False)
+    cache.save()
+
+    reloaded = RelevanceCache(str(tmp_path))
+    assert reloaded.get("login endpoint?", "src/auth.py", "Handles login.") is True
+    assert reloaded.get("login endpoint", "src/styles.css", "Button styles.") is False
+    assert reloaded.get("logout endpoint", "src/auth.py", "Handles login.") is None
+
+
+def test_changed_description_drops_old_verdicts(tmp_path):
+    cache = RelevanceCache(str(tmp_path))
+    cache.put("login", "src/auth.py", "Handles login.", True)
+    cache.put("logout", "src/auth.py", "Handles login.", False)
+    assert cache.get("login", "src/auth.py", "Handles login and registration.") is None
+
+    cache.put("login", "src/auth.py", "Handles login and registration.", True)
+    assert len(cache.entries) == 1
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = RelevanceCache(str(tmp_path), max_entries=2)
+    cache.put("a", "doc1", "x", True)
+    cache.put("b", "doc2", "y", True)
+    cache.get("a", "doc1", "x")
+    cache.put("c", "doc3", "z", True)
+    assert cache.get("a", "doc1", "x") is True
+    assert cache.get("b", "doc2", "y") is None
+
+
+def test_expired_entry_is_ignored(tmp_path):
+    cache = RelevanceCache(str(tmp_path), ttl_seconds=-1)
+    cache.put("a", "doc1", "x", True)
+    assert cache.get("a", "doc1", "x") is None
+
+
+def test_drop_documents(tmp_path):
+    cache = RelevanceCache(str(tmp_path))
+    cache.put("a", "doc1", "x", True)
+    cache.put("a", "doc2", "y", True)
+    cache.drop_documents(["doc1"])
+    assert cache.get("a", "doc1", "x") is None
+    assert cache.get("a", "doc2", "y") is True
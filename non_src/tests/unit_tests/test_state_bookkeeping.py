@@ -0,0 +1,93 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.tools import tool
+from src.utilities.objects import CodeFile
+from src.utilities.start_work_functions import CoderIgnore, Work
+from src.utilities.util_functions import WRONG_TOOL_CALL_WORD, bad_tool_call_looped, exchange_file_contents
+
+
+@tool
+def replace_code(filename: str):
+    """Replace code in a file."""
+    return WRONG_TOOL_CALL_WORD + "Syntax error." if filename == "bad.py" else "Code modified."
+
+
+@pytest.fixture
+def common_functions(monkeypatch, tmp_path):
+    # agent modules set up LLMs on import
+    monkeypatch.setenv("WORK_DIR", str(tmp_path))
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    from src.utilities import langgraph_common_functions
+
+    return langgraph_common_functions
+
+
+def tool_step(state, filename, nr):
+    call = {"name": "replace_code", "args": {"filename": filename}, "id": f"call_{nr}", "type": "tool_call"}
+    state["messages"].append(AIMessage(content="", tool_calls=[call]))
+    return state
+
+
+def test_call_tool_counts_wrong_tool_calls_in_row(common_functions):
+    state = {"messages": [SystemMessage(content="You are coder.")]}
+    for nr, filename in enumerate(["bad.py", "bad.py", "good.py", "bad.py", "bad.py"]):
+        state = common_functions.call_tool(tool_step(state, filename, nr), [replace_code])
+    assert state["wrong_tool_calls_in_row"] == 2
+    assert state["last_tool_message"] is state["messages"][-1]
+    assert not bad_tool_call_looped(state)
+
+    state = common_functions.call_tool(tool_step(state, "bad.py", 5), [replace_code])
+    assert bad_tool_call_looped(state)
+
+
+def test_file_contents_message_is_replaced_in_place(tmp_path, monkeypatch):
+    monkeypatch.setattr(Work, "work_dir", str(tmp_path))
+    monkeypatch.setattr(CoderIgnore, "spec", None)
+    monkeypatch.setattr(CoderIgnore, "results", {})
+    (tmp_path / "main.py").write_text("print('hello')\n")
+    files = {CodeFile("main.py")}
+    state = {
+        "messages": [
+            SystemMessage(content="You are debugger."),
+            HumanMessage(content="Task: greet"),
+            HumanMessage(content="Directory tree"),
+            HumanMessage(content="File contents: old", contains_file_contents=True),
+            HumanMessage(content="Human feedback: ok"),
+        ]
+    }
+    state = exchange_file_contents(state, files, str(tmp_path))
+    assert state["file_contents_indexes"] == [3]
+    assert "print('hello')" in state["messages"][3].content
+    assert len(state["messages"]) == 5
+
+    # outdated indexes are found again
+    state["messages"].insert(1, HumanMessage(content="Screenshot"))
+    state = exchange_file_contents(state, files, str(tmp_path))
+    assert state["file_contents_indexes"] == [4]
+    assert len(state["messages"]) == 6
+
+
+def test_manager_graph_keeps_wrong_tool_calls_count(common_functions, tmp_path, monkeypatch):
+    env_file = tmp_path / ".env"
+    env_file.write_text("TODOIST_API_KEY=key\n")
+    monkeypatch.setattr("dotenv.find_dotenv", lambda *args, **kwargs: str(env_file))
+    from langgraph.graph import END, StateGraph
+    from manager import AgentState
+
+    counts = []
+
+    def bad_step(state):
+        return common_functions.call_tool(tool_step(state, "bad.py", len(state["messages"])), [replace_code])
+
+    def check_count(state):
+        counts.append(state.get("wrong_tool_calls_in_row"))
+        return state
+
+    workflow = StateGraph(AgentState)
+    workflow.add_node("agent", bad_step)
+    workflow.add_node("check", check_count)
+    workflow.set_entry_point("agent")
+    workflow.add_edge("agent", "check")
+    workflow.add_edge("check", END)
+    workflow.compile().invoke({"messages": [SystemMessage(content="You are manager.")]})
+    assert counts == [1]
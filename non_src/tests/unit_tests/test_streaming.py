@@ -0,0 +1,134 @@
+import threading
+
+import pytest
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.tools import tool
+from src.utilities.streaming import EarlyToolCalls, complete_tool_calls, stream_response
+
+file_seen = threading.Event()
+
+
+@tool
+def see_file(filename: str):
+    """Check contents of code file."""
+    file_seen.set()
+    return f"content of {filename}"
+
+
+@tool
+def replace_code(filename: str):
+    """Replace code in a file."""
+    raise AssertionError("tools with side effects must not start early")
+
+
+class StreamingModel(BaseChatModel):
+    """Streams text, then see_file call in two parts, then replace_code call, waiting for early see_file run."""
+
+    @property
+    def _llm_type(self):
+        return "streaming-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        chunks = [
+            AIMessageChunk(content="Let me "),
+            AIMessageChunk(content="check."),
+            AIMessageChunk(content="", tool_call_chunks=[{"name": "see_file", "args": '{"filename": ', "id": "c1", "index": 0}]),
+            AIMessageChunk(content="", tool_call_chunks=[{"name": None, "args": '"a.py"}', "id": None, "index": 0}]),
+        ]
+        for chunk in chunks:
+            yield ChatGenerationChunk(message=chunk)
+        # see_file runs while the rest of the message is still generated
+        assert file_seen.wait(timeout=5)
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="", tool_call_chunks=[{"name": "replace_code", "args": '{"filename": "a.py"}', "id": "c2", "index": 1}]
+            )
+        )
+
+
+def test_partial_tool_call_is_not_complete():
+    chunk = AIMessageChunk(content="", tool_call_chunks=[{"name": "see_file", "args": '{"filename": "a', "id": "c1", "index": 0}])
+    assert list(complete_tool_calls(chunk)) == []
+
+
+def test_only_safe_tool_calls_are_complete():
+    chunk = AIMessageChunk(
+        content="",
+        tool_call_chunks=[
+            {"name": "replace_code", "args": '{"filename": "a.py"}', "id": "c1", "index": 0},
+            {"name": "see_file", "args": '{"filename": "a.py"}', "id": "c2", "index": 1},
+        ],
+    )
+    assert [call["id"] for call in complete_tool_calls(chunk)] == ["c2"]
+    # plain message of model which does not stream
+    tool_call = {"name": "see_file", "args": {"filename": "a.py"}, "id": "c3", "type": "tool_call"}
+    assert list(complete_tool_calls(AIMessage(content="", tool_calls=[tool_call]))) == []
+
+
+def test_text_is_streamed_and_safe_tools_start_early():
+    EarlyToolCalls.clear()
+    texts = []
+    response = stream_response(
+        StreamingModel(), [HumanMessage(content="Hi")], tools=[see_file, replace_code], on_text=texts.append
+    )
+
+    assert texts == ["Let me ", "check."]
+    assert response.content == "Let me check."
+    assert [call["name"] for call in response.tool_calls] == ["see_file", "replace_code"]
+    assert EarlyToolCalls.pop(response.tool_calls[0]).content == "content of a.py"
+    assert EarlyToolCalls.pop(response.tool_calls[1]) is None
+
+
+class ChunksModel(BaseChatModel):
+    """Streams given tool call chunks, one per message chunk."""
+
+    tool_call_chunks: list
+
+    @property
+    def _llm_type(self):
+        return "chunks-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for tool_call_chunk in self.tool_call_chunks:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[tool_call_chunk]))
+
+
+@pytest.mark.parametrize("write_first", [True, False])
+def test_file_read_in_message_writing_it_shows_new_content(tmp_path, monkeypatch, write_first):
+    # agent modules set up LLMs on import
+    monkeypatch.setenv("WORK_DIR", str(tmp_path))
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    from src.utilities.langgraph_common_functions import call_tool
+
+    code_file = tmp_path / "a.py"
+    code_file.write_text("a = 1\n")
+
+    @tool("see_file")
+    def read_file(filename: str):
+        """Check contents of code file."""
+        return code_file.read_text()
+
+    @tool("replace_code")
+    def write_file(filename: str, start_line: int, code: str):
+        """Replace code in a file."""
+        code_file.write_text(code + "\n")
+        return "Code modified."
+
+    write = {"name": "replace_code", "args": '{"filename": "a.py", "start_line": 1, "code": "a = 2"}', "id": "w", "index": 0}
+    read = {"name": "see_file", "args": '{"filename": "a.py"}', "id": "r", "index": 1}
+    tools = [read_file, write_file]
+    EarlyToolCalls.clear()
+    response = stream_response(ChunksModel(tool_call_chunks=[write, read] if write_first else [read, write]), [], tools)
+
+    state = call_tool({"messages": [response]}, tools)
+    see_file_result = next(message for message in state["messages"][1:] if message.tool_call_id == "r")
+    assert see_file_result.content == "a = 2\n"
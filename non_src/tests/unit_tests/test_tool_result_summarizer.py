@@ -0,0 +1,67 @@
+import time
+from collections import OrderedDict
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from src.utilities.tool_result_summarizer import KEEP_RECENT_RESULTS, ToolResultSummarizer
+
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    inputs = []
+
+    def summarize(chain_input):
+        inputs.append(chain_input)
+        return f"digest of {chain_input['source']}"
+
+    monkeypatch.setattr(ToolResultSummarizer, "chain", RunnableLambda(summarize))
+    monkeypatch.setattr(ToolResultSummarizer, "digests", OrderedDict())
+    monkeypatch.setattr(ToolResultSummarizer, "pending", set())
+    return inputs
+
+
+def session(n_results):
+    messages = [SystemMessage(content="You are debugger."), HumanMessage(content="Task: fix the bug")]
+    for nr in range(n_results):
+        call = {"name": "see_file", "args": {"filename": f"file_{nr}.py"}, "id": f"call_{nr}", "type": "tool_call"}
+        messages += [AIMessage(content="", tool_calls=[call]), ToolMessage(content=f"{nr}" * 3000, tool_call_id=f"call_{nr}")]
+    messages.append(HumanMessage(content="\n[SCRIPT EXECUTION ERROR]\nSTDERR:\n" + "Traceback\n" * 300))
+    return messages
+
+
+def wait_for_digests():
+    for _ in range(200):
+        if not ToolResultSummarizer.pending:
+            return
+        time.sleep(0.01)
+
+
+def test_old_results_are_replaced_by_digests_made_in_background(summarizer):
+    # with script log, two results are older than the newest ones
+    messages = session(KEEP_RECENT_RESULTS + 1)
+    # digests are not ready yet, so nothing is replaced, but summarization starts
+    assert ToolResultSummarizer.digested(messages) == messages
+    wait_for_digests()
+
+    digested = ToolResultSummarizer.digested(messages)
+    assert digested[3].content.endswith("digest of see_file")
+    assert digested[5].content.endswith("digest of see_file")
+    # the newest results, including script log, stay verbatim
+    assert digested[7:] == messages[7:]
+    assert messages[3].content == "0" * 3000
+
+
+def test_results_are_summarized_once(summarizer):
+    messages = session(KEEP_RECENT_RESULTS + 1)
+    ToolResultSummarizer.digested(messages)
+    wait_for_digests()
+    ToolResultSummarizer.digested(messages)
+    assert len(summarizer) == 2
+
+
+def test_old_application_logs_are_summarized(summarizer):
+    messages = [HumanMessage(content="Logs:\n" + "GET /users 500\n" * 300)] + session(KEEP_RECENT_RESULTS)
+    ToolResultSummarizer.digested(messages)
+    wait_for_digests()
+    assert ToolResultSummarizer.digested(messages)[0].content.endswith("digest of application logs")
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage
+from src.utilities.start_work_functions import Work
+from src.utilities.tracing import NO_SPAN, Tracer, record_llm_usage, span, traced, traced_task
+
+
+@pytest.fixture
+def tracing(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACING", "1")
+    monkeypatch.setattr(Work, "work_dir", str(tmp_path))
+    monkeypatch.setattr(Tracer, "file", None)
+    monkeypatch.setattr(Tracer, "totals", {})
+    yield tmp_path
+    if Tracer.file:
+        Tracer.file.close()
+
+
+def read_trace(work_dir):
+    [trace_file] = (work_dir / ".clean_coder" / "traces").iterdir()
+    return [json.loads(line) for line in trace_file.read_text().splitlines()]
+
+
+def test_disabled_tracing_records_nothing(monkeypatch):
+    monkeypatch.delenv("TRACING", raising=False)
+    assert span("tool", "see_file") is NO_SPAN
+
+
+def test_spans_are_nested_and_summed_up(tracing, capsys):
+    @traced("node")
+    def call_model_executor():
+        with span("llm", "openai:gpt-4.1") as llm_span:
+            response = AIMessage(
+                content="",
+                usage_metadata={
+                    "input_tokens": 1000,
+                    "output_tokens": 50,
+                    "total_tokens": 1050,
+                    "input_token_details": {"cache_read": 800},
+                },
+            )
+            record_llm_usage(llm_span, response)
+        with pytest.raises(ValueError):
+            with span("tool", "replace_code"):
+                raise ValueError("Wrong line numbers")
+
+    @traced_task
+    def run_task():
+        call_model_executor()
+        call_model_executor()
+
+    run_task()
+
+    records = read_trace(tracing)
+    by_name = {record["name"]: record for record in records}
+    assert by_name["openai:gpt-4.1"]["parent"] == by_name["call_model_executor"]["id"]
+    assert by_name["call_model_executor"]["parent"] == by_name["run_task"]["id"]
+    assert by_name["openai:gpt-4.1"]["attributes"]["cache_read"] == 800
+    assert by_name["replace_code"]["error"] == "ValueError: Wrong line numbers"
+
+    summary = capsys.readouterr().out
+    llm_row = next(line for line in summary.splitlines() if "openai:gpt-4.1" in line)
+    assert llm_row.split()[2:3] == ["2"] and "2000" in llm_row and "1600" in llm_row
+    assert "(2 failed)" in summary
+    # summary is per task
+    assert Tracer.totals == {}
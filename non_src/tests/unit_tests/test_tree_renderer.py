@@ -0,0 +1,62 @@
+import pytest
+from src.utilities.start_work_functions import CoderIgnore, Work
+from src.utilities.tree_renderer import render_budgeted_tree, subtree_stats
+from src.utilities.tree_snapshot import TreeSnapshot
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    """Fixture providing snapshot of a project with two similar packages and one big data folder."""
+    (tmp_path / ".clean_coder").mkdir()
+    (tmp_path / ".clean_coder" / ".coderignore").write_text(".clean_coder/\n")
+    for package in ["billing", "shipping"]:
+        for nr in range(5):
+            (tmp_path / "src" / package).mkdir(parents=True, exist_ok=True)
+            (tmp_path / "src" / package / f"module_{nr}.py").write_text("")
+    (tmp_path / "data").mkdir()
+    for nr in range(300):
+        (tmp_path / "data" / f"sample_{nr}.json").write_text("")
+    (tmp_path / "main.py").write_text("")
+    monkeypatch.setattr(Work, "work_dir", str(tmp_path))
+    monkeypatch.setattr(CoderIgnore, "spec", None)
+    monkeypatch.setattr(CoderIgnore, "results", {})
+    snapshot = TreeSnapshot(str(tmp_path))
+    snapshot.refresh()
+    return snapshot
+
+
+def test_subtree_stats(snapshot):
+    stats = subtree_stats(snapshot)
+    assert stats["."]["files"] == 311
+    assert stats["."]["folders"] == 4
+    assert stats["src"]["files"] == 10
+
+
+@pytest.mark.parametrize("max_chars", [10, 100, 300, 600, 2000, 20000])
+def test_rendered_tree_always_fits_budget(snapshot, max_chars):
+    assert len(render_budgeted_tree(snapshot, max_chars)) <= max_chars
+
+
+def test_big_folders_are_folded(snapshot):
+    rendered = render_budgeted_tree(snapshot, 2000)
+    assert "📁 data <folded: 300 files>" in rendered
+    assert "module_4.py" in rendered
+    assert "main.py" in rendered
+
+
+def test_folders_touched_by_agents_are_unfolded_first(snapshot, monkeypatch):
+    monkeypatch.setattr("src.utilities.tree_renderer.MAX_DIRECTORY_SHARE", 1)
+    snapshot.mark_touched("src/shipping/module_0.py")
+    rendered = render_budgeted_tree(snapshot, 300)
+    assert "📁 billing <folded: 5 files>" in rendered
+    assert "│ │ ├── module_0.py" in rendered
+
+
+def test_symlinked_directories_are_shown_as_links(snapshot, tmp_path):
+    (tmp_path / "src" / "vendor").symlink_to(tmp_path / "data", target_is_directory=True)
+    snapshot.refresh()
+    rendered = render_budgeted_tree(snapshot, 20000)
+    assert "└── 🔗 vendor/" in rendered
+    # link is not entered
+    assert "📁 vendor" not in rendered and "src/vendor" not in snapshot.dirs
+    assert subtree_stats(snapshot)["src"]["folders"] == 3
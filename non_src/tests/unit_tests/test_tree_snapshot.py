@@ -0,0 +1,98 @@
+import os
+
+import pytest
+from src.utilities.start_work_functions import CoderIgnore, Work
+from src.utilities.tree_snapshot import TreeSnapshot
+from src.utilities.tree_renderer import render_budgeted_tree
+
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    """Fixture providing a small project with .coderignore, and CoderIgnore state reset around the test."""
+    (tmp_path / ".clean_coder").mkdir()
+    (tmp_path / ".clean_coder" / ".coderignore").write_text(".clean_coder/\nnode_modules/\n")
+    for path in ["main.py", "src/app.py", "src/utils/helpers.py", "node_modules/lib/index.js"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("")
+    monkeypatch.setattr(Work, "work_dir", str(tmp_path))
+    monkeypatch.setattr(CoderIgnore, "spec", None)
+    monkeypatch.setattr(CoderIgnore, "results", {})
+    monkeypatch.setattr(CoderIgnore, "MTIME_CHECK_INTERVAL", 0)
+    return tmp_path
+
+
+def count_listings(monkeypatch):
+    listed = []
+    original_list_dir = TreeSnapshot._list_dir
+
+    def list_dir(self, rel_dir, abs_dir):
+        listed.append(rel_dir)
+        return original_list_dir(self, rel_dir, abs_dir)
+
+    monkeypatch.setattr(TreeSnapshot, "_list_dir", list_dir)
+    return listed
+
+
+def bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_only_changed_directories_are_listed_again(work_dir, monkeypatch):
+    listed = count_listings(monkeypatch)
+    snapshot = TreeSnapshot(str(work_dir))
+    assert snapshot.refresh()
+    assert sorted(listed) == [".", "src", "src/utils"]
+    assert sorted(snapshot.dirs["."]["files"]) == ["main.py"]
+
+    listed.clear()
+    assert not snapshot.refresh()
+    assert listed == []
+
+    (work_dir / "src" / "utils" / "new.py").write_text("")
+    bump_mtime(work_dir / "src" / "utils")
+    assert snapshot.refresh()
+    assert listed == ["src/utils"]
+    assert "new.py" in snapshot.dirs["src/utils"]["files"]
+
+
+def test_snapshot_is_reused_after_reload(work_dir, monkeypatch):
+    TreeSnapshot(str(work_dir)).refresh()
+    listed = count_listings(monkeypatch)
+
+    reloaded = TreeSnapshot(str(work_dir))
+    assert not reloaded.refresh()
+    assert listed == []
+
+
+def test_coderignore_change_invalidates_snapshot(work_dir, monkeypatch):
+    snapshot = TreeSnapshot(str(work_dir))
+    snapshot.refresh()
+    (work_dir / ".clean_coder" / ".coderignore").write_text(".clean_coder/\nsrc/\n")
+    bump_mtime(work_dir / ".clean_coder" / ".coderignore")
+
+    assert snapshot.refresh()
+    assert sorted(snapshot.dirs) == [".", "node_modules", "node_modules/lib"]
+
+
+def test_rendering_is_memoized_until_snapshot_changes(work_dir):
+    snapshot = TreeSnapshot(str(work_dir))
+    snapshot.refresh()
+    rendered = snapshot.render(render_budgeted_tree, max_chars=10000)
+    assert rendered == "\n".join(
+        [
+            "Content of directory tree:",
+            "📁 ",
+            "│ └── main.py",
+            "📁 src",
+            "│ └── app.py",
+            "│ └──📁 utils",
+            "│ │ └── helpers.py",
+        ]
+    )
+    assert snapshot.render(render_budgeted_tree, max_chars=10000) is rendered
+
+    (work_dir / "src" / "other.py").write_text("")
+    bump_mtime(work_dir / "src")
+    snapshot.refresh()
+    assert "other.py" in snapshot.render(render_budgeted_tree, max_chars=10000)
@@ -23,6 +23,7 @@ from src.utilities.script_execution_utils import run_script_in_env, format_log_m
 from src.tools.rag.rag_utils import update_descriptions
 from src.tools.rag.index_file_descriptions import prompt_index_project_files
 from src.linters.static_analisys import python_static_analysis
+from src.utilities.tracing import traced_task
 
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
@@ -30,6 +31,7 @@ use_frontend_feedback = bool(os.getenv("FRONTEND_URL"))
 execute_file_name = os.getenv("EXECUTE_FILE_NAME")
 
 
+@traced_task
 def run_clean_coder_pipeline(task: str, work_dir: str, task_id: str=None):
     """Execute the complete Clean Coder pipeline including research, planning, execution, and debugging phases."""
     researcher = Researcher(task_id=task_id)
@@ -22,6 +22,7 @@ from src.utilities.util_functions import (
     convert_images,
     list_directory_tree,
     exchange_file_contents,
+    file_versions,
     TOOL_NOT_EXECUTED_WORD,
 )
 from src.utilities.script_execution_utils import logs_from_running_script, run_script_in_env, format_log_message
@@ -39,6 +40,9 @@ from src.agents.frontend_feedback import execute_screenshot_codes
 from src.linters.static_analisys import python_static_analysis
 from src.utilities.util_functions import load_prompt
 from src.utilities.user_input import user_input
+from src.utilities.tracing import traced
+from src.utilities.context_window import ContextWindow
+from src.utilities.tool_result_summarizer import APPLICATION_LOGS_MARKER
 
 load_dotenv(find_dotenv())
 log_file_path = os.getenv("LOG_FILE")
@@ -56,6 +60,11 @@ def final_response_debugger(
 
 class AgentState(TypedDict):
     messages: Sequence[BaseMessage]
+    # bookkeeping updated by call_model, call_tool and exchange_file_contents, so steps do not scan all messages
+    last_ai_message: BaseMessage
+    last_tool_message: BaseMessage
+    wrong_tool_calls_in_row: int
+    file_contents_indexes: List[int]
 
 
 system_prompt_template = load_prompt("debugger_system")
@@ -66,6 +75,8 @@ class Debugger:
         self.work_dir = work_dir
         self.tools = prepare_tools(work_dir)
         self.llms = init_llms_medium_intelligence(self.tools, "Debugger")
+        # debugger sessions are long, so old tool results are summarized
+        self.context_window = ContextWindow(summarize_old_results=True)
         self.system_message = SystemMessage(content=system_prompt_template.format(project_rules=read_coderrules()))
         self.files = files
         self.images = convert_images(image_paths)
@@ -90,11 +101,11 @@ class Debugger:
         self.debugger = debugger_workflow.compile()
 
     # node functions
+    @traced("node")
     def call_model_debugger(self, state: dict) -> dict:
-        state = call_model(state, self.llms)
+        state = call_model(state, self.llms, tools=self.tools, context_window=self.context_window)
         state = call_tool(state, self.tools)
-        ai_messages = [msg for msg in state["messages"] if msg.type == "ai"]
-        last_ai_message = ai_messages[-1]
+        last_ai_message = state["last_ai_message"]
         # if len(last_ai_message.tool_calls) > 1:
         #     for tool_call in last_ai_message.tool_calls:
         #         state["messages"].append(ToolMessage(content="too much tool calls", tool_call_id=tool_call["id"]))
@@ -107,7 +118,7 @@ class Debugger:
                 new_file = CodeFile(tool_call["args"]["filename"], is_modified=True)
                 self.files.add(new_file)
             elif tool_call["name"] in ["replace_code", "insert_code"]:
-                last_tool_message = [msg for msg in state["messages"] if msg.type == "tool"][-1]
+                last_tool_message = state["last_tool_message"]
                 # do not mark as modified if tool was not executed
                 if last_tool_message.content.startswith(TOOL_NOT_EXECUTED_WORD):
                     continue
@@ -136,7 +147,7 @@ class Debugger:
     def check_log(self, state: dict) -> dict:
         """Add server logs."""
         logs = check_application_logs()
-        log_message = HumanMessage(content="Logs:\n" + logs)
+        log_message = HumanMessage(content=APPLICATION_LOGS_MARKER + logs)
         state["messages"].append(log_message)
         
         return state
@@ -152,12 +163,11 @@ class Debugger:
 
     # Conditional edge functions
     def after_agent_condition(self, state):
-        ai_messages = [msg for msg in state["messages"] if msg.type in ["ai"]]
-        last_ai_message = ai_messages[-1]
+        last_ai_message = state["last_ai_message"]
 
         if bad_tool_call_looped(state):
             return "human_help"
-        elif hasattr(last_ai_message, "tool_calls") and last_ai_message.tool_calls[0]["name"] == "final_response_debugger":
+        elif last_ai_message.tool_calls and last_ai_message.tool_calls[0]["name"] == "final_response_debugger":
             if log_file_path:
                 return "check_log"
             if execute_file_name and self.stderr:
@@ -197,7 +207,11 @@ class Debugger:
                 self.system_message,
                 HumanMessage(content=f"Task: {task}\n\n######\n\nPlan which developer implemented already:\n\n{plan}"),
                 HumanMessage(content=list_directory_tree(self.work_dir)),
-                HumanMessage(content=f"File contents: {file_contents}", contains_file_contents=True),
+                HumanMessage(
+                    content=f"File contents: {file_contents}",
+                    contains_file_contents=True,
+                    file_versions=file_versions(self.files, self.work_dir),
+                ),
                 HumanMessage(content=f"Human feedback: {self.human_feedback}"),
             ]
         }
@@ -12,7 +12,7 @@ from dotenv import load_dotenv, find_dotenv
 from langchain.tools import tool
 from src.utilities.llms import init_llms_medium_intelligence
 from src.utilities.print_formatters import print_formatted
-from src.utilities.util_functions import check_file_contents, exchange_file_contents, bad_tool_call_looped, load_prompt, TOOL_NOT_EXECUTED_WORD
+from src.utilities.util_functions import check_file_contents, exchange_file_contents, file_versions, bad_tool_call_looped, load_prompt, TOOL_NOT_EXECUTED_WORD
 from src.utilities.langgraph_common_functions import (
     call_model,
     call_tool,
@@ -21,6 +21,8 @@ from src.utilities.langgraph_common_functions import (
     agent_looped_human_help,
 )
 from src.utilities.objects import CodeFile
+from src.utilities.tracing import traced
+from src.utilities.context_window import ContextWindow
 
 
 load_dotenv(find_dotenv())
@@ -35,6 +37,11 @@ def final_response_executor(
 
 class AgentState(TypedDict):
     messages: Sequence[BaseMessage]
+    # bookkeeping updated by call_model, call_tool and exchange_file_contents, so steps do not scan all messages
+    last_ai_message: BaseMessage
+    last_tool_message: BaseMessage
+    wrong_tool_calls_in_row: int
+    file_contents_indexes: List[int]
 
 
 system_prompt_template = load_prompt("executor_system")
@@ -44,6 +51,7 @@ class Executor:
         self.work_dir = work_dir
         self.tools = prepare_tools(work_dir)
         self.llms = init_llms_medium_intelligence(self.tools, "Executor")
+        self.context_window = ContextWindow()
         self.system_message = SystemMessage(content=system_prompt_template)
         self.files = files
 
@@ -61,18 +69,18 @@ class Executor:
         self.executor = executor_workflow.compile()
 
     # node functions
+    @traced("node")
     def call_model_executor(self, state):
         """
         Calls of Executor's LLM and after receiving its response calls tools. Next performs alluaxury actions
         depending on last message from LLM. After it exchanges contents of files in agent's context to provide it with
         updated version after inserting changes into file.
         """
-        state = call_model(state, self.llms)
+        state = call_model(state, self.llms, context_window=self.context_window)
         state = call_tool(state, self.tools)
 
         # auxiliary actions depending on tools called
-        ai_messages = [msg for msg in state["messages"] if msg.type == "ai"]
-        last_ai_message = ai_messages[-1]
+        last_ai_message = state["last_ai_message"]
         # if len(last_ai_message.tool_calls) > 1:
         #     for tool_call in last_ai_message.tool_calls:
         #         state["messages"].append(ToolMessage(content="too much tool calls", tool_call_id=tool_call["id"]))
@@ -85,7 +93,7 @@ class Executor:
                 new_file = CodeFile(tool_call["args"]["filename"], is_modified=True)
                 self.files.add(new_file)
             elif tool_call["name"] in ["replace_code", "insert_code"]:
-                last_tool_message = [msg for msg in state["messages"] if msg.type == "tool"][-1]
+                last_tool_message = state["last_tool_message"]
                 # do not mark as modified if tool was not executed
                 if last_tool_message.content.startswith(TOOL_NOT_EXECUTED_WORD):
                     continue
@@ -101,17 +109,12 @@ class Executor:
 
     # Conditional edge functions
     def after_agent_condition(self, state):
-        messages = [msg for msg in state["messages"] if msg.type in ["ai", "human"]]
-        last_message = messages[-1]
+        last_ai_message = state["last_ai_message"]
 
         if bad_tool_call_looped(state):
             return "human_help"
         # final response case
-        elif (
-            hasattr(last_message, "tool_calls")
-            and len(last_message.tool_calls) > 0
-            and last_message.tool_calls[0]["name"] == "final_response_executor"
-        ):
+        elif len(last_ai_message.tool_calls) > 0 and last_ai_message.tool_calls[0]["name"] == "final_response_executor":
             return END
         else:
             return "agent"
@@ -125,7 +128,11 @@ class Executor:
             "messages": [
                 self.system_message,
                 HumanMessage(content=f"Task: {task}\n\n######\n\nPlan:\n\n{plan}"),
-                HumanMessage(content=f"File contents: {file_contents}", contains_file_contents=True),
+                HumanMessage(
+                    content=f"File contents: {file_contents}",
+                    contains_file_contents=True,
+                    file_versions=file_versions(self.files, self.work_dir),
+                ),
             ]
         }
         self.executor.invoke(inputs, {"recursion_limit": 150})
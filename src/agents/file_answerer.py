@@ -77,7 +77,7 @@ class ResearchFileAnswerer:
         return call_tool(state, self.tools)
 
     def call_model_researcher(self, state):
-        state = call_model(state, self.llms, printing=False)
+        state = call_model(state, self.llms, printing=False, tools=self.tools)
         last_message = state["messages"][-1]
         if len(last_message.tool_calls) > 1:
             # Filter out the tool call with "final_response_researcher"
@@ -2,6 +2,7 @@ import os
 from langchain_core.messages import HumanMessage
 from src.utilities.llms import init_llms_medium_intelligence
 from src.utilities.start_work_functions import read_frontend_feedback_story
+from src.utilities.tracing import traced
 import base64
 import textwrap
 from typing import Optional
@@ -82,6 +83,7 @@ p.stop()
     return code
 
 
+@traced("phase", "screenshots")
 def execute_screenshot_codes(playwright_code):
     """
     Execute a Playwright script and wrap the screenshot (or error message)
@@ -14,6 +14,7 @@ from src.utilities.langgraph_common_functions import after_ask_human_condition
 from src.utilities.user_input import user_input
 from src.utilities.graphics import LoadingAnimation
 from src.utilities.llms import init_llms_high_intelligence, init_llms_mini, init_llms_medium_intelligence
+from src.utilities.hedging import with_hedging
 from src.utilities.util_functions import load_prompt
 import os
 
@@ -21,11 +22,11 @@ import os
 load_dotenv(find_dotenv())
 
 llms_planners = init_llms_high_intelligence(run_name="Planner")
-llm_strong = llms_planners[0].with_fallbacks(llms_planners[1:])
+llm_strong = with_hedging(llms_planners)
 llms_middle_strength = init_llms_medium_intelligence(run_name="Plan finalizer")
-llm_middle_strength = llms_middle_strength[0].with_fallbacks(llms_middle_strength[1:])
+llm_middle_strength = with_hedging(llms_middle_strength)
 llms_controller = init_llms_mini(run_name="Plan Files Controller")
-llm_controller = llms_controller[0].with_fallbacks(llms_controller[1:])
+llm_controller = with_hedging(llms_controller)
 
 
 class AgentState(TypedDict):
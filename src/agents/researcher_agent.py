@@ -28,6 +28,7 @@ from src.utilities.langgraph_common_functions import (
 )
 from src.utilities.print_formatters import print_formatted, print_formatted_content
 from src.utilities.llms import init_llms_medium_intelligence
+from src.utilities.tracing import traced
 
 import os
 
@@ -73,9 +74,8 @@ class Researcher:
         # Try to load previous research session for this task (if any)
         self.prev_messages: List[BaseMessage] = []
         if task_id:
-            history_file = join_paths(work_dir, ".clean_coder", "research_histories", f"research_history_task_{task_id}.json")
-            if os.path.exists(history_file):
-                self.prev_messages = load_state_history_from_disk(history_file)
+            history_file = join_paths(work_dir, ".clean_coder", "research_histories", f"research_history_task_{task_id}.jsonl")
+            self.prev_messages = load_state_history_from_disk(history_file)
 
         # workflow definition
         researcher_workflow = StateGraph(AgentState)
@@ -91,8 +91,9 @@ class Researcher:
         self.researcher = researcher_workflow.compile()
 
     # node functions
+    @traced("node")
     def call_model_researcher(self, state):
-        state = call_model(state, self.llms, printing=not self.silent)
+        state = call_model(state, self.llms, printing=not self.silent, tools=self.tools)
         last_message = state["messages"][-1]
         if len(last_message.tool_calls) == 0:
             state["messages"].append(HumanMessage(content=no_tools_msg))
@@ -120,7 +121,7 @@ class Researcher:
                     work_dir,
                     ".clean_coder",
                     "research_histories",
-                    f"research_history_task_{self.task_id}.json",
+                    f"research_history_task_{self.task_id}.jsonl",
                 )
                 # Ensure the directory exists before writing
                 os.makedirs(os.path.dirname(history_file), exist_ok=True)
@@ -2,10 +2,12 @@ import os
 from dotenv import load_dotenv, find_dotenv
 import subprocess
 from src.utilities.util_functions import join_paths
+from src.utilities.tracing import traced
 
 
 load_dotenv(find_dotenv())
 
+@traced("phase", "static_analysis")
 def python_static_analysis(files):
     """Run ruff on each given CodeFile and concatenate non-empty outputs."""
     outputs = ""
@@ -4,8 +4,10 @@ import sass
 from lxml import etree
 import re
 import esprima
+from src.utilities.tracing import traced
 
 
+@traced("phase", "syntax_check")
 def check_syntax(file_content, filename):
     parts = filename.split(".")
     extension = parts[-1] if len(parts) > 1 else ""
@@ -0,0 +1,109 @@
+"""
+Lexical BM25 scoring of documents. Runs locally on CPU, no model needed. Tokenizer understands code identifiers,
+so 'getUserProfile', 'get_user_profile' and 'user profile' match each other.
+"""
+
+import re
+import math
+from collections import Counter
+
+
+K1 = 1.5
+B = 0.75
+
+
+def tokenize(text: str) -> list:
+    """
+    Split text into lowercase tokens. Identifiers are kept whole and also split into parts
+    by underscores, dashes and camelCase boundaries.
+    """
+    tokens = []
+    for word in re.findall(r"[A-Za-z0-9_\-]+", text):
+        word_lower = word.lower().strip("_-")
+        if not word_lower:
+            continue
+        tokens.append(word_lower)
+        parts = [
+            part.lower()
+            for piece in re.split(r"[_\-]+", word)
+            for part in re.findall(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+", piece)
+        ]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25:
+    """
+    BM25 inverted index. Built from a list of documents (ids are list positions) or filled document by document
+    with add() and remove().
+    """
+
+    def __init__(self, documents: list = None):
+        # doc_id -> {term: frequency}
+        self.doc_term_counts = {}
+        # term -> {doc_id: frequency}
+        self.postings = {}
+        self.doc_lengths = {}
+        self.total_length = 0
+        for doc_id, text in enumerate(documents or []):
+            self.add(doc_id, text)
+
+    def add(self, doc_id, text: str = None, term_counts: dict = None):
+        """Add document or replace it if already indexed. Provide its text or already counted terms."""
+        self.remove(doc_id)
+        term_counts = term_counts if term_counts is not None else dict(Counter(tokenize(text)))
+        self.doc_term_counts[doc_id] = term_counts
+        for term, freq in term_counts.items():
+            self.postings.setdefault(term, {})[doc_id] = freq
+        self.doc_lengths[doc_id] = sum(term_counts.values())
+        self.total_length += self.doc_lengths[doc_id]
+
+    def remove(self, doc_id):
+        term_counts = self.doc_term_counts.pop(doc_id, None)
+        if term_counts is None:
+            return
+        for term in term_counts:
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def _score_map(self, query: str) -> dict:
+        nr_docs = len(self.doc_term_counts)
+        if not nr_docs:
+            return {}
+        avg_doc_length = self.total_length / nr_docs or 1
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (nr_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, freq in docs.items():
+                norm = K1 * (1 - B + B * self.doc_lengths[doc_id] / avg_doc_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (K1 + 1) / (freq + norm)
+        return scores
+
+    def full_match_score(self, query: str) -> float:
+        """
+        Score of a document of average length containing every query term once. Terms no document contains count
+        with their highest idf, so documents matching only a part of the query score far below it.
+        """
+        nr_docs = len(self.doc_term_counts)
+        score = 0.0
+        for term in set(tokenize(query)):
+            doc_freq = len(self.postings.get(term, ()))
+            score += math.log(1 + (nr_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        return score
+
+    def scores(self, query: str) -> list:
+        """Return BM25 score of every document for the query, in order documents were added."""
+        score_map = self._score_map(query)
+        return [score_map.get(doc_id, 0.0) for doc_id in self.doc_term_counts]
+
+    def search(self, query: str, n_results: int) -> list:
+        """Return ids of n_results best matching documents, the best first. Not matching documents are skipped."""
+        score_map = self._score_map(query)
+        return sorted(score_map, key=score_map.get, reverse=True)[:n_results]
@@ -0,0 +1,84 @@
+"""
+Asynchronous engine running LLM description jobs. Keeps a constant number of requests in flight instead of
+waiting for the slowest call of every batch, and respects request rate limits of every provider.
+"""
+
+import os
+import asyncio
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from src.utilities.llms import llm_provider
+
+
+DEFAULT_CONCURRENCY = 8
+
+# one limiter per provider, shared by all describing chains
+_rate_limiters = {}
+
+
+def indexing_concurrency():
+    """Max number of description requests in flight, configured with INDEXING_CONCURRENCY."""
+    try:
+        return max(1, int(os.getenv("INDEXING_CONCURRENCY", DEFAULT_CONCURRENCY)))
+    except ValueError:
+        return DEFAULT_CONCURRENCY
+
+
+def parse_rate_limits(limits_string):
+    """Parse 'openrouter=5,openai=20' into {provider: requests per second}."""
+    limits = {}
+    for item in (limits_string or "").split(","):
+        if "=" not in item:
+            continue
+        provider, value = item.split("=", 1)
+        try:
+            limits[provider.strip()] = float(value)
+        except ValueError:
+            continue
+    return {provider: value for provider, value in limits.items() if value > 0}
+
+
+def apply_rate_limits(llms):
+    """
+    Attach rate limiters configured with INDEXING_RATE_LIMITS (requests per second per provider) to llms.
+    Llms of the same provider share one limiter.
+    """
+    limits = parse_rate_limits(os.getenv("INDEXING_RATE_LIMITS"))
+    for llm in llms:
+        provider = llm_provider(llm)
+        if provider not in limits:
+            continue
+        if provider not in _rate_limiters:
+            _rate_limiters[provider] = InMemoryRateLimiter(
+                requests_per_second=limits[provider], check_every_n_seconds=0.05, max_bucket_size=1
+            )
+        model = llm
+        while hasattr(model, "bound"):
+            model = model.bound
+        model.rate_limiter = _rate_limiters[provider]
+    return llms
+
+
+async def _run_jobs(jobs, worker, concurrency, finish):
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    async def consume():
+        while not queue.empty():
+            job = queue.get_nowait()
+            await worker(job)
+
+    await asyncio.gather(*(consume() for _ in range(min(concurrency, len(jobs)))))
+    if finish is not None:
+        await finish()
+
+
+def run_jobs(jobs, worker, concurrency=None, finish=None):
+    """
+    Run async `worker(job)` for every job using a shared work queue. At most `concurrency` jobs run at once,
+    and next job starts as soon as any of running ones finishes. Async `finish()` is awaited after the last job,
+    in the same event loop, e.g. to wait for background tasks started by workers.
+    """
+    if not jobs:
+        return
+    asyncio.run(_run_jobs(jobs, worker, concurrency or indexing_concurrency(), finish))
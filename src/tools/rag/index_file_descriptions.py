@@ -1,23 +1,34 @@
 import os
+import asyncio
 from pathlib import Path
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from dotenv import load_dotenv, find_dotenv
-import chromadb
 import sys
 import questionary
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
 from src.utilities.util_functions import join_paths, read_coderrules
-from src.utilities.start_work_functions import file_folder_ignored
+from src.utilities.start_work_functions import file_folder_ignored, walk_not_ignored
 from src.utilities.llms import init_llms_mini
 from src.tools.rag.code_splitter import split_code
+from src.tools.rag.description_engine import apply_rate_limits, run_jobs
+from src.tools.rag.relevance_cache import RelevanceCache
+from src.tools.rag.lexical_index import LexicalIndex
 from src.utilities.print_formatters import print_formatted
-from src.tools.rag.retrieval import vdb_available
+from src.tools.rag.retrieval import vdb_available, get_collection, ChromaRegistry
+from src.tools.rag.index_manifest import (
+    IndexManifest,
+    content_hash,
+    description_file_name,
+    description_id,
+    description_name_from_id,
+    description_source,
+)
 from src.utilities.manager_utils import QUESTIONARY_STYLE
 from src.utilities.objects import CodeFile
 from tqdm import tqdm
-import glob
+import argparse
 
 
 
@@ -31,7 +42,7 @@ RESET = "\033[0m"
 # Customize tqdm's bar format with golden and magenta colors
 bar_format = (
     f"{GOLDEN}{{desc}}: {MAGENTA}{{percentage:3.0f}}%{GOLDEN}|"
-    f"{{bar}}| {MAGENTA}{{n_fmt}}/{{total_fmt}} files "
+    f"{{bar}}| {MAGENTA}{{n_fmt}}/{{total_fmt}} descriptions "
     f"{GOLDEN}[{{elapsed}}<{{remaining}}, {{rate_fmt}}{{postfix}}]{RESET}"
 )
 
@@ -88,159 +99,283 @@ def collect_files_to_describe(work_dir):
     under the work_dir according to is_code_file criteria and .coderignore patterns.
     """
     allowed_files = []
-    for root, _, files in os.walk(work_dir):
+    # ignored directories are not walked at all
+    for root, _, files, _ in walk_not_ignored(work_dir):
         for file in files:
             file_path = Path(root) / file
             if not is_code_file(file_path):
                 continue
             relative_path_str = file_path.relative_to(work_dir).as_posix()
-            if file_folder_ignored(relative_path_str):
-                continue
             allowed_files.append(CodeFile(filename=relative_path_str))
     return allowed_files
 
 
-def write_file_descriptions(files: [CodeFile]):
-    """Writes descriptions of whole files in codebase. Gets list of files to describe and describes files in batches."""
-    coderrules = read_coderrules()
+def describer_model_name():
+    """Name of the model used for describing files. Descriptions made by other model are not reused."""
+    llm = init_llms_mini(tools=[], run_name="File Describer")[0].bound
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or llm.__class__.__name__
 
+
+def load_describing_chain(prompt_name):
+    """Build chain describing code with mini llms, using prompt from src/prompts/{prompt_name}.prompt."""
     grandparent_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-    with open(f"{grandparent_dir}/prompts/describe_files.prompt", "r") as f:
-        files_describe_template = f.read()
-    prompt = ChatPromptTemplate.from_template(files_describe_template)
+    with open(f"{grandparent_dir}/prompts/{prompt_name}.prompt", "r") as f:
+        describe_template = f.read()
+    prompt = ChatPromptTemplate.from_template(describe_template)
 
-    llms = init_llms_mini(tools=[], run_name="File Describer")
+    llms = apply_rate_limits(init_llms_mini(tools=[], run_name="File Describer"))
     llm = llms[0].with_fallbacks(llms[1:])
-    chain = prompt | llm | StrOutputParser()
+    return prompt | llm | StrOutputParser()
 
-    description_folder = join_paths(work_dir, ".clean_coder/files_and_folders_descriptions")
-    Path(description_folder).mkdir(parents=True, exist_ok=True)
-    batch_size = 8
-    pbar = tqdm(total=len(files), desc="[1/2]Describing files", bar_format=bar_format)
-
-    for i in range(0, len(files), batch_size):
-        files_iteration = files[i: i + batch_size]
-        # write descriptions
-        descriptions = chain.batch(
-            [{"coderrules": coderrules, "code": get_content(file)} for file in files_iteration]
-        )
-
-        # save descriptions as files
-        for file, description in zip(files_iteration, descriptions):
-            file_name = file.filename.replace("/", "=")
-            output_path = join_paths(description_folder, f"{file_name}.txt")
 
-            with open(output_path, "w", encoding="utf-8") as out_file:
-                out_file.write(description)
+def write_description(description_name, description):
+    output_path = join_paths(work_dir, ".clean_coder/files_and_folders_descriptions", description_name)
+    with open(output_path, "w", encoding="utf-8") as out_file:
+        out_file.write(description)
 
-        # Update by actual number of files processed in this batch
-        pbar.update(len(files_iteration))
 
-    pbar.close()
+def write_descriptions(files: [CodeFile], manifest: IndexManifest, model: str):
+    """Writes descriptions of whole files and of their chunks (for files having more than one chunk).
+    All descriptions are made by one async work queue, so files and chunks are described together with
+    INDEXING_CONCURRENCY requests in flight, and each description is saved as soon as it arrives.
+    Chunks which content did not change since last indexing reuse their old descriptions instead of being
+    described again.
 
+    As soon as all descriptions of a file are ready, file is uploaded to vector storage and recorded in
+    manifest journal, so interrupted indexing resumes from the first unfinished file. Uploads run one at a time
+    in a worker thread, so describing requests keep going while files are embedded and upserted.
 
-def write_file_chunks_descriptions(files: [CodeFile]):
-    """Writes descriptions of file chunks in codebase. Gets list of whole files to describe, divides files
-    into chunks and describes each chunk separately."""
+    Returns number of chunks which descriptions were reused."""
+    if not files:
+        return 0
     coderrules = read_coderrules()
-
-    grandparent_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-    with open(f"{grandparent_dir}/prompts/describe_file_chunks.prompt", "r") as f:
-        chunks_describe_template = f.read()
-
-    prompt = ChatPromptTemplate.from_template(chunks_describe_template)
-    llms = init_llms_mini(tools=[], run_name="File Describer")
-    llm = llms[0]
-    chain = prompt | llm | StrOutputParser()
+    files_chain = load_describing_chain("describe_files")
+    chunks_chain = load_describing_chain("describe_file_chunks")
 
     description_folder = join_paths(work_dir, ".clean_coder/files_and_folders_descriptions")
     Path(description_folder).mkdir(parents=True, exist_ok=True)
 
-    # iterate chunks inside the file
-    for file in tqdm(files, desc="[2/2]Describing file chunks", bar_format=bar_format):
+    # jobs are (file, chain, description file name, chain inputs)
+    jobs = []
+    # number of unfinished jobs and manifest record for every file
+    pending_jobs = {}
+    manifest_records = {}
+    reused_chunks = 0
+    for file in files:
         file_content = get_content(file)
         # get file extenstion
         extension = Path(file.filename).suffix.lstrip(".")
         file_chunks = split_code(file_content, extension)
+        chunk_hashes = [content_hash(chunk) for chunk in file_chunks]
+        old_descriptions = manifest.reusable_chunk_descriptions(file.filename, model)
+        manifest_records[file.filename] = (content_hash(file_content), chunk_hashes)
+
+        file_inputs = {"coderrules": coderrules, "code": file_content}
+        jobs.append((file, files_chain, description_file_name(file.filename), file_inputs))
+        pending_jobs[file.filename] = 1
         # do not describe chunk of 1-chunk files
         if len(file_chunks) <= 1:
             continue
-        descriptions = chain.batch(
-            [{"coderrules": coderrules, "file_code": file_content, "chunk_code": chunk} for chunk in file_chunks]
-        )
+        for nr, chunk_hash in enumerate(chunk_hashes):
+            description_name = description_file_name(file.filename, nr)
+            if chunk_hash in old_descriptions:
+                write_description(description_name, old_descriptions[chunk_hash])
+                reused_chunks += 1
+                continue
+            chunk_inputs = {"coderrules": coderrules, "file_code": file_content, "chunk_code": file_chunks[nr]}
+            jobs.append((file, chunks_chain, description_name, chunk_inputs))
+            pending_jobs[file.filename] += 1
+
+    pbar = tqdm(total=len(jobs), desc="Describing files and chunks", bar_format=bar_format)
+
+    # vector storage, lexical index and manifest journal are not thread safe, so files are uploaded one by one
+    upload_lock = asyncio.Lock()
+    uploads = []
+
+    def record_and_upsert(file):
+        file_hash, chunk_hashes = manifest_records[file.filename]
+        manifest.record(file.filename, file_hash, chunk_hashes, model)
+        upsert_file_list([file], manifest)
+
+    async def upload(file):
+        async with upload_lock:
+            await asyncio.to_thread(record_and_upsert, file)
+
+    async def describe(job):
+        file, chain, description_name, inputs = job
+        description = await chain.ainvoke(inputs)
+        await asyncio.to_thread(write_description, description_name, description)
+        pbar.update(1)
+        pending_jobs[file.filename] -= 1
+        if pending_jobs[file.filename] == 0:
+            uploads.append(asyncio.create_task(upload(file)))
+
+    async def wait_for_uploads():
+        await asyncio.gather(*uploads)
+
+    run_jobs(jobs, describe, finish=wait_for_uploads)
+    pbar.close()
+    return reused_chunks
 
-        for nr, description in enumerate(descriptions):
-            file_name = f"{file.filename.replace('/', '=')}_chunk{nr}"
-            output_path = join_paths(description_folder, f"{file_name}.txt")
 
-            with open(output_path, "w", encoding="utf-8") as out_file:
-                out_file.write(description)
+def delete_descriptions(description_names):
+    """Removes description files and their documents in vector storage."""
+    if not description_names:
+        return
+    description_folder = join_paths(work_dir, ".clean_coder/files_and_folders_descriptions")
+    for name in description_names:
+        path = join_paths(description_folder, name)
+        if os.path.exists(path):
+            os.remove(path)
+    doc_ids = [description_id(name) for name in description_names]
+    collection = get_collection()
+    if collection:
+        collection.delete(ids=doc_ids)
+    relevance_cache = RelevanceCache.for_work_dir(work_dir)
+    relevance_cache.drop_documents(doc_ids)
+    relevance_cache.save()
+    LexicalIndex.for_work_dir(work_dir).remove(doc_ids)
+
+
+def expected_description_names(filename, manifest: IndexManifest):
+    """Exact list of description files the code file should have."""
+    entry = manifest.files.get(filename)
+    if entry:
+        return entry["descriptions"]
+    # file indexed before manifest existed - count its chunks without describing them
+    extension = Path(filename).suffix.lstrip(".")
+    file_chunks = split_code(get_content(CodeFile(filename)), extension)
+    chunk_names = [description_file_name(filename, nr) for nr in range(len(file_chunks))] if len(file_chunks) > 1 else []
+    return [description_file_name(filename)] + chunk_names
+
+
+def reconcile_descriptions(file_list: [CodeFile], manifest: IndexManifest):
+    """
+    Removes descriptions which provided files should not have anymore, as descriptions of chunks
+    which disappeared after file been shortened.
+    """
+    description_folder = join_paths(work_dir, ".clean_coder/files_and_folders_descriptions")
+    if not os.path.exists(description_folder):
+        return
+    filenames = {file.filename for file in file_list}
+    existing_names = {}
+    for name in os.listdir(description_folder):
+        source = description_source(name)
+        if source in filenames:
+            existing_names.setdefault(source, []).append(name)
 
+    stale_names = []
+    for filename, names in existing_names.items():
+        expected = set(expected_description_names(filename, manifest))
+        stale_names += [name for name in names if name not in expected]
+    delete_descriptions(stale_names)
 
-def upload_descriptions_to_vdb():
-    """Uploads descriptions, created by write_file_chunks_descriptions, into vector database."""
-    print_formatted("Uploading file descriptions to vector storage...", color="magenta")
-    chroma_client = chromadb.PersistentClient(path=join_paths(work_dir, ".clean_coder/chroma_base"))
-    collection_name = f"clean_coder_{Path(work_dir).name}_file_descriptions"
 
-    collection = chroma_client.get_or_create_collection(
-        name=collection_name,
-        # embedding_function=embedding_function
-    )
+def collect_garbage_descriptions():
+    """
+    Sweeps the whole descriptions folder and vector storage against the working tree. Removes descriptions of
+    deleted or ignored files and of chunks files do not have anymore.
+    """
+    manifest = IndexManifest(work_dir)
+    for filename in manifest.missing_files(file_folder_ignored):
+        manifest.remove(filename)
 
-    # read files and upload to base
     description_folder = join_paths(work_dir, ".clean_coder/files_and_folders_descriptions")
+    existing_names = set(os.listdir(description_folder)) if os.path.exists(description_folder) else set()
+    collection = get_collection()
+    if collection:
+        existing_names |= {description_name_from_id(doc_id) for doc_id in collection.get(include=[])["ids"]}
+
+    expected_names = {}
+    stale_names = []
+    for name in existing_names:
+        source = description_source(name)
+        if source not in expected_names:
+            source_exists = os.path.isfile(join_paths(work_dir, source)) and not file_folder_ignored(source)
+            expected_names[source] = set(expected_description_names(source, manifest)) if source_exists else set()
+        if name not in expected_names[source]:
+            stale_names.append(name)
+
+    delete_descriptions(stale_names)
+    manifest.save()
+    ChromaRegistry.invalidate(work_dir)
+    LexicalIndex.for_work_dir(work_dir).save()
+    print_formatted(f"Garbage collection removed {len(stale_names)} stale descriptions.", color="green")
+
+
+def describe_changed_files(file_list: [CodeFile], manifest: IndexManifest):
+    """
+    Describes only files which content (or describing model) changed since last indexing and records them
+    in manifest. Removes descriptions of chunks changed files do not have anymore.
+    Returns list of files which were described.
+    """
+    model = describer_model_name()
+    changed_files = [
+        file for file in file_list
+        if not manifest.is_up_to_date(file.filename, content_hash(get_content(file)), model)
+    ]
+    reused_chunks = write_descriptions(changed_files, manifest, model)
+    reconcile_descriptions(changed_files, manifest)
+
+    skipped_files = len(file_list) - len(changed_files)
+    if skipped_files or reused_chunks:
+        print_formatted(
+            f"Skipped {skipped_files} unchanged files and {reused_chunks} unchanged chunks of changed files.",
+            color="green",
+        )
+    return changed_files
+
+
+def get_or_create_collection():
+    return ChromaRegistry.get_collection(work_dir, create=True)
+
 
+def upsert_descriptions(description_names):
+    """Uploads provided description files into vector database, by batches of 100."""
+    description_folder = join_paths(work_dir, ".clean_coder/files_and_folders_descriptions")
+    collection = None
     docs = []
     ids = []
-
-    for root, _, files in os.walk(description_folder):
-        for file in files:
-            file_path = Path(root) / file
-            with open(file_path, "r", encoding="utf-8") as file:
-                content = file.read()
-            docs.append(content)
-            ids.append(file_path.name.replace("=", "/").removesuffix(".txt"))
-            # upsert to vector storage by batches of 100
-            if len(docs) >= 100:
-                collection.upsert(documents=docs, ids=ids)
-                # Clear the batch lists
-                docs = []
-                ids = []
-    # avoid upserting if no docs here (empty folder)
+    for name in description_names:
+        file_path = join_paths(description_folder, name)
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, "r", encoding="utf-8") as file:
+            docs.append(file.read())
+        ids.append(description_id(name))
+        if len(docs) >= 100:
+            collection = collection or get_or_create_collection()
+            collection.upsert(documents=docs, ids=ids)
+            # Clear the batch lists
+            docs = []
+            ids = []
+    # avoid upserting if no docs here
     if not docs:
         return
-    # upsert remaining docs
+    collection = collection or get_or_create_collection()
     collection.upsert(documents=docs, ids=ids)
 
 
-def upsert_file_list(file_list):
-    chroma_client = chromadb.PersistentClient(path=join_paths(work_dir, ".clean_coder/chroma_base"))
-    collection_name = f"clean_coder_{Path(work_dir).name}_file_descriptions"
-    collection = chroma_client.get_or_create_collection(
-        name=collection_name,
-        # embedding_function=embedding_function
-    )
+def upload_missing_descriptions(manifest: IndexManifest):
+    """Uploads descriptions of indexed files which are missing in vector database (e.g. after it was removed)."""
+    expected_names = [name for entry in manifest.files.values() for name in entry["descriptions"]]
+    collection = get_collection()
+    existing_ids = set(collection.get(include=[])["ids"]) if collection else set()
+    missing_names = [name for name in expected_names if description_id(name) not in existing_ids]
+    if not missing_names:
+        return
+    print_formatted(f"Uploading {len(missing_names)} file descriptions to vector storage...", color="magenta")
+    upsert_descriptions(missing_names)
 
-    descriptions_folder = join_paths(work_dir, ".clean_coder/files_and_folders_descriptions")
 
-    docs = []
-    ids = []
-    # open every file starting with descriptions_folder/file and add content to list
-    for file in file_list:
-        pattern = os.path.join(descriptions_folder, f"{file.filename.replace('/', '=').removesuffix('.txt')}*")
-        for file_path in glob.glob(pattern):
-            with open(file_path, "r", encoding="utf-8") as file_content:
-                content = file_content.read()
-            file_path = Path(file_path)
-            docs.append(content)
-            ids.append(file_path.name.replace("=", "/").removesuffix(".txt"))
-
-        # avoid upserting if no docs here (no files changed)
-        if not docs:
-            return
-    collection.upsert(documents=docs, ids=ids)
-    print_formatted("Re-indexing of modified files completed.", color="green")
+def upsert_file_list(file_list, manifest: IndexManifest = None):
+    """Uploads descriptions of provided files into vector database."""
+    manifest = manifest or IndexManifest(work_dir)
+    # upsert exactly the descriptions files should have, so stale chunks are not uploaded back
+    description_names = [name for file in file_list for name in expected_description_names(file.filename, manifest)]
+    upsert_descriptions(description_names)
+    ChromaRegistry.invalidate(work_dir)
+    LexicalIndex.for_work_dir(work_dir).index_descriptions(description_names)
 
 
 def prompt_index_project_files():
@@ -250,6 +385,19 @@ def prompt_index_project_files():
     Then asks if yous sure he want to do indexing. Then triggers write_and_index_descriptions().
     """
     if vdb_available():
+        # build lexical index for projects indexed before it was introduced
+        lexical_index = LexicalIndex.for_work_dir(work_dir)
+        if lexical_index.index_missing():
+            lexical_index.save()
+        if IndexManifest(work_dir).indexing_interrupted():
+            answer = questionary.select(
+                "Indexing of your project files was interrupted. Do you want to resume it?",
+                choices=["Resume", "Skip"],
+                style=QUESTIONARY_STYLE,
+                instruction="\nHint: Only files not indexed yet will be described.",
+            ).ask()
+            if answer == "Resume":
+                write_and_index_descriptions(collect_files_to_describe(work_dir))
         return
     answer = questionary.select(
         "Do you want to index your project files for improving file search?",
@@ -271,15 +419,32 @@ def prompt_index_project_files():
 
 def write_and_index_descriptions(file_list: [CodeFile]):
     # provide optionally which subfolders needs to be checked, if you don't want to describe all project folder
-    write_file_descriptions(file_list)
-    write_file_chunks_descriptions(file_list)
-    upload_descriptions_to_vdb()
+    manifest = IndexManifest(work_dir)
+    removed_descriptions = []
+    for filename in manifest.missing_files(file_folder_ignored):
+        removed_descriptions += manifest.remove(filename)
+    delete_descriptions(removed_descriptions)
+    if removed_descriptions:
+        print_formatted(f"Removed {len(removed_descriptions)} descriptions of deleted files.", color="magenta")
+
+    describe_changed_files(file_list, manifest)
+    upload_missing_descriptions(manifest)
+    manifest.save()
+    ChromaRegistry.invalidate(work_dir)
+    lexical_index = LexicalIndex.for_work_dir(work_dir)
+    lexical_index.index_missing()
+    lexical_index.save()
 
 
 if __name__ == "__main__":
-    # upload_descriptions_to_vdb()
-    upsert_file_list(
-        [
-            "src/agents/debugger_agent.py",
-        ]
+    parser = argparse.ArgumentParser(description="Index project files descriptions for semantic search.")
+    parser.add_argument(
+        "--gc",
+        action="store_true",
+        help="Remove descriptions of deleted files and stale chunks instead of indexing.",
     )
+    args = parser.parse_args()
+    if args.gc:
+        collect_garbage_descriptions()
+    else:
+        write_and_index_descriptions(collect_files_to_describe(work_dir))
@@ -0,0 +1,167 @@
+"""
+Manifest of indexed files. Remembers content hashes of described files and their chunks, so re-indexing
+describes only the code that actually changed since the last run.
+"""
+
+import os
+import re
+import json
+import hashlib
+from src.utilities.util_functions import join_paths
+
+
+MANIFEST_VERSION = 1
+
+
+def content_hash(text: str) -> str:
+    """Return a stable hash of a text, used to detect changed files and chunks."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def description_file_name(filename: str, chunk_nr=None) -> str:
+    """Name of the description file for a whole file (chunk_nr=None) or for one of its chunks."""
+    file_name = filename.replace("/", "=")
+    if chunk_nr is None:
+        return f"{file_name}.txt"
+    return f"{file_name}_chunk{chunk_nr}.txt"
+
+
+def description_id(description_name: str) -> str:
+    """Convert description file name into id of the document in vector storage."""
+    return description_name.replace("=", "/").removesuffix(".txt")
+
+
+def description_name_from_id(doc_id: str) -> str:
+    """Convert id of the document in vector storage back into description file name."""
+    return doc_id.replace("/", "=") + ".txt"
+
+
+def description_source(description_name: str) -> str:
+    """Return relative path of the code file which description (or description of its chunk) it is."""
+    return re.sub(r"_chunk\d+$", "", description_id(description_name))
+
+
+def description_chunk_nr(description_name: str):
+    """Return number of described chunk, or None for description of whole file."""
+    match = re.search(r"_chunk(\d+)$", description_id(description_name))
+    return int(match.group(1)) if match else None
+
+
+class IndexManifest:
+    """
+    Persisted under .clean_coder/index_manifest.json. For every indexed file keeps:
+    content hash, hashes of its chunks, names of its description files and model used to describe it.
+
+    Changes made during indexing are appended to .clean_coder/index_journal.jsonl immediately, so an interrupted
+    indexing can be resumed. Journal is merged into manifest on save().
+    """
+
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        self.path = join_paths(work_dir, ".clean_coder", "index_manifest.json")
+        self.journal_path = join_paths(work_dir, ".clean_coder", "index_journal.jsonl")
+        self.description_folder = join_paths(work_dir, ".clean_coder", "files_and_folders_descriptions")
+        self.files = self._load()
+        self._replay_journal()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            # corrupted manifest only means we need to describe everything again
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        return manifest.get("files", {})
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    change = json.loads(line)
+                except json.JSONDecodeError:
+                    # last line could be cut by crash during writing
+                    continue
+                if change["entry"] is None:
+                    self.files.pop(change["file"], None)
+                else:
+                    self.files[change["file"]] = change["entry"]
+
+    def _append_to_journal(self, filename, entry):
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"file": filename, "entry": entry}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def indexing_interrupted(self):
+        """True if previous indexing did not finish, leaving changes in journal."""
+        return os.path.exists(self.journal_path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, f, indent=1)
+        os.replace(tmp_path, self.path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def is_up_to_date(self, filename, file_hash, model):
+        """True if file was described with the same content and model, and its description still exists."""
+        entry = self.files.get(filename)
+        if not entry or entry["hash"] != file_hash or entry["model"] != model:
+            return False
+        return all(os.path.exists(join_paths(self.description_folder, name)) for name in entry["descriptions"])
+
+    def reusable_chunk_descriptions(self, filename, model):
+        """
+        Return {chunk_hash: description} for chunks described previously with the same model.
+        Descriptions are read into memory, so they survive overwriting of description files.
+        """
+        entry = self.files.get(filename)
+        if not entry or entry["model"] != model:
+            return {}
+        reusable = {}
+        for nr, chunk_hash in enumerate(entry["chunk_hashes"]):
+            path = join_paths(self.description_folder, description_file_name(filename, nr))
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                reusable[chunk_hash] = f.read()
+        return reusable
+
+    def record(self, filename, file_hash, chunk_hashes, model):
+        """Save information about a freshly described file. Call it when all its descriptions are written."""
+        descriptions = [description_file_name(filename)]
+        # 1-chunk files have no chunk descriptions
+        if len(chunk_hashes) > 1:
+            descriptions += [description_file_name(filename, nr) for nr in range(len(chunk_hashes))]
+        self.files[filename] = {
+            "hash": file_hash,
+            "chunk_hashes": chunk_hashes if len(chunk_hashes) > 1 else [],
+            "descriptions": descriptions,
+            "model": model,
+        }
+        self._append_to_journal(filename, self.files[filename])
+
+    def remove(self, filename):
+        """Forget file and return names of its description files."""
+        entry = self.files.pop(filename, None)
+        if not entry:
+            return []
+        self._append_to_journal(filename, None)
+        return entry["descriptions"]
+
+    def missing_files(self, is_ignored):
+        """Return indexed files which no longer exist in work dir or became ignored."""
+        return [
+            filename
+            for filename in self.files
+            if is_ignored(filename) or not os.path.isfile(join_paths(self.work_dir, filename))
+        ]
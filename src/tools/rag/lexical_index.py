@@ -0,0 +1,105 @@
+"""
+Local BM25 index over file descriptions and the source code they describe. Complements vector search with exact
+matches of identifiers, as function names, endpoint paths or css classes.
+"""
+
+import os
+import json
+from pathlib import Path
+from src.tools.rag.bm25 import BM25
+from src.tools.rag.code_splitter import split_code
+from src.tools.rag.index_manifest import description_id, description_source, description_chunk_nr
+from src.utilities.util_functions import join_paths
+
+
+INDEX_VERSION = 1
+
+
+class LexicalIndex:
+    """
+    Stored in .clean_coder/bm25_index.json, next to chroma base. Document ids are the same as in vector storage;
+    every document contains description, path of the file and source code of described file or chunk.
+    """
+
+    instances = {}
+
+    @staticmethod
+    def for_work_dir(work_dir):
+        """Return index shared by the whole process for provided work dir."""
+        if work_dir not in LexicalIndex.instances:
+            LexicalIndex.instances[work_dir] = LexicalIndex(work_dir)
+        return LexicalIndex.instances[work_dir]
+
+    def __init__(self, work_dir):
+        self.work_dir = work_dir
+        self.path = join_paths(work_dir, ".clean_coder", "bm25_index.json")
+        self.description_folder = join_paths(work_dir, ".clean_coder", "files_and_folders_descriptions")
+        self.bm25 = BM25()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return
+        if index.get("version") != INDEX_VERSION:
+            return
+        for doc_id, term_counts in index["docs"].items():
+            self.bm25.add(doc_id, term_counts=term_counts)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "docs": self.bm25.doc_term_counts}, f)
+        os.replace(tmp_path, self.path)
+
+    def _read(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except (FileNotFoundError, UnicodeDecodeError):
+            return ""
+
+    def index_descriptions(self, description_names):
+        """(Re)index provided descriptions together with source code they describe."""
+        # descriptions of the same file share its source and chunks
+        names_by_file = {}
+        for name in description_names:
+            names_by_file.setdefault(description_source(name), []).append(name)
+
+        for filename, names in names_by_file.items():
+            source = self._read(join_paths(self.work_dir, filename))
+            chunks = split_code(source, Path(filename).suffix.lstrip(".")) if source else []
+            for name in names:
+                chunk_nr = description_chunk_nr(name)
+                if chunk_nr is not None:
+                    code = chunks[chunk_nr] if chunk_nr < len(chunks) else ""
+                elif len(chunks) <= 1:
+                    code = source
+                else:
+                    # code of multi-chunk files is indexed with their chunks
+                    code = ""
+                description = self._read(join_paths(self.description_folder, name))
+                self.bm25.add(description_id(name), f"{filename}\n{description}\n{code}")
+
+    def index_missing(self):
+        """Index descriptions present in descriptions folder but not in index yet. Returns number of them."""
+        if not os.path.exists(self.description_folder):
+            return 0
+        missing = [
+            name for name in os.listdir(self.description_folder) if description_id(name) not in self.bm25.doc_term_counts
+        ]
+        self.index_descriptions(missing)
+        return len(missing)
+
+    def remove(self, doc_ids):
+        for doc_id in doc_ids:
+            self.bm25.remove(doc_id)
+
+    def search(self, query, n_results):
+        """Return ids of best matching documents, the best first."""
+        return self.bm25.search(query, n_results)
@@ -1,8 +1,6 @@
-from src.tools.rag.index_file_descriptions import (
-    write_file_descriptions,
-    write_file_chunks_descriptions,
-    upsert_file_list,
-)
+from src.tools.rag.index_file_descriptions import describe_changed_files, work_dir
+from src.tools.rag.index_manifest import IndexManifest
+from src.tools.rag.lexical_index import LexicalIndex
 from src.utilities.objects import CodeFile
 from src.utilities.print_formatters import print_formatted
 
@@ -15,10 +13,10 @@ def update_descriptions(file_list: [CodeFile]):
         print_formatted("No modified files to update descriptions for.", color="magenta")
         return
         
-    # TODO: remove old descriptions
     print_formatted("Updating descriptions...", color="magenta")
-    write_file_descriptions(file_list)
-    write_file_chunks_descriptions(file_list)
-
-    # uploade file list descriptins to vdb
-    upsert_file_list(file_list)
+    manifest = IndexManifest(work_dir)
+    # changed files are uploaded to vdb as soon as they are described
+    describe_changed_files(file_list, manifest)
+    manifest.save()
+    LexicalIndex.for_work_dir(work_dir).save()
+    print_formatted("Re-indexing of modified files completed.", color="green")
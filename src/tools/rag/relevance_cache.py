@@ -0,0 +1,106 @@
+"""
+Persistent cache of BinaryRanker relevance verdicts, so repeated semantic queries do not call LLM again.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from src.tools.rag.index_manifest import content_hash
+from src.utilities.util_functions import join_paths
+
+
+MAX_ENTRIES = 5000
+TTL_SECONDS = 30 * 24 * 3600
+
+
+def normalize_query(query: str) -> str:
+    """Make near-identical queries (different case, spacing or trailing punctuation) share cache entries."""
+    query = re.sub(r"\s+", " ", query.lower()).strip()
+    return query.strip(" .?!,;:'\"")
+
+
+class RelevanceCache:
+    """
+    Verdicts keyed by normalized query, document id and hash of document content, stored in
+    .clean_coder/relevance_cache.json. Least recently used entries are evicted above MAX_ENTRIES, and entries
+    older than TTL_SECONDS expire. When description of a document changes, all its verdicts are dropped.
+    """
+
+    instances = {}
+
+    @staticmethod
+    def for_work_dir(work_dir):
+        """Return cache shared by the whole process for provided work dir."""
+        if work_dir not in RelevanceCache.instances:
+            RelevanceCache.instances[work_dir] = RelevanceCache(work_dir)
+        return RelevanceCache.instances[work_dir]
+
+    def __init__(self, work_dir, max_entries=MAX_ENTRIES, ttl_seconds=TTL_SECONDS):
+        self.path = join_paths(work_dir, ".clean_coder", "relevance_cache.json")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        # key -> {"doc": doc_id, "doc_hash": hash, "relevant": bool, "used": timestamp}; ordered from least recently used
+        self.entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        # temporary file is shared, so it's replaced under the lock too
+        with self.lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _key(query, doc_id, doc_hash):
+        return content_hash(f"{normalize_query(query)}\0{doc_id}\0{doc_hash}")
+
+    def _drop_outdated(self, doc_id, doc_hash):
+        """Remove verdicts for previous versions of document description."""
+        outdated = [
+            key for key, entry in self.entries.items() if entry["doc"] == doc_id and entry["doc_hash"] != doc_hash
+        ]
+        for key in outdated:
+            del self.entries[key]
+
+    def get(self, query, doc_id, document):
+        """Return cached verdict (True/False), or None if not known."""
+        key = self._key(query, doc_id, content_hash(document))
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            if time.time() - entry["used"] > self.ttl_seconds:
+                return None
+            entry["used"] = time.time()
+            # re-insert to mark as most recently used
+            self.entries[key] = entry
+            return entry["relevant"]
+
+    def put(self, query, doc_id, document, relevant):
+        doc_hash = content_hash(document)
+        key = self._key(query, doc_id, doc_hash)
+        with self.lock:
+            self._drop_outdated(doc_id, doc_hash)
+            self.entries.pop(key, None)
+            self.entries[key] = {"doc": doc_id, "doc_hash": doc_hash, "relevant": relevant, "used": time.time()}
+            while len(self.entries) > self.max_entries:
+                del self.entries[next(iter(self.entries))]
+
+    def drop_documents(self, doc_ids):
+        """Remove verdicts of documents which were deleted from vector storage."""
+        doc_ids = set(doc_ids)
+        with self.lock:
+            self.entries = {key: entry for key, entry in self.entries.items() if entry["doc"] not in doc_ids}
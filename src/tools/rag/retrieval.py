@@ -1,9 +1,14 @@
 import os
+import threading
 import chromadb
 from chromadb.errors import NotFoundError
 from pathlib import Path
 from dotenv import load_dotenv, find_dotenv
 from src.utilities.llms import init_llms_mini
+from src.utilities.util_functions import join_paths
+from src.tools.rag.relevance_cache import RelevanceCache
+from src.tools.rag.bm25 import BM25
+from src.tools.rag.lexical_index import LexicalIndex
 from langchain.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 
@@ -34,23 +39,107 @@ class BinaryRankingResult(BaseModel):
     )
 
 
-def get_collection():
-    chroma_client = chromadb.PersistentClient(path=os.getenv("WORK_DIR") + "/.clean_coder/chroma_base")
-    from chromadb.utils import embedding_functions
+def collection_name_for(work_dir):
+    return f"clean_coder_{Path(work_dir).name}_file_descriptions"
+
 
-    # embedding_function = embedding_functions.OpenAIEmbeddingFunction(
-    #     api_key=os.getenv("OPENAI_API_KEY"), model_name="text-embedding-3-small"
-    # )
-    try:
-        return chroma_client.get_collection(name=collection_name)  # , embedding_function=embedding_function)
-    except NotFoundError:
-        return False
+class ChromaRegistry:
+    """
+    Process-wide registry of Chroma clients and collection handles, keyed by work dir. Client is opened lazily
+    on first use and reused afterwards, as opening it on a big base is expensive.
+    Call invalidate() when collection changed, to get a fresh handle on next use.
+    """
+
+    clients = {}
+    collections = {}
+    lock = threading.Lock()
+    # Chroma default (local ONNX model, downloaded on first use) if None; set to use other embeddings, e.g. in tests
+    embedding_function = None
+
+    @staticmethod
+    def get_client(work_dir):
+        with ChromaRegistry.lock:
+            if work_dir not in ChromaRegistry.clients:
+                ChromaRegistry.clients[work_dir] = chromadb.PersistentClient(
+                    path=join_paths(work_dir, ".clean_coder/chroma_base")
+                )
+            return ChromaRegistry.clients[work_dir]
+
+    @staticmethod
+    def get_collection(work_dir, create=False):
+        """Return collection of file descriptions, or False if it does not exist and create is False."""
+        collection = ChromaRegistry.collections.get(work_dir)
+        if collection is not None:
+            return collection
+        chroma_client = ChromaRegistry.get_client(work_dir)
+        # embedding_function = embedding_functions.OpenAIEmbeddingFunction(
+        #     api_key=os.getenv("OPENAI_API_KEY"), model_name="text-embedding-3-small"
+        # )
+        options = {"name": collection_name_for(work_dir)}
+        if ChromaRegistry.embedding_function is not None:
+            options["embedding_function"] = ChromaRegistry.embedding_function
+        if create:
+            collection = chroma_client.get_or_create_collection(**options)
+        else:
+            try:
+                collection = chroma_client.get_collection(**options)
+            except NotFoundError:
+                # not cached, so collection created later will be found
+                return False
+        with ChromaRegistry.lock:
+            ChromaRegistry.collections[work_dir] = collection
+        return collection
+
+    @staticmethod
+    def invalidate(work_dir=None):
+        """Forget cached collection handle of work dir (or of all work dirs if not provided)."""
+        with ChromaRegistry.lock:
+            if work_dir is None:
+                ChromaRegistry.collections.clear()
+            else:
+                ChromaRegistry.collections.pop(work_dir, None)
+
+
+def get_collection():
+    return ChromaRegistry.get_collection(os.getenv("WORK_DIR"))
 
 
 def vdb_available():
     return True if get_collection() else False
 
 
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """Merge lists of document ids ordered by relevance into one list, the best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def fuse_retrievals(collection, vector_retrieval: dict, lexical_ids: list, n_results: int) -> dict:
+    """
+    Combine vector search results with lexical (BM25) hits using reciprocal rank fusion.
+    Returns dict in format of chroma query results. Distances of documents found only lexically are None.
+    """
+    vector_ids = vector_retrieval["ids"][0]
+    documents = dict(zip(vector_ids, vector_retrieval["documents"][0]))
+    distances = dict(zip(vector_ids, (vector_retrieval.get("distances") or [[None] * len(vector_ids)])[0]))
+
+    lexical_only_ids = [doc_id for doc_id in lexical_ids if doc_id not in documents]
+    if lexical_only_ids:
+        found = collection.get(ids=lexical_only_ids, include=["documents"])
+        documents.update(zip(found["ids"], found["documents"]))
+
+    fused_ids = [doc_id for doc_id in reciprocal_rank_fusion([vector_ids, lexical_ids]) if doc_id in documents]
+    fused_ids = fused_ids[:n_results]
+    return {
+        "ids": [fused_ids],
+        "documents": [[documents[doc_id] for doc_id in fused_ids]],
+        "distances": [[distances.get(doc_id) for doc_id in fused_ids]],
+    }
+
+
 def retrieve(question: str) -> str:
     """
     Retrieve files descriptions by semantic query.
@@ -63,10 +152,12 @@ def retrieve(question: str) -> str:
     """
     collection = get_collection()
     retrieval = collection.query(query_texts=[question], n_results=8)
+    lexical_ids = LexicalIndex.for_work_dir(os.getenv("WORK_DIR")).search(question, n_results=8)
+    retrieval = fuse_retrievals(collection, retrieval, lexical_ids, n_results=8)
 
-    # Use BinaryRanker to filter relevant documents
-    binary_ranker = BinaryRanker()
-    ranking_results = binary_ranker.rank(question, retrieval)
+    # Use ranker selected by RERANKER to filter relevant documents
+    ranker = get_ranker()
+    ranking_results = ranker.rank(question, retrieval)
 
     # Filter documents that are marked as relevant (True)
     response = ""
@@ -96,14 +187,18 @@ class BinaryRanker:
     (0 or 1) for each document.
     """
 
-    def __init__(self):
+    def __init__(self, cache: RelevanceCache = None):
         """
         Initialize the BinaryRanker with lazy loading.
 
         The LLM chain is not created until the rank method is called.
+
+        Parameters:
+        cache (RelevanceCache): Optional cache of previous verdicts. Cached documents are not sent to LLM.
         """
         # Lazy-loaded chain; not initialized until rank() is called.
         self.chain = None
+        self.cache = cache
 
     def initialize_chain(self):
         """
@@ -142,30 +237,143 @@ class BinaryRanker:
         Returns:
         list: A list of tuples containing document IDs and their binary relevance scores ('0' or '1').
         """
-        # Ensure the chain is initialized (lazy loading)
-        self.initialize_chain()
-
         # Extract list of documents and their ids from the retrieval result.
         documents_list = retrieval["documents"][0]
         filenames_list = retrieval["ids"][0]
 
-        # Build input for batch processing: list of dicts containing question, filename, and document.
-        batch_inputs = []
-        for idx, doc in enumerate(documents_list):
-            batch_inputs.append({"question": question, "filename": filenames_list[idx], "document": doc})
-
-        # Use the chain batch function to get structured outputs.
-        results = self.chain.batch(batch_inputs)
-
+        # Take verdicts known from previous queries from cache.
+        verdicts = {}
+        if self.cache:
+            for idx, doc in enumerate(documents_list):
+                verdict = self.cache.get(question, filenames_list[idx], doc)
+                if verdict is not None:
+                    verdicts[idx] = verdict
+        uncached = [idx for idx in range(len(documents_list)) if idx not in verdicts]
+
+        if uncached:
+            # Ensure the chain is initialized (lazy loading)
+            self.initialize_chain()
+
+            # Build input for batch processing: list of dicts containing question, filename, and document.
+            batch_inputs = []
+            for idx in uncached:
+                batch_inputs.append({"question": question, "filename": filenames_list[idx], "document": documents_list[idx]})
+
+            # Use the chain batch function to get structured outputs.
+            results = self.chain.batch(batch_inputs)
+
+            for idx, result in zip(uncached, results):
+                verdicts[idx] = result.is_relevant
+                if self.cache:
+                    self.cache.put(question, filenames_list[idx], documents_list[idx], result.is_relevant)
+            if self.cache:
+                self.cache.save()
 
         # Pair each document id with its binary ranking result.
         ranking = []
-        for idx, result in enumerate(results):
-            ranking.append((filenames_list[idx], result.is_relevant))
+        for idx in range(len(documents_list)):
+            ranking.append((filenames_list[idx], verdicts[idx]))
 
         return ranking
 
 
+class LocalRanker:
+    """
+    A document ranker working fully locally on CPU, in milliseconds and without LLM calls.
+
+    Fuses lexical BM25 score of the document (normalized by the score of a document matching all query terms) with
+    its vector similarity to the query. Documents with fused score above threshold are relevant. Without
+    distances from vector search, the lexical score decides alone.
+    """
+
+    vector_weight = 0.5
+    threshold = 0.5
+
+    def scores(self, question: str, retrieval: dict) -> list:
+        """Return fused relevance score (0-1) of every retrieved document."""
+        documents_list = retrieval["documents"][0]
+        bm25 = BM25(documents_list)
+        bm25_scores = bm25.scores(question)
+        full_match = bm25.full_match_score(question)
+        distances = (retrieval.get("distances") or [None])[0]
+
+        scores = []
+        for idx in range(len(documents_list)):
+            lexical = min(bm25_scores[idx] / full_match, 1.0) if full_match else 0.0
+            if not distances or distances[idx] is None:
+                scores.append(lexical)
+                continue
+            # squared L2 distance of normalized embeddings is 2 - 2 * cosine similarity
+            vector = min(max(1 - distances[idx] / 2, 0.0), 1.0)
+            scores.append(self.vector_weight * vector + (1 - self.vector_weight) * lexical)
+        return scores
+
+    def rank(self, question: str, retrieval: dict) -> list:
+        """
+        Rank documents based on their relevance to the question.
+
+        Returns:
+        list: A list of tuples containing document IDs and their binary relevance, the most relevant first.
+        """
+        filenames_list = retrieval["ids"][0]
+        scores = self.scores(question, retrieval)
+        order = sorted(range(len(filenames_list)), key=lambda idx: scores[idx], reverse=True)
+        return [(filenames_list[idx], scores[idx] >= self.threshold) for idx in order]
+
+
+class HybridRanker(LocalRanker):
+    """
+    Ranks documents locally and asks BinaryRanker only about borderline ones, which local score
+    is close to the threshold.
+    """
+
+    borderline_margin = 0.15
+
+    def __init__(self, llm_ranker):
+        self.llm_ranker = llm_ranker
+
+    def rank(self, question: str, retrieval: dict) -> list:
+        filenames_list = retrieval["ids"][0]
+        documents_list = retrieval["documents"][0]
+        scores = self.scores(question, retrieval)
+
+        verdicts = {}
+        borderline = []
+        for idx, score in enumerate(scores):
+            if abs(score - self.threshold) < self.borderline_margin:
+                borderline.append(idx)
+            else:
+                verdicts[idx] = score >= self.threshold
+
+        if borderline:
+            borderline_retrieval = {
+                "ids": [[filenames_list[idx] for idx in borderline]],
+                "documents": [[documents_list[idx] for idx in borderline]],
+            }
+            llm_ranking = self.llm_ranker.rank(question, borderline_retrieval)
+            for idx, (_, is_relevant) in zip(borderline, llm_ranking):
+                verdicts[idx] = is_relevant
+
+        order = sorted(range(len(filenames_list)), key=lambda idx: scores[idx], reverse=True)
+        return [(filenames_list[idx], verdicts[idx]) for idx in order]
+
+
+def get_ranker():
+    """
+    Return ranker selected with RERANKER env variable:
+    'llm' (default) - BinaryRanker asks LLM about every document,
+    'local' - LocalRanker, no LLM calls,
+    'hybrid' - HybridRanker, LLM asked only about borderline documents.
+    """
+    ranker_type = (os.getenv("RERANKER") or "llm").lower()
+    if ranker_type == "local":
+        return LocalRanker()
+    llm_ranker = BinaryRanker(cache=RelevanceCache.for_work_dir(os.getenv("WORK_DIR")))
+    if ranker_type == "hybrid":
+        return HybridRanker(llm_ranker)
+    return llm_ranker
+
+
 if __name__ == "__main__":
     # Example usage of BinaryRanker for testing.
     question = "Example of structured output of llm response."
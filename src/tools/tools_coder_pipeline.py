@@ -6,6 +6,8 @@ from src.linters.syntax_checker_functions import check_syntax
 from src.utilities.start_work_functions import file_folder_ignored
 from src.utilities.util_functions import join_paths, WRONG_TOOL_CALL_WORD, TOOL_NOT_EXECUTED_WORD
 from src.utilities.user_input import user_input
+from src.utilities.tree_snapshot import TreeSnapshot
+from src.utilities.file_content_cache import FileContentCache
 from src.tools.rag.retrieval import retrieve
 
 
@@ -59,6 +61,7 @@ def prepare_see_file_tool(work_dir):
             formatted_lines = [f"{i+1}|{line[:-1]}|{i+1}\n" for i, line in enumerate(lines)]
             file_content = "".join(formatted_lines)
             file_content = filename + ":\n\n" + file_content
+            TreeSnapshot.for_work_dir(work_dir).mark_touched(filename)
 
             return file_content
         except Exception as e:
@@ -124,6 +127,8 @@ def prepare_insert_code_tool(work_dir):
                 file.seek(0)
                 file.truncate()
                 file.write(file_contents)
+            FileContentCache.invalidate(join_paths(work_dir, filename))
+            TreeSnapshot.for_work_dir(work_dir).mark_touched(filename)
             return "Code inserted."
         except Exception as e:
             return f"{type(e).__name__}: {e}"
@@ -162,6 +167,8 @@ def prepare_replace_code_tool(work_dir):
                 file.seek(0)
                 file.truncate()
                 file.write(file_contents)
+            FileContentCache.invalidate(join_paths(work_dir, filename))
+            TreeSnapshot.for_work_dir(work_dir).mark_touched(filename)
             return "Code modified."
         except Exception as e:
             return f"{type(e).__name__}: {e}"
@@ -196,6 +203,8 @@ def prepare_create_file_tool(work_dir):
 
             with open(full_path, "w", encoding="utf-8") as file:
                 file.write(code)
+            FileContentCache.invalidate(full_path)
+            TreeSnapshot.for_work_dir(work_dir).mark_touched(filename)
             return "File been created successfully."
         except Exception as e:
             return f"{type(e).__name__}: {e}"
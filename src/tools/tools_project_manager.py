@@ -134,7 +134,9 @@ def finish_project_planning(dummy: Annotated[str, "Type 'ok' to proceed."]):
     # Start background research of second task if available and not researched yet
     if len(tasks) >= 2:
         second_task = tasks[1]
-        history_file = join_paths(work_dir, ".clean_coder", f"research_history_task_{second_task.id}.json")
+        history_file = join_paths(
+            work_dir, ".clean_coder", "research_histories", f"research_history_task_{second_task.id}.jsonl"
+        )
         if not os.path.exists(history_file):
             background_executor.submit(research_second_task, second_task)
 
@@ -0,0 +1,155 @@
+"""
+Content-addressed store of large texts from saved histories: file contents, directory trees, script logs, images.
+The same text repeats in manager and research histories many times, so it's stored once, compressed, under
+.clean_coder/blobs/<hash[:2]>/<hash>, and histories reference it by hash. Compressed with zstd when `zstandard`
+package is installed, with gzip otherwise; both formats are read.
+"""
+
+import os
+import re
+import gzip
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# shorter strings are kept in history itself
+BLOB_MIN_CHARS = 2048
+BLOB_KEY = "$blob"
+# blobs used that recently are never removed, as histories being written right now may reference them
+UNREFERENCED_GRACE_SECONDS = 3600
+BLOB_REFERENCE = re.compile(r'"\$blob": "([0-9a-f]{64})"')
+
+
+def blob_dir_for(history_path):
+    """Blobs are shared by all histories of project: kept in .clean_coder/blobs, or next to history outside of it."""
+    folder = os.path.dirname(os.path.abspath(history_path))
+    while True:
+        if os.path.basename(folder) == ".clean_coder":
+            return os.path.join(folder, "blobs")
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return os.path.join(os.path.dirname(os.path.abspath(history_path)), "blobs")
+        folder = parent
+
+
+class BlobStore:
+    """Blobs of one folder. Decompressed blobs are cached, as loaded histories reference the same ones many times."""
+
+    instances = {}
+    lock = threading.Lock()
+    MAX_CACHED = 128
+
+    @staticmethod
+    def for_dir(folder):
+        with BlobStore.lock:
+            if folder not in BlobStore.instances:
+                BlobStore.instances[folder] = BlobStore(folder)
+            return BlobStore.instances[folder]
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = threading.Lock()
+        # hash -> text
+        self.cache = OrderedDict()
+
+    def _path(self, key, extension):
+        return os.path.join(self.folder, key[:2], key + extension)
+
+    def _paths(self, key):
+        return self._path(key, ".zst"), self._path(key, ".gz")
+
+    def put(self, text):
+        """Store text if it's not stored yet, return its hash."""
+        data = text.encode("utf-8")
+        key = hashlib.sha256(data).hexdigest()
+        existing = next((path for path in self._paths(key) if os.path.exists(path)), None)
+        if existing is not None:
+            # marks blob as used, see remove_unreferenced
+            os.utime(existing)
+        else:
+            if zstandard is not None:
+                path, compressed = self._path(key, ".zst"), zstandard.ZstdCompressor().compress(data)
+            else:
+                path, compressed = self._path(key, ".gz"), gzip.compress(data, compresslevel=6, mtime=0)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+        self._remember(key, text)
+        return key
+
+    def get(self, key):
+        """Text of blob. Raises FileNotFoundError if it's missing."""
+        with self.lock:
+            text = self.cache.get(key)
+            if text is not None:
+                self.cache.move_to_end(key)
+                return text
+        zst_path = self._path(key, ".zst")
+        if os.path.exists(zst_path):
+            if zstandard is None:
+                raise FileNotFoundError(f"Blob {zst_path} needs zstandard package to be read.")
+            with open(zst_path, "rb") as f:
+                data = zstandard.ZstdDecompressor().decompress(f.read())
+        else:
+            with open(self._path(key, ".gz"), "rb") as f:
+                data = gzip.decompress(f.read())
+        text = data.decode("utf-8")
+        self._remember(key, text)
+        return text
+
+    def _remember(self, key, text):
+        with self.lock:
+            self.cache[key] = text
+            self.cache.move_to_end(key)
+            if len(self.cache) > BlobStore.MAX_CACHED:
+                self.cache.popitem(last=False)
+
+    def externalized(self, value):
+        """Copy of JSON-like value with long strings replaced by {"$blob": hash} references."""
+        if isinstance(value, str):
+            return {BLOB_KEY: self.put(value)} if len(value) >= BLOB_MIN_CHARS else value
+        if isinstance(value, dict):
+            return {key: self.externalized(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.externalized(item) for item in value]
+        return value
+
+    def rehydrated(self, value):
+        """Reverse of externalized."""
+        if isinstance(value, dict):
+            if len(value) == 1 and BLOB_KEY in value:
+                return self.get(value[BLOB_KEY])
+            return {key: self.rehydrated(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.rehydrated(item) for item in value]
+        return value
+
+    def remove_unreferenced(self, history_paths):
+        """
+        Delete blobs not referenced by any of histories, e.g. after histories of finished tasks were removed.
+        Blobs stored or reused within the last UNREFERENCED_GRACE_SECONDS are kept.
+        """
+        referenced = set()
+        for path in history_paths:
+            with open(path, "r", encoding="utf-8") as f:
+                referenced.update(BLOB_REFERENCE.findall(f.read()))
+        if not os.path.isdir(self.folder):
+            return
+        used_before = time.time() - UNREFERENCED_GRACE_SECONDS
+        for prefix in os.listdir(self.folder):
+            prefix_dir = os.path.join(self.folder, prefix)
+            for fname in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, fname)
+                if fname.endswith(".tmp") or fname.split(".")[0] in referenced:
+                    continue
+                if os.path.getmtime(path) < used_before:
+                    os.remove(path)
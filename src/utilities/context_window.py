@@ -0,0 +1,176 @@
+"""
+Token-aware context window of agent conversations. Keeps requests to LLM under CONTEXT_MAX_TOKENS budget by
+removing outputs of old tool calls first, and then whole old exchanges, never separating tool call from its result.
+System, task and file contents messages stay always.
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from src.utilities.tree_renderer import CHARS_PER_TOKEN
+from src.utilities.tool_result_summarizer import ToolResultSummarizer, summarizing_enabled
+
+
+DEFAULT_MAX_TOKENS = 120000
+# tool results of that many last tool calls are never shortened
+KEEP_RECENT_TOOL_RESULTS = 3
+# images are sent as base64, which length has nothing to do with tokens they cost
+IMAGE_TOKENS = 1500
+# role and formatting tokens added by providers to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+REMOVED_TOOL_OUTPUT = "Output of this old {tool_name} call was removed to save context. Call the tool again if needed."
+
+
+def context_max_tokens():
+    return int(os.getenv("CONTEXT_MAX_TOKENS") or DEFAULT_MAX_TOKENS)
+
+
+class Tokenizer:
+    """
+    Counts tokens with local tiktoken encoding. If encoding can not be loaded (its files are downloaded on first use),
+    tokens are estimated from number of characters.
+    """
+
+    encoding = None
+    loaded = False
+    lock = threading.Lock()
+    MAX_CACHED = 4096
+    # (message type, text) -> tokens; messages are counted again on every step, but rarely change
+    cache = OrderedDict()
+
+    @staticmethod
+    def count(text):
+        if not Tokenizer.loaded:
+            with Tokenizer.lock:
+                if not Tokenizer.loaded:
+                    Tokenizer.encoding = Tokenizer._load_encoding()
+                    Tokenizer.loaded = True
+        if Tokenizer.encoding is None:
+            return len(text) // CHARS_PER_TOKEN + 1
+        return len(Tokenizer.encoding.encode(text, disallowed_special=()))
+
+    @staticmethod
+    def _load_encoding():
+        try:
+            import tiktoken
+
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+
+    @staticmethod
+    def message_tokens(message):
+        text, images = message_text(message)
+        key = (message.type, text)
+        with Tokenizer.lock:
+            tokens = Tokenizer.cache.get(key)
+            if tokens is not None:
+                Tokenizer.cache.move_to_end(key)
+        if tokens is None:
+            tokens = Tokenizer.count(text) + MESSAGE_OVERHEAD_TOKENS
+            with Tokenizer.lock:
+                Tokenizer.cache[key] = tokens
+                if len(Tokenizer.cache) > Tokenizer.MAX_CACHED:
+                    Tokenizer.cache.popitem(last=False)
+        return tokens + images * IMAGE_TOKENS
+
+
+def message_text(message):
+    """Return (text of message including its tool calls, number of images in it)."""
+    images = 0
+    if isinstance(message.content, str):
+        parts = [message.content]
+    else:
+        parts = []
+        for block in message.content:
+            if isinstance(block, str):
+                parts.append(block)
+            elif block.get("type") in ("image_url", "image"):
+                images += 1
+            else:
+                parts.append(block.get("text", ""))
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        parts.append(tool_call["name"] + json.dumps(tool_call["args"]))
+    return "\n".join(parts), images
+
+
+def is_pinned(message):
+    return (
+        message.type == "system"
+        or hasattr(message, "contains_file_contents")
+        or hasattr(message, "tasks_and_progress_message")
+    )
+
+
+def group_exchanges(messages):
+    """
+    Split messages into units which can be removed only together: AI message with results of its tool calls,
+    or a single other message. Returns list of lists of message indexes.
+    """
+    units = []
+    open_calls = {}
+    for index, message in enumerate(messages):
+        if message.type == "tool" and message.tool_call_id in open_calls:
+            open_calls[message.tool_call_id].append(index)
+            continue
+        unit = [index]
+        units.append(unit)
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            open_calls[tool_call["id"]] = unit
+    return units
+
+
+class ContextWindow:
+    """
+    Fits conversations into token budget (CONTEXT_MAX_TOKENS by default). Messages before the first AI message
+    (system message, task and initial context) are pinned, as are file contents and tasks messages.
+    With summarize_old_results, old tool results are replaced by their digests (see tool_result_summarizer)
+    whenever SUMMARIZE_OLD_TOOL_RESULTS is enabled, even if conversation fits into the budget.
+    """
+
+    def __init__(self, max_tokens=None, summarize_old_results=False):
+        self.max_tokens = max_tokens or context_max_tokens()
+        self.summarize_old_results = summarize_old_results
+
+    def fit(self, messages):
+        """Return messages which fit into the budget. Passed list and its messages are not modified."""
+        if self.summarize_old_results and summarizing_enabled():
+            messages = ToolResultSummarizer.digested(messages)
+        tokens = [Tokenizer.message_tokens(message) for message in messages]
+        total = sum(tokens)
+        if total <= self.max_tokens:
+            return messages
+
+        messages = list(messages)
+        first_ai = next((i for i, message in enumerate(messages) if message.type == "ai"), len(messages))
+        pinned = {i for i, message in enumerate(messages) if i < first_ai or is_pinned(message)}
+
+        # 1. remove outputs of old tool calls, the oldest first
+        tool_names = {
+            tool_call["id"]: tool_call["name"]
+            for message in messages
+            for tool_call in getattr(message, "tool_calls", None) or []
+        }
+        tool_indexes = [i for i, message in enumerate(messages) if message.type == "tool" and i not in pinned]
+        for i in tool_indexes[: max(len(tool_indexes) - KEEP_RECENT_TOOL_RESULTS, 0)]:
+            if total <= self.max_tokens:
+                return messages
+            tool_name = tool_names.get(messages[i].tool_call_id, "tool")
+            shortened = messages[i].model_copy(update={"content": REMOVED_TOOL_OUTPUT.format(tool_name=tool_name)})
+            shortened_tokens = Tokenizer.message_tokens(shortened)
+            if shortened_tokens < tokens[i]:
+                total -= tokens[i] - shortened_tokens
+                messages[i], tokens[i] = shortened, shortened_tokens
+
+        # 2. remove whole old exchanges, the oldest first; the newest one is always kept
+        removed = set()
+        units = group_exchanges(messages)
+        for unit in units[:-1]:
+            if total <= self.max_tokens:
+                break
+            if any(i in pinned for i in unit):
+                continue
+            removed.update(unit)
+            total -= sum(tokens[i] for i in unit)
+        return [message for i, message in enumerate(messages) if i not in removed]
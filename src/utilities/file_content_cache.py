@@ -0,0 +1,65 @@
+"""
+In-memory cache of file contents shown to agents, so the working set of files is not read and formatted again
+after every agent step when only a few of the files changed.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class FileContentCache:
+    """
+    Raw lines of files and their rendered blocks (with and without line numbers), keyed by path and validated by
+    (mtime, size) of the file. Least recently used files are evicted above MAX_ENTRIES.
+    """
+
+    MAX_ENTRIES = 256
+
+    # path -> {"signature": (mtime_ns, size), "lines": [...], "rendered": {line_numbers: str}}
+    entries = OrderedDict()
+    lock = threading.Lock()
+
+    @staticmethod
+    def _entry(path):
+        """Return up to date cache entry for a file. Raises FileNotFoundError for not existing files."""
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with FileContentCache.lock:
+            entry = FileContentCache.entries.get(path)
+            if entry is not None and entry["signature"] == signature:
+                FileContentCache.entries.move_to_end(path)
+                return entry
+        with open(path, "r", encoding="utf-8") as file:
+            lines = file.readlines()
+        entry = {"signature": signature, "lines": lines, "rendered": {}}
+        with FileContentCache.lock:
+            FileContentCache.entries[path] = entry
+            FileContentCache.entries.move_to_end(path)
+            while len(FileContentCache.entries) > FileContentCache.MAX_ENTRIES:
+                FileContentCache.entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def lines(path):
+        """Return lines of a file, as file.readlines() would."""
+        return FileContentCache._entry(path)["lines"]
+
+    @staticmethod
+    def rendered(path, line_numbers=True):
+        """Return file content formatted for agents, in 'N|line |N' form if line_numbers."""
+        entry = FileContentCache._entry(path)
+        rendered = entry["rendered"].get(line_numbers)
+        if rendered is None:
+            if line_numbers:
+                rendered = "".join(f"{i + 1}|{line.rstrip()} |{i+1}\n" for i, line in enumerate(entry["lines"]))
+            else:
+                rendered = "".join(f"{line.rstrip()}\n" for line in entry["lines"])
+            entry["rendered"][line_numbers] = rendered
+        return rendered
+
+    @staticmethod
+    def invalidate(path):
+        """Forget a file. Call it after writing to the file, in case its mtime and size stayed the same."""
+        with FileContentCache.lock:
+            FileContentCache.entries.pop(path, None)
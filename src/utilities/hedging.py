@@ -0,0 +1,143 @@
+"""
+Hedged LLM requests. If the primary model does not answer within a delay adapted to its usual latency, the same
+request is sent to the secondary model; the first valid response wins and the other request is cancelled.
+Enabled with LLM_HEDGING env variable.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import wait, FIRST_COMPLETED
+from langchain_core.runnables import RunnableLambda
+from src.utilities.llm_health import LLMHealth, model_key, is_timeout
+from src.utilities.start_work_functions import Work
+
+
+DEFAULT_HEDGE_DELAY = 20.0
+MIN_HEDGE_DELAY = 3.0
+MAX_HEDGE_DELAY = 60.0
+# hedge when primary is that many times slower than its average
+HEDGE_LATENCY_FACTOR = 2.0
+DEFAULT_BUDGET = 0.1
+
+
+def hedging_enabled():
+    return bool(os.getenv("LLM_HEDGING"))
+
+
+class HedgeBudget:
+    """
+    Caps hedged requests to LLM_HEDGING_BUDGET part of all calls (default 10%), so hedging can't double the costs.
+    """
+
+    lock = threading.Lock()
+    calls = 0
+    hedges = 0
+
+    @staticmethod
+    def register_call():
+        with HedgeBudget.lock:
+            HedgeBudget.calls += 1
+
+    @staticmethod
+    def try_spend():
+        """Return True and count a hedge if budget allows one more."""
+        budget = float(os.getenv("LLM_HEDGING_BUDGET") or DEFAULT_BUDGET)
+        with HedgeBudget.lock:
+            # one hedge is allowed from the start, so the first slow call can be hedged too
+            if HedgeBudget.hedges + 1 > budget * HedgeBudget.calls + 1:
+                return False
+            HedgeBudget.hedges += 1
+            return True
+
+
+class HedgingLoop:
+    """
+    One event loop running in a background thread for all hedged requests. Async clients of LLMs are bound
+    to the loop they were first used in, so all requests need to run in the same one.
+    """
+
+    loop = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def submit(coroutine):
+        """Schedule coroutine in the loop and return concurrent.futures.Future of it. Cancelling future cancels it."""
+        with HedgingLoop.lock:
+            if HedgingLoop.loop is None:
+                HedgingLoop.loop = asyncio.new_event_loop()
+                threading.Thread(target=HedgingLoop.loop.run_forever, daemon=True, name="llm-hedging").start()
+        return asyncio.run_coroutine_threadsafe(coroutine, HedgingLoop.loop)
+
+
+def hedge_delay(health, llm):
+    """How long to wait for the model before hedging, based on its average latency."""
+    latency = health.models.get(model_key(llm), {}).get("latency")
+    if latency is None:
+        return DEFAULT_HEDGE_DELAY
+    return min(max(HEDGE_LATENCY_FACTOR * latency, MIN_HEDGE_DELAY), MAX_HEDGE_DELAY)
+
+
+def hedged_invoke(primary, secondary, llm_input, health, prepare=None):
+    """
+    Invoke primary model, hedging with secondary one if primary is slow. Returns response of the winner.
+    If both models fail, raises exception of the one which failed last. Outcomes are recorded in health stats.
+    prepare(llm, llm_input) can adjust input for each model.
+    """
+    prepare = prepare or (lambda llm, llm_input: llm_input)
+    HedgeBudget.register_call()
+    started = {}
+    running = {}
+
+    def start(llm):
+        started[id(llm)] = time.monotonic()
+        running[HedgingLoop.submit(llm.ainvoke(prepare(llm, llm_input)))] = llm
+
+    start(primary)
+    wait(running, timeout=hedge_delay(health, primary))
+    if not any(future.done() for future in running) and HedgeBudget.try_spend():
+        start(secondary)
+
+    last_error = None
+    while running:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            llm = running.pop(future)
+            latency = time.monotonic() - started[id(llm)]
+            error = future.exception()
+            if error is None:
+                health.record_success(llm, latency)
+                for loser_future, loser in running.items():
+                    loser_future.cancel()
+                    # loser was at least that slow
+                    health.record_latency(loser, time.monotonic() - started[id(loser)])
+                return future.result()
+            health.record_failure(llm, latency, timeout=is_timeout(error))
+            last_error = error
+            if id(secondary) not in started:
+                # primary failed before hedging, secondary is then a usual fallback
+                start(secondary)
+    raise last_error
+
+
+def with_hedging(llms):
+    """
+    Runnable calling llms with fallbacks, as llms[0].with_fallbacks(llms[1:]) does. With hedging enabled, the two
+    healthiest models are hedged, and the rest are fallbacks.
+    """
+    chain = llms[0].with_fallbacks(llms[1:])
+    if not hedging_enabled() or len(llms) < 2:
+        return chain
+
+    def invoke_hedged(llm_input):
+        health = LLMHealth.for_work_dir(Work.dir())
+        ordered = health.ordered(llms)
+        try:
+            return hedged_invoke(ordered[0], ordered[1], llm_input, health)
+        except Exception:
+            if len(ordered) == 2:
+                raise
+            return ordered[2].with_fallbacks(ordered[3:]).invoke(llm_input)
+
+    return RunnableLambda(invoke_hedged, name="HedgedLLM")
@@ -2,12 +2,22 @@ from langchain_core.messages import HumanMessage
 from src.utilities.print_formatters import (
     print_formatted,
     print_formatted_content,
+    print_formatted_stream,
+    print_formatted_tool_calls,
 )
-from src.utilities.util_functions import invoke_tool_native, TOOL_NOT_EXECUTED_WORD
+from src.utilities.util_functions import invoke_tool_native, TOOL_NOT_EXECUTED_WORD, WRONG_TOOL_CALL_WORD
 from src.utilities.user_input import user_input
 from langgraph.graph import END
 from src.utilities.graphics import LoadingAnimation
+from src.utilities.prompt_caching import add_cache_breakpoints, cache_usage, PromptCacheStats
+from src.utilities.llm_health import LLMHealth, is_timeout, model_key
+from src.utilities.hedging import hedging_enabled, hedged_invoke
+from src.utilities.streaming import streaming_enabled, stream_response, has_unsafe_calls, EarlyToolCalls
+from src.utilities.start_work_functions import Work
+from src.utilities.tracing import span, record_llm_usage
+import os
 import sys
+import time
 
 
 multiple_tools_msg = (
@@ -31,33 +41,137 @@ animation = LoadingAnimation()
 
 # nodes
 def _get_llm_response(llms, messages, printing):
-    for llm in llms:
+    # slow or failing providers are tried last, according to stats from previous calls
+    health = LLMHealth.for_work_dir(Work.dir())
+    ordered_llms = health.ordered(llms)
+    if hedging_enabled() and len(ordered_llms) > 1:
         try:
-            return llm.invoke(messages)
+            with span("llm", f"hedged {model_key(ordered_llms[0])}") as llm_span:
+                response = hedged_invoke(
+                    ordered_llms[0], ordered_llms[1], messages, health, prepare=_with_prompt_caching
+                )
+                record_llm_usage(llm_span, response)
+            return response
+        except Exception as e:
+            if printing:
+                print_formatted(
+                    f"\nException happened: {e} with hedged llms. Switching to next LLM if available...",
+                    color="yellow",
+                )
+            ordered_llms = ordered_llms[2:]
+    for llm in ordered_llms:
+        start_time = time.monotonic()
+        try:
+            with span("llm", model_key(llm)) as llm_span:
+                response = llm.invoke(_with_prompt_caching(llm, messages))
+                record_llm_usage(llm_span, response)
         except Exception as e:
+            _record_health(health.record_failure, llm, time.monotonic() - start_time, timeout=is_timeout(e))
             if printing:
                 print_formatted(
                     f"\nException happened: {e} with llm: {llm.bound.__class__.__name__}. "
                     "Switching to next LLM if available...",
                     color="yellow",
                 )
+            continue
+        _record_health(health.record_success, llm, time.monotonic() - start_time)
+        return response
     if printing:
         print_formatted("Can not receive response from any llm", color="red")
     sys.exit()
 
 
-def call_model(state, llms, printing=True):
+def _record_health(record, llm, latency, **kwargs):
+    """Update health stats of llm. Errors of the bookkeeping never discard a response or fail over to next llm."""
+    try:
+        record(llm, latency, **kwargs)
+    except Exception:
+        pass
+
+
+def _with_prompt_caching(llm, messages):
+    """Mark stable prefix of messages as cacheable, for llms which were set up with cache_control in init_llms_*."""
+    if getattr(llm, "config", {}).get("metadata", {}).get("cache_control"):
+        return add_cache_breakpoints(messages)
+    return messages
+
+
+def _report_cache_usage(response, printing):
+    usage = cache_usage(response)
+    if usage is None:
+        return
+    PromptCacheStats.record(usage)
+    if printing and os.getenv("SHOW_PROMPT_CACHE_STATS"):
+        print_formatted(
+            f"Prompt cache: {usage['cache_read']} tokens read, {usage['cache_write']} written, "
+            f"{usage['input']} not cached. Hit ratio so far: {PromptCacheStats.hit_ratio():.0%}",
+            color="light_blue",
+        )
+
+
+def _get_streamed_llm_response(llms, messages, printing, tools):
+    health = LLMHealth.for_work_dir(Work.dir())
+    EarlyToolCalls.clear()
+
+    def print_text(text):
+        # spinner is shown only until the first piece of text arrives
+        animation.stop()
+        print_formatted_stream(text)
+
+    for llm in health.ordered(llms):
+        start_time = time.monotonic()
+        try:
+            with span("llm", model_key(llm), streamed=True) as llm_span:
+                response = stream_response(
+                    llm, _with_prompt_caching(llm, messages), tools, on_text=print_text if printing else None
+                )
+                record_llm_usage(llm_span, response)
+        except Exception as e:
+            _record_health(health.record_failure, llm, time.monotonic() - start_time, timeout=is_timeout(e))
+            if printing:
+                animation.stop()
+                print_formatted(
+                    f"\nException happened: {e} with llm: {llm.bound.__class__.__name__}. "
+                    "Switching to next LLM if available...",
+                    color="yellow",
+                )
+            continue
+        _record_health(health.record_success, llm, time.monotonic() - start_time)
+        return response
+    if printing:
+        print_formatted("Can not receive response from any llm", color="red")
+    sys.exit()
+
+
+def call_model(state, llms, printing=True, tools=None, context_window=None):
+    """
+    Get response of LLM and append it to messages. With LLM_STREAMING enabled, the response is printed while it
+    arrives, and safe calls of provided tools start before the response is complete (see call_tool).
+    If context_window is provided, messages sent to LLM are fitted into its token budget.
+    Response is kept also in state["last_ai_message"], so graphs do not need to search messages for it.
+    """
     messages = state["messages"]
+    if context_window:
+        messages = context_window.fit(messages)
 
     if printing:
         animation.start()
-    response = _get_llm_response(llms, messages, printing)
+    if streaming_enabled():
+        response = _get_streamed_llm_response(llms, messages, printing, tools)
+    else:
+        response = _get_llm_response(llms, messages, printing)
     if printing:
         animation.stop()
+    _report_cache_usage(response, printing)
 
     if printing:
-        print_formatted_content(response)
+        if streaming_enabled():
+            print_formatted_stream("\n")
+            print_formatted_tool_calls(response)
+        else:
+            print_formatted_content(response)
     state["messages"].append(response)
+    state["last_ai_message"] = response
 
     return state
 
@@ -68,18 +182,37 @@ def call_tool(state, tools):
     1. Line-based modifications (`start_line` provided) are executed from the
        greatest line number to the smallest, preventing index shifts.
     2. All other calls are executed afterwards, preserving the model’s order.
+    Updates state["last_tool_message"] and state["wrong_tool_calls_in_row"], the number of consecutive tool
+    messages which start with WRONG_TOOL_CALL_WORD.
     """
     last_message = state["messages"][-1]
 
     ordered_calls = _sort_tool_calls(last_message.tool_calls)
+    if has_unsafe_calls(last_message):
+        # modifications run before reads started early (e.g. line-based ones go first), so their results may be stale
+        EarlyToolCalls.clear()
 
-    tool_response_messages = [
-        invoke_tool_native(tool_call, tools) for tool_call in ordered_calls
-    ]
+    tool_response_messages = [_run_tool_call(tool_call, tools) for tool_call in ordered_calls]
     state["messages"].extend(tool_response_messages)
+
+    wrong_tool_calls_in_row = state.get("wrong_tool_calls_in_row") or 0
+    for tool_message in tool_response_messages:
+        is_wrong = isinstance(tool_message.content, str) and tool_message.content.startswith(WRONG_TOOL_CALL_WORD)
+        wrong_tool_calls_in_row = wrong_tool_calls_in_row + 1 if is_wrong else 0
+    state["wrong_tool_calls_in_row"] = wrong_tool_calls_in_row
+    if tool_response_messages:
+        state["last_tool_message"] = tool_response_messages[-1]
     return state
 
 
+def _run_tool_call(tool_call, tools):
+    with span("tool", tool_call["name"]) as tool_span:
+        # tool calls started already while the response was streamed are not executed again
+        tool_message = EarlyToolCalls.pop(tool_call)
+        tool_span.set(started_early=tool_message is not None)
+        return tool_message or invoke_tool_native(tool_call, tools)
+
+
 def _sort_tool_calls(tool_calls):
     """
     Return list of tool calls where calls containing `start_line`
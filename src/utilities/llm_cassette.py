@@ -0,0 +1,222 @@
+"""
+Record/replay stand-in for LLMs, for deterministic offline runs of the pipeline (tests, benchmarks, debugging).
+With LLM_CASSETTE set, every LLM call is recorded to the cassette file (LLM_CASSETTE_MODE=record) or answered
+from it (LLM_CASSETTE_MODE=replay, default), without API keys and network. LLM_REPLAY_LATENCY adds synthetic
+latency to replayed answers, as seconds ("1.5") or a range ("0.5-3").
+"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from typing import Any, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+
+
+def cassette_mode():
+    """Return 'record' or 'replay' if LLM_CASSETTE is set, None otherwise."""
+    if not os.getenv("LLM_CASSETTE"):
+        return None
+    return "record" if os.getenv("LLM_CASSETTE_MODE", "replay").lower() == "record" else "replay"
+
+
+def normalized_content(content):
+    """Message content without provider markers (as prompt cache breakpoints), for stable keys."""
+    if isinstance(content, str):
+        return content
+    blocks = []
+    for block in content:
+        if isinstance(block, dict):
+            block = {key: value for key, value in block.items() if key != "cache_control"}
+        blocks.append(block)
+    # single text block is the same message as plain string
+    if len(blocks) == 1 and isinstance(blocks[0], dict) and blocks[0].get("type") == "text":
+        return blocks[0]["text"]
+    return blocks
+
+
+def serialized_conversation(run_name, messages):
+    """Conversation sent to the model as JSON string. Message ids and cache markers are not part of it."""
+    conversation = [run_name]
+    for message in messages:
+        entry = [message.type, normalized_content(message.content)]
+        if getattr(message, "tool_calls", None):
+            entry.append([[call["name"], call["args"], call["id"]] for call in message.tool_calls])
+        if getattr(message, "tool_call_id", None):
+            entry.append(message.tool_call_id)
+        conversation.append(entry)
+    return json.dumps(conversation, sort_keys=True, default=str)
+
+
+def interaction_key(serialized):
+    """Key of recorded interaction, from serialized_conversation output."""
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def synthetic_latency(key):
+    """Latency to simulate for interaction, from LLM_REPLAY_LATENCY. Random range is seeded by key, so repeatable."""
+    latency = os.getenv("LLM_REPLAY_LATENCY")
+    if not latency:
+        return 0.0
+    if "-" in latency:
+        low, high = (float(part) for part in latency.split("-", 1))
+        return random.Random(key).uniform(low, high)
+    return float(latency)
+
+
+class Cassette:
+    """
+    Recorded LLM interactions, stored one JSON object per line: {"run_name", "key", "response"}.
+
+    Replay answers each call with an unused recording of the same conversation. If the conversation differs from
+    the recorded one (e.g. directory tree listing depends on file modification times), the next unused recording
+    of the same run name is used, so the session still goes the recorded way. Hand-written cassettes can mark
+    interaction with "repeat": true to answer with it any number of times.
+    Every call made with cassette is logged in calls as {"run_name", "prompt_bytes", "started", "seconds"}, with
+    time.monotonic() start time.
+    """
+
+    instances = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def for_path(path, mode):
+        """Return cassette shared by the whole process. Record mode starts a new cassette, overwriting old one."""
+        with Cassette.lock:
+            if path not in Cassette.instances:
+                Cassette.instances[path] = Cassette(path, mode)
+            return Cassette.instances[path]
+
+    def __init__(self, path, mode):
+        self.path = path
+        self.lock = threading.Lock()
+        self.interactions = []
+        if mode == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            open(path, "w").close()
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                self.interactions = [json.loads(line) for line in f if line.strip()]
+        self.used = [False] * len(self.interactions)
+        self.calls = []
+
+    def record(self, run_name, key, response):
+        interaction = {"run_name": run_name, "key": key, "response": message_to_dict(response)}
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(interaction) + "\n")
+            self.interactions.append(interaction)
+            self.used.append(True)
+
+    def replay(self, run_name, key):
+        """Return recorded response to conversation. Raises LookupError when cassette has nothing left for it."""
+        with self.lock:
+            index = self._first_unused(lambda interaction: interaction["key"] == key)
+            if index is None:
+                index = self._first_unused(lambda interaction: interaction["run_name"] == run_name)
+            if index is None:
+                raise LookupError(f"No recorded response left for '{run_name}' in cassette {self.path}.")
+            if not self.interactions[index].get("repeat"):
+                self.used[index] = True
+            return messages_from_dict([self.interactions[index]["response"]])[0]
+
+    def _first_unused(self, matches):
+        for index, interaction in enumerate(self.interactions):
+            if not self.used[index] and matches(interaction):
+                return index
+        return None
+
+    def log_call(self, run_name, prompt_bytes, started):
+        call = {"run_name": run_name, "prompt_bytes": prompt_bytes, "started": started, "seconds": time.monotonic() - started}
+        with self.lock:
+            self.calls.append(call)
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model recording calls of recorded_llm to the cassette, or replaying them if recorded_llm is None.
+    Tools and structured outputs bound to it are bound to recorded_llm for each call.
+    """
+
+    cassette_path: str
+    run_name: str = ""
+    model_name: str = "replay"
+    recorded_llm: Optional[Any] = None
+
+    @property
+    def _llm_type(self):
+        return "cassette"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        if tool_choice is not None:
+            kwargs["tool_choice"] = tool_choice
+        return self.bind(tools=tools, **kwargs)
+
+    def with_structured_output(self, schema, **kwargs) -> Runnable:
+        # RunnableWithFallbacks resolves return annotation of this method in module defining it, and the inherited
+        # one is annotated with names not imported at runtime
+        return super().with_structured_output(schema, **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        start = time.monotonic()
+        serialized = serialized_conversation(self.run_name, messages)
+        key = interaction_key(serialized)
+        if self.recorded_llm is not None:
+            cassette = Cassette.for_path(self.cassette_path, "record")
+            llm = self.recorded_llm
+            if kwargs.get("tools"):
+                tools = kwargs.pop("tools")
+                llm = llm.bind_tools(tools, **kwargs)
+            response = llm.invoke(messages, stop=stop)
+            cassette.record(self.run_name, key, response)
+        else:
+            cassette = Cassette.for_path(self.cassette_path, "replay")
+            response = cassette.replay(self.run_name, key)
+            time.sleep(synthetic_latency(key))
+        cassette.log_call(self.run_name, len(serialized.encode("utf-8")), start)
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        """Streamed calls (LLM_STREAMING) get the whole recorded response as a single chunk."""
+        response = self._generate(messages, stop=stop, run_manager=run_manager, **kwargs).generations[0].message
+        tool_call_chunks = [
+            {"name": tool_call["name"], "args": json.dumps(tool_call["args"]), "id": tool_call["id"], "index": index}
+            for index, tool_call in enumerate(getattr(response, "tool_calls", None) or [])
+        ]
+        chunk = AIMessageChunk(
+            content=response.content,
+            id=response.id,
+            tool_call_chunks=tool_call_chunks,
+            usage_metadata=getattr(response, "usage_metadata", None),
+            response_metadata=response.response_metadata,
+        )
+        if run_manager and isinstance(chunk.content, str):
+            run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+        yield ChatGenerationChunk(message=chunk)
+
+
+def with_cassette(llms, run_name):
+    """
+    Wrap llms for recording, or replace them with a single replaying model, according to LLM_CASSETTE_MODE.
+    Without LLM_CASSETTE llms are returned unchanged.
+    """
+    mode = cassette_mode()
+    if mode is None:
+        return llms
+    cassette_path = os.getenv("LLM_CASSETTE")
+    if mode == "replay":
+        return [CassetteChatModel(cassette_path=cassette_path, run_name=run_name)]
+    return [
+        CassetteChatModel(
+            cassette_path=cassette_path,
+            run_name=run_name,
+            model_name=getattr(llm, "model_name", None) or getattr(llm, "model", None) or llm.__class__.__name__,
+            recorded_llm=llm,
+        )
+        for llm in llms
+    ]
@@ -0,0 +1,152 @@
+"""
+Health tracking of LLMs, so calls go first to models that currently answer, and a degraded provider costs one
+timeout instead of one timeout per agent step.
+"""
+
+import os
+import json
+import time
+import threading
+from src.utilities.llms import llm_provider
+
+
+# weight of the newest observation in exponentially weighted moving averages
+EWMA_ALPHA = 0.3
+# model answering slower than that on average is tried after healthy ones
+DEGRADED_LATENCY = 45.0
+DEGRADED_ERROR_RATE = 0.5
+# circuit opens after that many failures in a row, or after a single timeout
+FAILURES_TO_OPEN = 3
+COOLDOWN = 300.0
+MAX_COOLDOWN = 3600.0
+
+
+def model_key(llm):
+    """Identify model across runs as 'provider:model name'."""
+    provider = llm_provider(llm)
+    while hasattr(llm, "bound"):
+        llm = llm.bound
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or llm.__class__.__name__
+    return f"{provider}:{model}"
+
+
+def is_timeout(exception):
+    """True for timeouts of any provider client (openai, anthropic, httpx, ollama...)."""
+    return isinstance(exception, TimeoutError) or "timeout" in type(exception).__name__.lower()
+
+
+class LLMHealth:
+    """
+    Latency and error rate EWMAs of every model, with circuit breaker, stored in .clean_coder/llm_health.json.
+
+    Models are ordered in tiers: healthy, degraded (slow or failing often, or with circuit half-open after
+    cooldown) and with open circuit. Order of llms list given by init_llms_* is kept inside a tier, as it reflects
+    preferred models.
+    """
+
+    instances = {}
+
+    @staticmethod
+    def for_work_dir(work_dir):
+        """Return health stats shared by the whole process for provided work dir."""
+        if work_dir not in LLMHealth.instances:
+            LLMHealth.instances[work_dir] = LLMHealth(work_dir)
+        return LLMHealth.instances[work_dir]
+
+    def __init__(self, work_dir):
+        self.path = os.path.join(work_dir, ".clean_coder", "llm_health.json")
+        self.lock = threading.Lock()
+        # model key -> {"latency", "error_rate", "timeouts", "failures_in_row", "cooldown", "open_until"}
+        self.models = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return {}
+
+    def save(self):
+        """Save stats to disk. Stats only order llms, so failing to save them never breaks LLM calls."""
+        if not os.path.isdir(os.path.dirname(self.path)):
+            # do not create .clean_coder for projects which were not set up yet
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            # temporary file is shared, so it's replaced under the lock too
+            with self.lock:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.models, f, indent=1)
+                os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def _stats(self, key):
+        return self.models.setdefault(
+            key,
+            {"latency": None, "error_rate": 0.0, "timeouts": 0, "failures_in_row": 0, "cooldown": 0.0, "open_until": 0.0},
+        )
+
+    def record_success(self, llm, latency):
+        with self.lock:
+            stats = self._stats(model_key(llm))
+            stats["latency"] = latency if stats["latency"] is None else _ewma(stats["latency"], latency)
+            stats["error_rate"] = _ewma(stats["error_rate"], 0.0)
+            stats["failures_in_row"] = 0
+            stats["cooldown"] = 0.0
+            stats["open_until"] = 0.0
+        self.save()
+
+    def record_latency(self, llm, latency):
+        """Record latency of a request which was cancelled before the model answered."""
+        with self.lock:
+            stats = self._stats(model_key(llm))
+            stats["latency"] = latency if stats["latency"] is None else _ewma(stats["latency"], latency)
+        self.save()
+
+    def record_failure(self, llm, latency, timeout=False):
+        with self.lock:
+            stats = self._stats(model_key(llm))
+            stats["error_rate"] = _ewma(stats["error_rate"], 1.0)
+            stats["failures_in_row"] += 1
+            if timeout:
+                stats["timeouts"] += 1
+                stats["latency"] = latency if stats["latency"] is None else _ewma(stats["latency"], latency)
+            if timeout or stats["failures_in_row"] >= FAILURES_TO_OPEN:
+                # every next failure after cooldown keeps the circuit open twice longer
+                stats["cooldown"] = min(max(stats["cooldown"] * 2, COOLDOWN), MAX_COOLDOWN)
+                stats["open_until"] = time.time() + stats["cooldown"]
+        self.save()
+
+    def tier(self, llm, now=None):
+        """0 for healthy model, 1 for degraded or half-open, 2 for model with open circuit."""
+        stats = self.models.get(model_key(llm))
+        if stats is None:
+            return 0
+        now = now or time.time()
+        if stats["open_until"] > now:
+            return 2
+        if stats["cooldown"] or stats["error_rate"] >= DEGRADED_ERROR_RATE:
+            return 1
+        if stats["latency"] is not None and stats["latency"] >= DEGRADED_LATENCY:
+            return 1
+        return 0
+
+    def ordered(self, llms):
+        """Return llms in order they should be tried. Models with open circuit are kept at the end as last resort."""
+        now = time.time()
+        with self.lock:
+            tiers = {id(llm): self.tier(llm, now) for llm in llms}
+
+            def sort_key(llm):
+                tier = tiers[id(llm)]
+                # among models with open circuit, the one closest to cooldown end goes first
+                return tier, self.models[model_key(llm)]["open_until"] if tier == 2 else 0.0
+
+            return sorted(llms, key=sort_key)
+
+
+def _ewma(average, value):
+    return (1 - EWMA_ALPHA) * average + EWMA_ALPHA * value
@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 from langchain_openai.chat_models import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_ollama import ChatOllama
+from src.utilities.llm_cassette import CassetteChatModel, with_cassette
 # from langchain_google_genai import ChatGoogleGenerativeAI
 
 load_dotenv()
@@ -48,10 +49,11 @@ def init_llms_medium_intelligence(tools=None, run_name="Clean Coder", temp=0):
     if getenv("OPENAI_API_KEY"):
         llms.append(ChatOpenAI(model="gpt-4.1", temperature=temp, timeout=90))
 
+    llms = with_cassette(llms, run_name)
     for i, llm in enumerate(llms):
         if tools:
             llm = llm.bind_tools(tools)
-        llms[i] = llm.with_config({"run_name": run_name})
+        llms[i] = llm.with_config({"run_name": run_name, "metadata": {"cache_control": supports_cache_control(llm)}})
     return llms
 
 
@@ -70,10 +72,11 @@ def init_llms_mini(tools=None, run_name="Clean Coder", temp=0):
     if os.getenv("OPENAI_API_KEY"):
         llms.append(ChatOpenAI(model="gpt-4.1-mini", temperature=temp, timeout=90))
 
+    llms = with_cassette(llms, run_name)
     for i, llm in enumerate(llms):
         if tools:
             llm = llm.bind_tools(tools)
-        llms[i] = llm.with_config({"run_name": run_name})
+        llms[i] = llm.with_config({"run_name": run_name, "metadata": {"cache_control": supports_cache_control(llm)}})
     return llms
 
 
@@ -94,8 +97,36 @@ def init_llms_high_intelligence(tools=None, run_name="Clean Coder", temp=0.2):
     if os.getenv("OPENAI_API_KEY"):
         llms.append(ChatOpenAI(model="o3", temperature=1, timeout=90, reasoning_effort="high"))
 
+    llms = with_cassette(llms, run_name)
     for i, llm in enumerate(llms):
         if tools:
             llm = llm.bind_tools(tools)
-        llms[i] = llm.with_config({"run_name": run_name})
+        llms[i] = llm.with_config({"run_name": run_name, "metadata": {"cache_control": supports_cache_control(llm)}})
     return llms
+
+
+def llm_provider(llm):
+    """Return name of provider serving the llm, as 'openrouter', 'openai', 'anthropic', 'ollama', 'local' or 'cassette'."""
+    # unwrap with_config and bind_tools bindings
+    while hasattr(llm, "bound"):
+        llm = llm.bound
+    if isinstance(llm, CassetteChatModel):
+        return llm_provider(llm.recorded_llm) if llm.recorded_llm is not None else "cassette"
+    if isinstance(llm, ChatAnthropic):
+        return "anthropic"
+    if isinstance(llm, ChatOllama):
+        return "ollama"
+    api_base = getattr(llm, "openai_api_base", None) or ""
+    if "openrouter.ai" in api_base:
+        return "openrouter"
+    if api_base and api_base == getenv("LOCAL_MODEL_API_BASE"):
+        return "local"
+    return "openai"
+
+
+def supports_cache_control(llm):
+    """True for Anthropic models, called directly or through OpenRouter, which cache only marked prompt prefixes."""
+    provider = llm_provider(llm)
+    while hasattr(llm, "bound"):
+        llm = llm.bound
+    return provider == "anthropic" or (provider == "openrouter" and llm.model_name.startswith("anthropic/"))
@@ -4,11 +4,18 @@ In manager_utils.py we are placing all functions used by manager agent only, whi
 # imports
 from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage, AIMessage
 from src.utilities.llms import init_llms_medium_intelligence
-from src.utilities.util_functions import join_paths, read_coderrules, list_directory_tree, load_prompt
+from src.utilities.hedging import with_hedging
+from src.utilities.util_functions import (
+    join_paths,
+    read_coderrules,
+    list_directory_tree,
+    load_prompt,
+    load_state_history_from_disk,
+)
 from src.utilities.start_project_functions import create_project_plan_file
+from src.utilities.blob_store import BlobStore
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
-from langchain_core.load import loads
 from todoist_api_python.api import TodoistAPI
 import questionary
 import concurrent.futures
@@ -47,7 +54,7 @@ actualize_progress_description_prompt_template = load_prompt("actualize_progress
 tasks_progress_template = load_prompt("manager_progress")
 
 llms = init_llms_medium_intelligence(run_name="Progress description")
-llm = llms[0].with_fallbacks(llms[1:])
+llm = with_hedging(llms)
 
 
 def read_project_plan():
@@ -128,9 +135,10 @@ def parse_project_tasks(tasks):
 
 def cleanup_research_histories() -> None:
     """
-    Delete every file matching research_history_task_<id>.json inside
-    .clean_coder/research_histories when <id> is not among current
-    Todoist task IDs.
+    Delete every file matching research_history_task_<id>.jsonl (or .json,
+    saved by older versions) inside .clean_coder/research_histories when
+    <id> is not among current Todoist task IDs, and blobs no history
+    references anymore.
     """
     history_dir = join_paths(work_dir, ".clean_coder", "research_histories")
     if not os.path.exists(history_dir):
@@ -139,11 +147,17 @@ def cleanup_research_histories() -> None:
     active_ids = {str(t.id) for t in fetch_tasks()}
 
     for fname in os.listdir(history_dir):
-        if fname.startswith("research_history_task_") and fname.endswith(".json"):
-            task_id = fname[len("research_history_task_") : -len(".json")]
+        name, extension = os.path.splitext(fname)
+        if name.startswith("research_history_task_") and extension in (".json", ".jsonl"):
+            task_id = name[len("research_history_task_") :]
             if task_id not in active_ids:
                 os.remove(join_paths(history_dir, fname))
 
+    clean_coder_dir = join_paths(work_dir, ".clean_coder")
+    history_paths = [join_paths(history_dir, fname) for fname in os.listdir(history_dir) if fname.endswith(".jsonl")]
+    if os.path.exists(join_paths(clean_coder_dir, "manager_messages.jsonl")):
+        history_paths.append(join_paths(clean_coder_dir, "manager_messages.jsonl"))
+    BlobStore.for_dir(join_paths(clean_coder_dir, "blobs")).remove_unreferenced(history_paths)
 
 
 def actualize_progress_description_file(task_name_description):
@@ -293,11 +307,7 @@ def get_manager_messages(saved_messages_path):
     ]
 
     # ---------- load previous history if present ---------- #
-    if os.path.exists(saved_messages_path):
-        with open(saved_messages_path, "r") as fp:
-            messages = loads(json.load(fp))
-    else:
-        messages = default_msgs
+    messages = load_state_history_from_disk(saved_messages_path) or default_msgs
 
     # ---------- decide next action ---------- #
     action = ask_user_for_project_action()
@@ -0,0 +1,203 @@
+"""
+Append-only persistence of agent histories (manager messages, research histories). History is stored as JSONL,
+one serialized message per line, and every save writes only the changes since the previous one. Messages removed
+or replaced in the middle of history (context trimming, refreshed tasks message) are written as small edit records.
+When edits make the file much bigger than the history itself, it is compacted back to plain message lines.
+Long texts of messages are kept in blob store shared by all histories (see blob_store), and lines reference them.
+"""
+
+import os
+import json
+import time
+import atexit
+import difflib
+import threading
+from langchain_core.messages import message_to_dict, messages_from_dict
+from src.utilities.blob_store import BlobStore, blob_dir_for
+
+
+# file is compacted when it is that many times bigger than the history it holds...
+COMPACTION_RATIO = 2
+# ...and at least that big, so small histories are not rewritten for nothing
+MIN_COMPACTION_BYTES = 256 * 1024
+# os.fsync is costly on some disks, so it's done at most once per that many seconds (and on exit)
+FSYNC_INTERVAL = 5.0
+
+
+class MessageLog:
+    """
+    History of messages stored in JSONL file. Lines are records of three kinds:
+        {"message": {...}}                  - message appended at the end of history,
+        {"insert": index, "message": {...}} - message inserted at index,
+        {"delete": [start, end]}            - messages[start:end] removed.
+    Compacted file consists of appended messages only.
+
+    Saved history is remembered, and changes against it are found by message identity. Messages loaded from the
+    log are the objects agents continue with, so resumed sessions are appended to as well.
+    """
+
+    instances = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def for_path(path):
+        """Return log shared by the whole process, so consecutive saves know what is on disk already."""
+        path = os.path.abspath(path)
+        with MessageLog.lock:
+            if path not in MessageLog.instances:
+                MessageLog.instances[path] = MessageLog(path)
+            return MessageLog.instances[path]
+
+    def __init__(self, path):
+        self.path = path
+        self.blobs = BlobStore.for_dir(blob_dir_for(path))
+        self.lock = threading.Lock()
+        self.file = None
+        self.last_fsync = time.monotonic()
+        # history as it is on disk, with size of every message line; None if file was not read or written yet
+        self.saved = None
+        self.sizes = []
+        self.file_bytes = 0
+
+    def load(self):
+        """
+        Return messages from the log, [] if it does not exist. Messages are recreated and their blobs read only
+        after all edits are replayed, so removed messages cost nothing.
+        """
+        with self.lock:
+            records, sizes = [], []
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        record = self._parse(line)
+                        if record is None:
+                            continue
+                        if "delete" in record:
+                            start, end = record["delete"]
+                            del records[start:end]
+                            del sizes[start:end]
+                            continue
+                        index = record.get("insert", len(records))
+                        records.insert(index, record["message"])
+                        sizes.insert(index, len(line))
+                self.file_bytes = os.path.getsize(self.path)
+            messages = messages_from_dict([self.blobs.rehydrated(record) for record in records])
+            self.saved, self.sizes = list(messages), sizes
+            return messages
+
+    @staticmethod
+    def _parse(line):
+        if not line.strip():
+            return None
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            # last line cut by interrupted write
+            return None
+
+    def save(self, messages):
+        """Write changes of messages since the last save or load."""
+        with self.lock:
+            if self.saved is None:
+                self._rewrite(messages)
+                return
+            saved_count = len(self.saved)
+            if len(messages) >= saved_count and all(a is b for a, b in zip(self.saved, messages)):
+                records = [(None, message) for message in messages[saved_count:]]
+            else:
+                records = self._edit_records(messages)
+            if not records:
+                return
+            lines = []
+            for position, change in records:
+                if position == "delete":
+                    start, end = change
+                    del self.saved[start:end]
+                    del self.sizes[start:end]
+                    lines.append(json.dumps({"delete": [start, end]}) + "\n")
+                    continue
+                record = {"message": self._serialized(change)}
+                if position is None:
+                    position = len(self.saved)
+                else:
+                    record = {"insert": position, **record}
+                line = json.dumps(record) + "\n"
+                self.saved.insert(position, change)
+                self.sizes.insert(position, len(line))
+                lines.append(line)
+            if self.file_bytes + sum(len(line) for line in lines) > max(
+                COMPACTION_RATIO * sum(self.sizes), MIN_COMPACTION_BYTES
+            ):
+                self._rewrite(messages)
+                return
+            self._append(lines)
+
+    def _edit_records(self, messages):
+        """
+        Records turning saved history into messages: (None, message) to append, (index, message) to insert,
+        ("delete", (start, end)). Edits are listed from the end of history, so earlier indexes stay valid.
+        """
+        matcher = difflib.SequenceMatcher(
+            None, [id(message) for message in self.saved], [id(message) for message in messages], autojunk=False
+        )
+        records = []
+        for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+            if tag == "equal":
+                continue
+            if tag in ("delete", "replace"):
+                records.append(("delete", (i1, i2)))
+            if tag in ("insert", "replace"):
+                at_end = i2 == len(self.saved) and not records
+                records += [(None if at_end else i1 + offset, messages[j]) for offset, j in enumerate(range(j1, j2))]
+        return records
+
+    def _serialized(self, message):
+        return self.blobs.externalized(message_to_dict(message))
+
+    def _append(self, lines):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = open(self.path, "a", encoding="utf-8")
+        self.file.writelines(lines)
+        self.file.flush()
+        self.file_bytes += sum(len(line) for line in lines)
+        if time.monotonic() - self.last_fsync >= FSYNC_INTERVAL:
+            self._fsync()
+
+    def _rewrite(self, messages):
+        """Compact the log: write messages as plain lines to temporary file, and replace the log with it."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        lines = [json.dumps({"message": self._serialized(message)}) + "\n" for message in messages]
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.saved = list(messages)
+        self.sizes = [len(line) for line in lines]
+        self.file_bytes = sum(self.sizes)
+        self.last_fsync = time.monotonic()
+
+    def _fsync(self):
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+        self.last_fsync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self._fsync()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    @staticmethod
+    def close_all():
+        for log in list(MessageLog.instances.values()):
+            log.close()
+
+
+atexit.register(MessageLog.close_all)
@@ -48,6 +48,17 @@ def print_formatted_content(response):
             print_tool_message(tool_name=call["name"], tool_input=call["input"])
 
 
+def print_formatted_tool_calls(response):
+    """Print tool calls of a response, which text was already printed while streaming."""
+    for call in _order_tool_calls(response.tool_calls, "args"):
+        print_tool_message(tool_name=call["name"], tool_input=call["args"])
+
+
+def print_formatted_stream(text, color="dark_grey"):
+    """Print piece of streamed response, without new line."""
+    print(colored(text, color, force_color=True), end="", flush=True)
+
+
 def _order_tool_calls(tool_calls, args_key):
     with_start_line = []
     without_start_line = []
@@ -0,0 +1,91 @@
+"""
+Provider prompt caching. Agents send the same big prefix (system prompt, task, directory tree, file contents)
+with every request; marking it as cacheable lets the provider skip reprocessing it.
+
+Anthropic models (directly or through OpenRouter) need explicit cache_control breakpoints. OpenAI caches
+prefixes automatically, it only needs the prefix to stay byte-identical between calls.
+"""
+
+import threading
+from langchain_core.messages import AIMessage
+
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def add_cache_breakpoints(messages):
+    """
+    Return copy of messages with cache_control breakpoints on the system message, on the end of the stable prefix
+    (messages before the first AI response) and on the last message, so the next call reads the whole
+    conversation so far from cache. Messages themselves are not modified.
+    """
+    first_ai = next((i for i, msg in enumerate(messages) if isinstance(msg, AIMessage)), len(messages))
+    breakpoints = {first_ai - 1, len(messages) - 1}
+    if messages and messages[0].type == "system":
+        breakpoints.add(0)
+    marked = list(messages)
+    for i in breakpoints:
+        if 0 <= i < len(messages) and not isinstance(messages[i], AIMessage):
+            marked[i] = _with_cache_control(messages[i])
+    return marked
+
+
+def _with_cache_control(message):
+    content = message.content
+    if isinstance(content, str):
+        if not content.strip():
+            return message
+        blocks = [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+    else:
+        blocks = [{"type": "text", "text": block} if isinstance(block, str) else dict(block) for block in content]
+        if not blocks:
+            return message
+        blocks[-1]["cache_control"] = CACHE_CONTROL
+    return message.model_copy(update={"content": blocks})
+
+
+def cache_usage(response):
+    """
+    Return {"input": uncached input tokens, "cache_read": ..., "cache_write": ...} of LLM response,
+    or None if provider did not report usage.
+    """
+    anthropic_usage = (response.response_metadata or {}).get("usage") or {}
+    if "cache_read_input_tokens" in anthropic_usage or "cache_creation_input_tokens" in anthropic_usage:
+        # Anthropic counts cached tokens separately from input tokens
+        return {
+            "input": anthropic_usage.get("input_tokens") or 0,
+            "cache_read": anthropic_usage.get("cache_read_input_tokens") or 0,
+            "cache_write": anthropic_usage.get("cache_creation_input_tokens") or 0,
+        }
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return None
+    details = usage.get("input_token_details") or {}
+    cache_read = details.get("cache_read") or 0
+    cache_write = details.get("cache_creation") or 0
+    return {
+        "input": usage["input_tokens"] - cache_read - cache_write,
+        "cache_read": cache_read,
+        "cache_write": cache_write,
+    }
+
+
+class PromptCacheStats:
+    """Token counts summed over all LLM calls of the process."""
+
+    lock = threading.Lock()
+    totals = {"calls": 0, "input": 0, "cache_read": 0, "cache_write": 0}
+
+    @staticmethod
+    def record(usage):
+        with PromptCacheStats.lock:
+            PromptCacheStats.totals["calls"] += 1
+            for key in ("input", "cache_read", "cache_write"):
+                PromptCacheStats.totals[key] += usage[key]
+
+    @staticmethod
+    def hit_ratio():
+        """Part of input tokens read from cache, over all calls so far."""
+        totals = PromptCacheStats.totals
+        all_input = totals["input"] + totals["cache_read"] + totals["cache_write"]
+        return totals["cache_read"] / all_input if all_input else 0.0
@@ -3,6 +3,8 @@ Place here functions that should be called when clean coder is started.
 """
 
 import os
+import re
+import time
 import fnmatch
 from termcolor import colored
 from pathspec import PathSpec
@@ -22,25 +24,55 @@ def file_folder_ignored(path):
     Determines if a file or folder should be ignored based on patterns in .coderignore.
     Uses both PathSpec matching and fnmatch pattern matching for backwards compatibility.
     """
-    path = path.rstrip("/")  # Remove trailing slash if present
-    spec = PathSpec.from_lines(GitWildMatchPattern, CoderIgnore.get_forbidden())
-    if spec.match_file(path):
-        return True
-    # old way of checking, to remove in future. For now still needed for checking exact folder matches
-    for pattern in CoderIgnore.get_forbidden():
-        pattern = pattern.rstrip("/")  # Remove trailing slash from pattern if present
-        if fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(f"{path}/", f"{pattern}/"):
-            return True
+    return CoderIgnore.is_ignored(path)
 
-    return False
+
+def dir_ignored(rel_dir_path):
+    """
+    Determines if a whole directory (given by path relative to work dir) is ignored, so it does not need to be walked.
+    Matches the whole relative path, as is_ignored does for files, so anchored patterns (as /build or src/build)
+    prune only the directory they point to; trailing slash lets folder-only patterns (as build/) match.
+    """
+    rel_dir_path = rel_dir_path.rstrip("/")
+    return CoderIgnore.is_ignored(rel_dir_path) or CoderIgnore.is_ignored(rel_dir_path + "/", keep_trailing_slash=True)
+
+
+def walk_not_ignored(work_dir):
+    """
+    Works like os.walk on work_dir, but never enters ignored directories and yields only not ignored files.
+    Yields (root, dirs, files, rel_root), where rel_root is root relative to work_dir ('.' for work_dir itself).
+    """
+    for root, dirs, files in os.walk(work_dir):
+        rel_root = os.path.relpath(root, work_dir)
+        prefix = "" if rel_root == "." else rel_root.replace(os.sep, "/") + "/"
+        dirs[:] = [d for d in dirs if not dir_ignored(prefix + d)]
+        files = [f for f in files if not file_folder_ignored(prefix + f)]
+        yield root, dirs, files, rel_root
 
 
 class CoderIgnore:
+    """
+    Patterns of .clean_coder/.coderignore, compiled once per file modification and results of matching memoized
+    per path. File modification time is checked at most once per MTIME_CHECK_INTERVAL seconds.
+    """
+
+    MTIME_CHECK_INTERVAL = 1.0
+
     forbidden_files_and_folders = None
+    spec = None
+    # all legacy fnmatch patterns merged into one regex
+    legacy_regex = None
+    mtime = None
+    last_check = 0.0
+    results = {}
+
+    @staticmethod
+    def coderignore_path():
+        return os.path.join(Work.dir(), '.clean_coder', '.coderignore')
 
     @staticmethod
     def read_coderignore():
-        coderignore_path = os.path.join(Work.dir(), '.clean_coder', '.coderignore')
+        coderignore_path = CoderIgnore.coderignore_path()
         try:
             with open(coderignore_path, 'r') as file:
                 return [line.strip() for line in file if line.strip() and not line.startswith('#')]
@@ -48,10 +80,45 @@ class CoderIgnore:
             print(f"File .codeignore was not found in {coderignore_path}. No files will be ignored.")
             return [] 
 
+    @staticmethod
+    def _refresh():
+        """Recompile patterns if .coderignore changed since last compilation."""
+        now = time.monotonic()
+        if CoderIgnore.spec is not None and now - CoderIgnore.last_check < CoderIgnore.MTIME_CHECK_INTERVAL:
+            return
+        CoderIgnore.last_check = now
+        try:
+            mtime = os.stat(CoderIgnore.coderignore_path()).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if CoderIgnore.spec is not None and mtime == CoderIgnore.mtime:
+            return
+
+        patterns = CoderIgnore.read_coderignore()
+        CoderIgnore.forbidden_files_and_folders = patterns
+        CoderIgnore.spec = PathSpec.from_lines(GitWildMatchPattern, patterns)
+        # old way of checking, to remove in future. For now still needed for checking exact folder matches
+        legacy_patterns = [fnmatch.translate(os.path.normcase(pattern.rstrip("/"))) for pattern in patterns]
+        CoderIgnore.legacy_regex = re.compile("|".join(legacy_patterns)) if legacy_patterns else None
+        CoderIgnore.results = {}
+        CoderIgnore.mtime = mtime
+
+    @staticmethod
+    def is_ignored(path, keep_trailing_slash=False):
+        CoderIgnore._refresh()
+        if not keep_trailing_slash:
+            path = path.rstrip("/")  # Remove trailing slash if present
+        result = CoderIgnore.results.get(path)
+        if result is None:
+            result = CoderIgnore.spec.match_file(path) or bool(
+                CoderIgnore.legacy_regex and CoderIgnore.legacy_regex.match(os.path.normcase(path.rstrip("/")))
+            )
+            CoderIgnore.results[path] = result
+        return result
+
     @staticmethod
     def get_forbidden():
-        if CoderIgnore.forbidden_files_and_folders is None:
-            CoderIgnore.forbidden_files_and_folders = CoderIgnore.read_coderignore()
+        CoderIgnore._refresh()
         return CoderIgnore.forbidden_files_and_folders
 
 
@@ -0,0 +1,103 @@
+"""
+Streaming of LLM responses. Text is shown as soon as it arrives, and read-only tool calls are executed as soon as
+their arguments are complete, while the model still writes the rest of the message.
+Enabled with LLM_STREAMING env variable.
+"""
+
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import message_chunk_to_message
+from src.utilities.util_functions import invoke_tool_native
+
+
+# tools without side effects, safe to run before the model finishes its message
+SAFE_TOOLS = {"see_file", "list_dir"}
+
+
+def streaming_enabled():
+    return bool(os.getenv("LLM_STREAMING"))
+
+
+def chunk_text(chunk):
+    """Text part of a message chunk, for both plain string and content blocks (Anthropic) chunks."""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        block.get("text", "") for block in chunk.content if isinstance(block, dict) and block.get("type") == "text"
+    )
+
+
+def complete_tool_calls(chunk, tool_names=SAFE_TOOLS):
+    """
+    Yield calls of tool_names in aggregated message chunk which arguments were already fully streamed.
+    Calls of other tools are not parsed, as they are never started early.
+    """
+    # models falling back to non-streamed response return plain messages without chunks
+    for tool_call_chunk in getattr(chunk, "tool_call_chunks", []):
+        if tool_call_chunk.get("name") not in tool_names or not tool_call_chunk.get("id") or not tool_call_chunk.get("args"):
+            continue
+        try:
+            # arguments are JSON object, so they parse only when the closing brace arrived
+            args = json.loads(tool_call_chunk["args"])
+        except json.JSONDecodeError:
+            continue
+        if isinstance(args, dict):
+            yield {"name": tool_call_chunk["name"], "args": args, "id": tool_call_chunk["id"], "type": "tool_call"}
+
+
+def has_unsafe_calls(message):
+    """True if message (complete or aggregated chunk) calls any tool outside SAFE_TOOLS."""
+    tool_calls = getattr(message, "tool_call_chunks", None) or getattr(message, "tool_calls", None) or []
+    return any(tool_call.get("name") and tool_call["name"] not in SAFE_TOOLS for tool_call in tool_calls)
+
+
+class EarlyToolCalls:
+    """Tool calls started while their message was still streamed, by tool call id."""
+
+    executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="early-tool")
+    lock = threading.Lock()
+    results = {}
+
+    @staticmethod
+    def dispatch(tool_call, tools):
+        with EarlyToolCalls.lock:
+            if tool_call["id"] in EarlyToolCalls.results:
+                return
+            EarlyToolCalls.results[tool_call["id"]] = EarlyToolCalls.executor.submit(invoke_tool_native, tool_call, tools)
+
+    @staticmethod
+    def pop(tool_call):
+        """Return ToolMessage of tool call started early, or None if it was not started."""
+        with EarlyToolCalls.lock:
+            future = EarlyToolCalls.results.pop(tool_call["id"], None)
+        if future is None:
+            return None
+        return future.result()
+
+    @staticmethod
+    def clear():
+        """Forget results of early started tool calls which were never used."""
+        with EarlyToolCalls.lock:
+            EarlyToolCalls.results = {}
+
+
+def stream_response(llm, messages, tools=None, on_text=None):
+    """
+    Stream response of llm and return it as complete AIMessage. on_text(text) is called for every piece of text.
+    If tools are provided, safe tool calls are dispatched as soon as they are complete.
+    """
+    aggregated = None
+    for chunk in llm.stream(messages):
+        aggregated = chunk if aggregated is None else aggregated + chunk
+        text = chunk_text(chunk)
+        if text and on_text:
+            on_text(text)
+        # once the message calls a tool with side effects, later reads could see files from before the change
+        if tools and not has_unsafe_calls(aggregated):
+            for tool_call in complete_tool_calls(aggregated):
+                EarlyToolCalls.dispatch(tool_call, tools)
+    if aggregated is None:
+        raise ValueError("LLM returned empty stream.")
+    return message_chunk_to_message(aggregated)
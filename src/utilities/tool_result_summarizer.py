@@ -0,0 +1,122 @@
+"""
+Rolling summarization of old tool results in long agent sessions. Outputs of see_file, list_dir and other tools, as
+well as script and application logs, are replaced by short digests once they are not among the newest ones, so input size does not
+grow with every step. Digests are made by the mini LLM in background, while the main model thinks, and cached by
+content hash, so every output is summarized once. Enabled with SUMMARIZE_OLD_TOOL_RESULTS env variable.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from src.utilities.llms import init_llms_mini
+from src.utilities.util_functions import load_prompt
+from src.tools.rag.index_manifest import content_hash
+
+
+# shorter outputs are not worth a digest
+MIN_CHARS_TO_SUMMARIZE = 2000
+# that many newest results stay verbatim, as agent works with them now
+KEEP_RECENT_RESULTS = 4
+SCRIPT_LOG_MARKER = "[SCRIPT EXECUTION"
+# beginning of application logs message of debugger
+APPLICATION_LOGS_MARKER = "Logs:\n"
+DIGEST_HEADER = "[Digest of earlier {source} output. Full output was removed to save context.]\n"
+
+
+def summarizing_enabled():
+    return bool(os.getenv("SUMMARIZE_OLD_TOOL_RESULTS"))
+
+
+def log_source(message):
+    """'script execution' or 'application logs' for human messages with logs, None for other messages."""
+    if message.type != "human" or not isinstance(message.content, str):
+        return None
+    if message.content.lstrip().startswith(SCRIPT_LOG_MARKER):
+        return "script execution"
+    if message.content.startswith(APPLICATION_LOGS_MARKER):
+        return "application logs"
+    return None
+
+
+def is_summarizable(message):
+    if not isinstance(message.content, str) or len(message.content) < MIN_CHARS_TO_SUMMARIZE:
+        return False
+    return message.type == "tool" or log_source(message) is not None
+
+
+class ToolResultSummarizer:
+    """Digests of tool results shared by the whole process, by content hash, and background jobs making them."""
+
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tool-digest")
+    lock = threading.Lock()
+    MAX_CACHED = 1024
+    digests = OrderedDict()
+    # content hashes of outputs being summarized now, or which summarization failed
+    pending = set()
+    chain = None
+
+    @staticmethod
+    def get_chain():
+        with ToolResultSummarizer.lock:
+            if ToolResultSummarizer.chain is None:
+                prompt = ChatPromptTemplate.from_template(load_prompt("summarize_tool_result"))
+                llms = init_llms_mini(run_name="Tool Result Summarizer")
+                llm = llms[0].with_fallbacks(llms[1:])
+                ToolResultSummarizer.chain = prompt | llm | StrOutputParser()
+            return ToolResultSummarizer.chain
+
+    @staticmethod
+    def schedule(key, source, content):
+        with ToolResultSummarizer.lock:
+            if key in ToolResultSummarizer.digests or key in ToolResultSummarizer.pending:
+                return
+            ToolResultSummarizer.pending.add(key)
+        ToolResultSummarizer.executor.submit(ToolResultSummarizer._summarize, key, source, content)
+
+    @staticmethod
+    def _summarize(key, source, content):
+        try:
+            digest = ToolResultSummarizer.get_chain().invoke({"source": source, "content": content})
+        except Exception:
+            # left in pending, so failing output is not summarized again and stays verbatim
+            return
+        with ToolResultSummarizer.lock:
+            ToolResultSummarizer.digests[key] = digest
+            if len(ToolResultSummarizer.digests) > ToolResultSummarizer.MAX_CACHED:
+                ToolResultSummarizer.digests.popitem(last=False)
+            ToolResultSummarizer.pending.discard(key)
+
+    @staticmethod
+    def get_digest(key):
+        with ToolResultSummarizer.lock:
+            return ToolResultSummarizer.digests.get(key)
+
+    @staticmethod
+    def digested(messages):
+        """
+        Return messages with old results replaced by their digests, if they are ready. Never waits for digests;
+        summarization of old results without digest is started, so they are ready for next steps.
+        """
+        candidates = [i for i, message in enumerate(messages) if is_summarizable(message)]
+        old = candidates[: max(len(candidates) - KEEP_RECENT_RESULTS, 0)]
+        if not old:
+            return messages
+        tool_names = {
+            tool_call["id"]: tool_call["name"]
+            for message in messages
+            for tool_call in getattr(message, "tool_calls", None) or []
+        }
+        messages = list(messages)
+        for i in old:
+            message = messages[i]
+            source = tool_names.get(message.tool_call_id, "tool") if message.type == "tool" else log_source(message)
+            key = content_hash(message.content)
+            digest = ToolResultSummarizer.get_digest(key)
+            if digest is None:
+                ToolResultSummarizer.schedule(key, source, message.content)
+                continue
+            messages[i] = message.model_copy(update={"content": DIGEST_HEADER.format(source=source) + digest})
+        return messages
@@ -0,0 +1,190 @@
+"""
+Lightweight tracing of agent work, to find hot spots in real sessions. Spans are recorded for graph nodes, tool
+calls, LLM calls (with tokens and prompt cache hits) and slow local phases: file contents refresh, syntax check,
+static analysis and screenshots. Enabled with TRACING env variable; spans go to
+.clean_coder/traces/trace_<start time>.jsonl, and summary table is printed at the end of every task.
+"""
+
+import os
+import json
+import time
+import itertools
+import functools
+import threading
+from src.utilities.prompt_caching import cache_usage
+from src.utilities.print_formatters import print_formatted
+from src.utilities.start_work_functions import Work
+
+
+def tracing_enabled():
+    return bool(os.getenv("TRACING"))
+
+
+class Tracer:
+    """Writes finished spans to trace file and sums them up per kind and name for the summary table."""
+
+    lock = threading.Lock()
+    local = threading.local()
+    ids = itertools.count(1)
+    file = None
+    # (kind, name) -> {"count", "seconds", "input_tokens", "output_tokens", "cache_read", "errors"}
+    totals = {}
+
+    @staticmethod
+    def trace_path():
+        folder = os.path.join(Work.dir(), ".clean_coder", "traces")
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, time.strftime("trace_%Y%m%d_%H%M%S.jsonl"))
+
+    @staticmethod
+    def stack():
+        """Ids of spans open in current thread, the innermost last."""
+        if not hasattr(Tracer.local, "stack"):
+            Tracer.local.stack = []
+        return Tracer.local.stack
+
+    @staticmethod
+    def record(span_record):
+        line = json.dumps(span_record, default=str) + "\n"
+        with Tracer.lock:
+            if Tracer.file is None:
+                Tracer.file = open(Tracer.trace_path(), "a", encoding="utf-8")
+            Tracer.file.write(line)
+            Tracer.file.flush()
+            totals = Tracer.totals.setdefault(
+                (span_record["kind"], span_record["name"]),
+                {"count": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0, "cache_read": 0, "errors": 0},
+            )
+            totals["count"] += 1
+            totals["seconds"] += span_record["seconds"]
+            attributes = span_record["attributes"]
+            for key in ("input_tokens", "output_tokens", "cache_read"):
+                totals[key] += attributes.get(key, 0)
+            if span_record["error"]:
+                totals["errors"] += 1
+
+    @staticmethod
+    def pop_totals():
+        with Tracer.lock:
+            totals, Tracer.totals = Tracer.totals, {}
+        return totals
+
+
+class Span:
+    """Timed section of work. Use as context manager; set() adds attributes, as token counts, to it."""
+
+    def __init__(self, kind, name, attributes):
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.id = next(Tracer.ids)
+        stack = Tracer.stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self.id)
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        Tracer.stack().pop()
+        Tracer.record(
+            {
+                "id": self.id,
+                "parent": self.parent,
+                "kind": self.kind,
+                "name": self.name,
+                "start": self.started_at,
+                "seconds": seconds,
+                "thread": threading.current_thread().name,
+                "attributes": self.attributes,
+                "error": f"{exc_type.__name__}: {exc_value}" if exc_type else None,
+            }
+        )
+        return False
+
+
+class NoSpan:
+    """Returned by span() when tracing is disabled, so tracing costs nothing then."""
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NO_SPAN = NoSpan()
+
+
+def span(kind, name, **attributes):
+    """Span of kind 'task', 'node', 'llm', 'tool' or 'phase'."""
+    if not tracing_enabled():
+        return NO_SPAN
+    return Span(kind, name, attributes)
+
+
+def traced(kind, name=None):
+    """Decorator recording every call of function as span, named as the function if name is not provided."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(kind, name or function.__name__):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_llm_usage(llm_span, response):
+    """Add token counts and prompt cache hits of LLM response to its span."""
+    usage = cache_usage(response)
+    if usage is None:
+        return
+    output_tokens = (getattr(response, "usage_metadata", None) or {}).get("output_tokens", 0)
+    llm_span.set(
+        input_tokens=usage["input"] + usage["cache_read"] + usage["cache_write"],
+        output_tokens=output_tokens,
+        cache_read=usage["cache_read"],
+        cache_write=usage["cache_write"],
+    )
+
+
+def trace_summary(totals):
+    """Table of time spent per span kind and name, the most time consuming first."""
+    header = f"{'Kind':<6} {'Name':<34} {'Calls':>6} {'Total s':>9} {'Avg s':>8} {'Tokens in':>10} {'Out':>8} {'Cached':>9}"
+    rows = [header, "-" * len(header)]
+    for (kind, name), stats in sorted(totals.items(), key=lambda item: item[1]["seconds"], reverse=True):
+        errors = f"  ({stats['errors']} failed)" if stats["errors"] else ""
+        rows.append(
+            f"{kind:<6} {name[:34]:<34} {stats['count']:>6} {stats['seconds']:>9.2f} "
+            f"{stats['seconds'] / stats['count']:>8.2f} {stats['input_tokens']:>10} {stats['output_tokens']:>8} "
+            f"{stats['cache_read']:>9}{errors}"
+        )
+    return "\n".join(rows)
+
+
+def traced_task(function):
+    """Decorator of task entry point: traces it as 'task' span and prints summary of all spans when it ends."""
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        try:
+            with span("task", function.__name__):
+                return function(*args, **kwargs)
+        finally:
+            totals = Tracer.pop_totals()
+            if totals:
+                print_formatted("\nTask trace summary:\n" + trace_summary(totals), color="light_blue")
+
+    return wrapper
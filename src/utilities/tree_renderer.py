@@ -0,0 +1,146 @@
+"""
+Rendering of directory tree snapshot within a size budget, so the tree message sent to LLM never grows
+beyond a predictable number of tokens, no matter how big the project is.
+"""
+
+import os
+import math
+import time
+import heapq
+
+
+# rough estimate good enough for budgeting
+CHARS_PER_TOKEN = 4
+DEFAULT_MAX_TOKENS = 3000
+# single directory (except the root) can't take more than that part of the budget
+MAX_DIRECTORY_SHARE = 0.25
+
+SYMLINK_MARK = "🔗 "
+
+TOUCH_HALF_LIFE = 24 * 3600
+MODIFICATION_HALF_LIFE = 7 * 24 * 3600
+
+
+def tree_max_chars():
+    """Size budget of rendered tree, from DIRECTORY_TREE_MAX_TOKENS env variable."""
+    max_tokens = int(os.getenv("DIRECTORY_TREE_MAX_TOKENS") or DEFAULT_MAX_TOKENS)
+    return max_tokens * CHARS_PER_TOKEN
+
+
+def subtree_stats(snapshot):
+    """
+    Return {rel_dir: {"files", "folders", "mtime", "touched"}} aggregated over whole subtree of every directory.
+    mtime is the newest directory mtime in subtree (in seconds), touched is the last time agents worked with it.
+    """
+    stats = {}
+    # deepest directories first, so children are always aggregated before their parents
+    for rel_dir in sorted(snapshot.dirs, key=lambda path: -1 if path == "." else path.count("/"), reverse=True):
+        entry = snapshot.dirs[rel_dir]
+        dir_stats = {
+            "files": len(entry["files"]),
+            # symlinked directories are not entered, but are shown as folders
+            "folders": len(entry["symlinked_dirs"]),
+            "mtime": entry["mtime"] / 1e9,
+            "touched": snapshot.touched.get(rel_dir, 0),
+        }
+        for subdir in snapshot.subdirs(rel_dir):
+            sub_stats = stats[subdir]
+            dir_stats["files"] += sub_stats["files"]
+            dir_stats["folders"] += sub_stats["folders"] + 1
+            dir_stats["mtime"] = max(dir_stats["mtime"], sub_stats["mtime"])
+            dir_stats["touched"] = max(dir_stats["touched"], sub_stats["touched"])
+        stats[rel_dir] = dir_stats
+    return stats
+
+
+def relevance(dir_stats, depth, now):
+    """
+    Higher for directories agents worked with recently, directories with recently created or removed entries,
+    and bigger directories. Deeper directories are less relevant.
+    """
+    score = math.log1p(dir_stats["files"]) - depth
+    if dir_stats["touched"]:
+        score += 4 * 0.5 ** ((now - dir_stats["touched"]) / TOUCH_HALF_LIFE)
+    score += 2 * 0.5 ** (max(now - dir_stats["mtime"], 0) / MODIFICATION_HALF_LIFE)
+    return score
+
+
+def depth_of(rel_dir):
+    return 0 if rel_dir == "." else rel_dir.count("/")
+
+
+def header_line(rel_dir):
+    depth = depth_of(rel_dir)
+    name = "" if rel_dir == "." else os.path.basename(rel_dir)
+    return f"{'│ ' * depth}{'└──' if depth > 0 else ''}📁 {name}"
+
+
+def folded_line(rel_dir, dir_stats):
+    if not dir_stats["files"] and not dir_stats["folders"]:
+        return header_line(rel_dir) + " <Directory is empty>"
+    summary = f"{dir_stats['files']} files"
+    if dir_stats["folders"]:
+        summary += f", {dir_stats['folders']} subfolders"
+    return header_line(rel_dir) + f" <folded: {summary}>"
+
+
+def content_lines(snapshot, rel_dir):
+    """
+    Lines of directory files, shown when directory is unfolded. Symlinked directories are not entered, so they
+    are listed as leaves, after files.
+    """
+    entry = snapshot.dirs[rel_dir]
+    items = entry["files"] + [f"{SYMLINK_MARK}{name}/" for name in entry["symlinked_dirs"]]
+    file_indent = "│ " * (depth_of(rel_dir) + 1)
+    if not items and not entry["dirs"]:
+        return [f"{file_indent}<Directory is empty>"]
+    return [f"{file_indent}{'└── ' if i == len(items) - 1 else '├── '}{item}" for i, item in enumerate(items)]
+
+
+def lines_size(lines):
+    return sum(len(line) + 1 for line in lines)
+
+
+def render_budgeted_tree(snapshot, max_chars):
+    """
+    Render tree which fits max_chars. Starts from everything folded into one-line summaries and unfolds
+    the most relevant directories first, as long as they fit the budget.
+    """
+    title = "Content of directory tree:"
+    if "." not in snapshot.dirs:
+        return title
+    stats = subtree_stats(snapshot)
+    now = time.time()
+    max_directory_chars = max_chars * MAX_DIRECTORY_SHARE
+
+    unfolded = set()
+    used = lines_size([title, folded_line(".", stats["."])])
+    candidates = [(0, ".")]
+    while candidates:
+        _, rel_dir = heapq.heappop(candidates)
+        subdirs = snapshot.subdirs(rel_dir)
+        unfolded_lines = [header_line(rel_dir)] + content_lines(snapshot, rel_dir)
+        unfolded_lines += [folded_line(subdir, stats[subdir]) for subdir in subdirs]
+        cost = lines_size(unfolded_lines) - lines_size([folded_line(rel_dir, stats[rel_dir])])
+        if used + cost > max_chars or (rel_dir != "." and cost > max_directory_chars):
+            continue
+        used += cost
+        unfolded.add(rel_dir)
+        for subdir in subdirs:
+            heapq.heappush(candidates, (-relevance(stats[subdir], depth_of(subdir), now), subdir))
+
+    tree = [title]
+
+    def add_directory(rel_dir):
+        if rel_dir not in unfolded:
+            tree.append(folded_line(rel_dir, stats[rel_dir]))
+            return
+        tree.append(header_line(rel_dir))
+        tree.extend(content_lines(snapshot, rel_dir))
+        for subdir in snapshot.subdirs(rel_dir):
+            add_directory(subdir)
+
+    add_directory(".")
+    rendered = "\n".join(tree)
+    # only possible for budgets too small to fit even the folded root
+    return rendered[:max_chars]
@@ -0,0 +1,166 @@
+"""
+Cached snapshot of project directory tree, so the tree does not need to be walked from scratch every time
+an agent shows it to LLM.
+"""
+
+import os
+import json
+import time
+import threading
+from src.utilities.start_work_functions import CoderIgnore, dir_ignored, file_folder_ignored
+
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FILE = "directory_tree_snapshot.json"
+
+
+class TreeSnapshot:
+    """
+    Listing of every not ignored directory of work dir, stored in .clean_coder/directory_tree_snapshot.json.
+    For every directory keeps its modification time, so on refresh() only directories which mtime changed
+    (something was created, deleted or renamed directly inside them) are listed again; the rest is only stat-ed.
+    Change of .coderignore invalidates the whole snapshot.
+
+    Also remembers when agents last touched (read or modified) files of every directory, as a relevance signal
+    for rendering.
+
+    Rendered tree is memoized per snapshot version, which is bumped on every change of the snapshot.
+    """
+
+    instances = {}
+
+    @staticmethod
+    def for_work_dir(work_dir):
+        """Return snapshot shared by the whole process for provided work dir."""
+        work_dir = os.path.normpath(work_dir)
+        if work_dir not in TreeSnapshot.instances:
+            TreeSnapshot.instances[work_dir] = TreeSnapshot(work_dir)
+        return TreeSnapshot.instances[work_dir]
+
+    def __init__(self, work_dir):
+        self.work_dir = os.path.normpath(work_dir)
+        self.path = os.path.join(self.work_dir, ".clean_coder", SNAPSHOT_FILE)
+        self.lock = threading.Lock()
+        self.version = 0
+        self.rendered = {}
+        self.touched_unsaved = False
+        self.coderignore_mtime, self.dirs, self.touched = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return None, {}, {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            # corrupted snapshot only means the tree needs to be listed again
+            return None, {}, {}
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return None, {}, {}
+        return snapshot.get("coderignore_mtime"), snapshot.get("dirs", {}), snapshot.get("touched", {})
+
+    def save(self):
+        if not os.path.isdir(os.path.dirname(self.path)):
+            # do not create .clean_coder for projects which were not set up yet
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": SNAPSHOT_VERSION,
+                    "coderignore_mtime": self.coderignore_mtime,
+                    "dirs": self.dirs,
+                    "touched": self.touched,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.path)
+        self.touched_unsaved = False
+
+    def mark_touched(self, filename):
+        """Remember that an agent worked with the file. Saved with the next refresh()."""
+        rel_dir = os.path.dirname(os.path.normpath(filename).replace(os.sep, "/")) or "."
+        with self.lock:
+            self.touched[rel_dir] = time.time()
+            self.touched_unsaved = True
+            self.rendered = {}
+
+    def _list_dir(self, rel_dir, abs_dir):
+        """List not ignored content of a directory. Returns None if directory can't be read."""
+        prefix = "" if rel_dir == "." else rel_dir + "/"
+        dirs, symlinked_dirs, files = [], [], []
+        try:
+            with os.scandir(abs_dir) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        if dir_ignored(prefix + entry.name):
+                            continue
+                        dirs.append(entry.name)
+                        # like os.walk, symlinked directories are listed, but not entered
+                        if entry.is_symlink():
+                            symlinked_dirs.append(entry.name)
+                    elif not file_folder_ignored(prefix + entry.name):
+                        files.append(entry.name)
+        except OSError:
+            return None
+        return {"dirs": dirs, "symlinked_dirs": symlinked_dirs, "files": files}
+
+    def refresh(self):
+        """Bring snapshot up to date with work dir. Returns True if anything changed."""
+        with self.lock:
+            CoderIgnore.get_forbidden()
+            changed = False
+            if self.coderignore_mtime != CoderIgnore.mtime:
+                self.coderignore_mtime = CoderIgnore.mtime
+                self.dirs = {}
+                changed = True
+
+            fresh_dirs = {}
+            pending = ["."]
+            while pending:
+                rel_dir = pending.pop()
+                abs_dir = self.work_dir if rel_dir == "." else os.path.join(self.work_dir, rel_dir)
+                try:
+                    mtime = os.stat(abs_dir).st_mtime_ns
+                except OSError:
+                    continue
+                entry = self.dirs.get(rel_dir)
+                if entry is None or entry["mtime"] != mtime:
+                    listing = self._list_dir(rel_dir, abs_dir)
+                    if listing is None:
+                        continue
+                    entry = {"mtime": mtime, **listing}
+                    changed = True
+                fresh_dirs[rel_dir] = entry
+                prefix = "" if rel_dir == "." else rel_dir + "/"
+                pending.extend(prefix + d for d in entry["dirs"] if d not in entry["symlinked_dirs"])
+
+            if changed or fresh_dirs.keys() != self.dirs.keys():
+                self.dirs = fresh_dirs
+                self.version += 1
+                self.rendered = {}
+                self.save()
+                return True
+            if self.touched_unsaved:
+                self.save()
+            return False
+
+    def render(self, renderer, **options):
+        """Return renderer(self, **options) output, memoized until snapshot changes."""
+        key = (getattr(renderer, "__qualname__", repr(renderer)), tuple(sorted(options.items())))
+        with self.lock:
+            if key not in self.rendered:
+                self.rendered[key] = renderer(self, **options)
+            return self.rendered[key]
+
+    def subdirs(self, rel_dir):
+        """Return paths of snapshotted subdirectories of a directory, in listing order."""
+        entry = self.dirs[rel_dir]
+        prefix = "" if rel_dir == "." else rel_dir + "/"
+        return [
+            prefix + d for d in entry["dirs"] if d not in entry["symlinked_dirs"] and prefix + d in self.dirs
+        ]
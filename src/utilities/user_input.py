@@ -1,6 +1,7 @@
 import os
 from src.utilities.print_formatters import print_formatted
 from src.utilities.voice_utils import VoiceRecorder
+from src.utilities.tracing import traced
 import keyboard
 import readline
 
@@ -8,6 +9,7 @@ import readline
 recorder = VoiceRecorder()
 
 
+@traced("phase", "human_input")
 def user_input(prompt=""):
     """Prompt the user for input via keyboard or microphone and return the resulting sentence."""
     print_formatted(prompt + "Or use (m)icrophone to tell:", color="cyan", bold=True)
@@ -1,12 +1,18 @@
 import os
 import base64
+import difflib
 import requests
 from src.utilities.start_work_functions import file_folder_ignored, Work
+from src.utilities.tree_snapshot import TreeSnapshot
+from src.utilities.file_content_cache import FileContentCache
+from src.utilities.tree_renderer import render_budgeted_tree, tree_max_chars
 from src.utilities.print_formatters import print_formatted
+from src.utilities.tracing import traced
+from src.utilities.message_log import MessageLog
 from dotenv import load_dotenv, find_dotenv
 from todoist_api_python.api import TodoistAPI
 from langchain_core.messages import HumanMessage, ToolMessage
-from langchain_core.load import dumps, loads
+from langchain_core.load import loads
 import json
 import click
 
@@ -51,12 +57,14 @@ def check_file_contents(files, work_dir, line_numbers=True):
     Can include line numbers in the output for easier reference when modifying code.
     """
 
-    file_contents = f"Files shown: {[str(f) for f in files]}\n\n"
+    # stable order keeps the message identical between calls, so it can be served from provider prompt cache
+    files = sorted(files, key=lambda file: file.filename)
+    file_contents = [f"Files shown: {[str(f) for f in files]}\n\n"]
     for file_name in files:
         file_content = watch_file(file_name.filename, work_dir, line_numbers)
-        file_contents += file_content + "\n\n###\n\n"
+        file_contents.append(file_content + "\n\n###\n\n")
 
-    return file_contents
+    return "".join(file_contents)
 
 
 def watch_file(filename, work_dir, line_numbers=True):
@@ -64,15 +72,10 @@ def watch_file(filename, work_dir, line_numbers=True):
     if file_folder_ignored(filename):
         return "You are not allowed to work with this file."
     try:
-        with open(join_paths(work_dir, filename), "r", encoding="utf-8") as file:
-            lines = file.readlines()
+        # re-reads and re-formats the file only if it changed since last time
+        file_content = FileContentCache.rendered(join_paths(work_dir, filename), line_numbers)
     except FileNotFoundError:
         return "File not exists."
-    if line_numbers:
-        formatted_lines = [f"{i + 1}|{line.rstrip()} |{i+1}\n" for i, line in enumerate(lines)]
-    else:
-        formatted_lines = [f"{line.rstrip()}\n" for line in lines]
-    file_content = "".join(formatted_lines)
     file_content = filename + ":\n\n" + file_content
 
     return file_content
@@ -146,46 +149,16 @@ def get_joke():
     return joke
 
 
+@traced("phase", "directory_tree")
 def list_directory_tree(work_dir):
     """
     Generate a visual tree representation of the directory structure.
-    Filters out ignored files and folders, and handles large directories gracefully.
+    Filters out ignored files and folders. Tree is read from the snapshot cached in .clean_coder, refreshed only
+    where directories changed, and folded to fit DIRECTORY_TREE_MAX_TOKENS.
     """
-    tree = []
-    # Normalize path to ensure it always ends with a slash in one line
-    work_dir = work_dir + os.sep if not work_dir.endswith(os.sep) else work_dir
-    
-    for root, dirs, files in os.walk(work_dir):
-        # Filter out forbidden directories and files
-        dirs[:] = [d for d in dirs if not file_folder_ignored(d)]
-        files = [f for f in files if not file_folder_ignored(f)]
-        rel_path = os.path.relpath(root, work_dir)
-        depth = rel_path.count(os.sep)
-        indent = "│ " * depth
-
-        # Add current directory to the tree
-        tree.append(f"{indent}{'└──' if depth > 0 else ''}📁 {os.path.basename(root)}")
-
-        # Check if the total number of items exceeds the threshold
-        total_items = len(dirs) + len(files)
-        if total_items > 30:
-            file_indent = "│ " * (depth + 1)
-            tree.append(f"{file_indent}Too many files/folders to display ({total_items} items)")
-            dirs.clear()
-            continue
-        elif total_items == 0:
-            file_indent = "│ " * (depth + 1)
-            tree.append(f"{file_indent}<Directory is empty>")
-            dirs.clear()
-            continue
-
-        # Add files to the tree
-        file_indent = "│ " * (depth + 1)
-        for i, file in enumerate(files):
-            connector = "└── " if i == len(files) - 1 else "├── "
-            tree.append(f"{file_indent}{connector}{file}")
-
-    return "Content of directory tree:\n" + "\n".join(tree)
+    snapshot = TreeSnapshot.for_work_dir(work_dir)
+    snapshot.refresh()
+    return snapshot.render(render_budgeted_tree, max_chars=tree_max_chars())
 
 
 def invoke_tool_native(tool_call, tools):
@@ -199,15 +172,130 @@ def invoke_tool_native(tool_call, tools):
     return ToolMessage(tool_output, tool_call_id=tool_call["id"])
 
 
+@traced("phase", "file_contents_refresh")
 def exchange_file_contents(state, files, work_dir):
-    """Update state messages by replacing old file contents with current file contents."""
-    # Remove old one
-    state["messages"] = [msg for msg in state["messages"] if not hasattr(msg, "contains_file_contents")]
-    # Add new file contents
+    """
+    Update state messages with current file contents. By default replaces old file contents message with a new one.
+    With FILE_CONTENTS_REFRESH=diff, only changes since agent last saw files are appended as a new message, so
+    earlier messages stay untouched and can be served from provider prompt cache.
+    """
+    if os.getenv("FILE_CONTENTS_REFRESH") == "diff":
+        return append_file_contents_delta(state, files, work_dir)
+    return replace_file_contents(state, files, work_dir)
+
+
+def file_contents_indexes(state):
+    """
+    Return indexes of file contents messages, the full one first and deltas after it. They are kept in
+    state["file_contents_indexes"], so messages are searched only if state has no indexes yet or they are outdated.
+    """
+    messages = state["messages"]
+    indexes = state.get("file_contents_indexes")
+    if indexes is None or not all(
+        index < len(messages) and hasattr(messages[index], "contains_file_contents") for index in indexes
+    ):
+        indexes = [i for i, msg in enumerate(messages) if hasattr(msg, "contains_file_contents")]
+        state["file_contents_indexes"] = indexes
+    return indexes
+
+
+def replace_file_contents(state, files, work_dir):
+    """Replace old file contents messages with a new one, showing all files."""
     file_contents = check_file_contents(files, work_dir)
     file_contents = f"Find most actual file contents here:\n\n{file_contents}\nTake a look at line numbers before introducing changes."
-    file_contents_msg = HumanMessage(content=file_contents, contains_file_contents=True)
-    state["messages"].insert(2, file_contents_msg)  # insert after the system and plan msgs
+    file_contents_msg = HumanMessage(
+        content=file_contents, contains_file_contents=True, file_versions=file_versions(files, work_dir)
+    )
+    indexes = file_contents_indexes(state)
+    if not indexes:
+        state["messages"].insert(2, file_contents_msg)  # insert after the system and plan msgs
+        state["file_contents_indexes"] = [2]
+        return state
+    # remove deltas, the latest first so indexes of the rest stay valid, and put new contents in place of old ones
+    for index in sorted(indexes[1:], reverse=True):
+        del state["messages"][index]
+    state["messages"][indexes[0]] = file_contents_msg
+    state["file_contents_indexes"] = [indexes[0]]
+    return state
+
+
+def file_versions(files, work_dir):
+    """Return {filename: lines} of files, None for not existing files. Ignored files are skipped."""
+    versions = {}
+    for file in files:
+        if file_folder_ignored(file.filename):
+            continue
+        try:
+            versions[file.filename] = FileContentCache.lines(join_paths(work_dir, file.filename))
+        except FileNotFoundError:
+            versions[file.filename] = None
+    return versions
+
+
+def format_file_delta(filename, old_lines, new_lines):
+    """Show changed hunks of a file with their new line numbers, or whole file if that is shorter."""
+    if new_lines is None:
+        return f"{filename}:\n\nFile not exists."
+    numbered = [f"{i + 1}|{line.rstrip()} |{i+1}\n" for i, line in enumerate(new_lines)]
+    whole_file = f"{filename}:\n\n" + "".join(numbered)
+    if old_lines is None:
+        return whole_file
+
+    hunks = []
+    for group in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_grouped_opcodes(1):
+        old_start, old_end = group[0][1], group[-1][2]
+        new_start, new_end = group[0][3], group[-1][4]
+        header = f"@@ lines {new_start + 1}-{new_end} (previously {old_start + 1}-{old_end}) @@\n"
+        hunks.append(header + "".join(numbered[new_start:new_end]))
+    shift_note = ""
+    if len(new_lines) != len(old_lines):
+        shift_note = (
+            f"Lines below changed places moved accordingly, file has {len(new_lines)} lines now "
+            f"(previously {len(old_lines)}).\n"
+        )
+    delta = f"{filename} (changed parts only):\n\n" + "".join(hunks) + shift_note
+    return delta if len(delta) < len(whole_file) else whole_file
+
+
+def append_file_contents_delta(state, files, work_dir):
+    """
+    Append message with changes of files since their last version shown to agent. Falls back to full replacement
+    of file contents when there is no known version to compare with, or when deltas grew bigger than half of
+    the full contents message.
+    """
+    indexes = file_contents_indexes(state)
+    file_contents_msgs = [state["messages"][index] for index in indexes]
+    if not file_contents_msgs or not hasattr(file_contents_msgs[0], "file_versions"):
+        return replace_file_contents(state, files, work_dir)
+
+    known_versions = {}
+    for msg in file_contents_msgs:
+        known_versions.update(msg.file_versions)
+    current_versions = file_versions(files, work_dir)
+    changed = {
+        filename: lines
+        for filename, lines in current_versions.items()
+        if filename not in known_versions or known_versions[filename] != lines
+    }
+    if not changed:
+        return state
+
+    deltas = [format_file_delta(filename, known_versions.get(filename), lines) for filename, lines in changed.items()]
+    delta_contents = (
+        "Files changed since you last saw them (other files are unchanged):\n\n"
+        + "\n\n###\n\n".join(deltas)
+        + "\n\nTake a look at line numbers before introducing changes."
+    )
+    deltas_size = len(delta_contents) + sum(len(msg.content) for msg in file_contents_msgs[1:])
+    if deltas_size > len(file_contents_msgs[0].content) / 2:
+        return replace_file_contents(state, files, work_dir)
+
+    state["messages"].append(
+        HumanMessage(
+            content=delta_contents, contains_file_contents=True, file_contents_delta=True, file_versions=changed
+        )
+    )
+    state["file_contents_indexes"] = indexes + [len(state["messages"]) - 1]
     return state
 
 
@@ -215,13 +303,15 @@ def bad_tool_call_looped(state):
     """
     Return True after three consecutive tool messages that start with
     WRONG_TOOL_CALL_WORD, signalling the agent is stuck and should ask
-    the human for help.
+    the human for help. Uses count kept by call_tool in state, if graph has it.
     """
-    last_tool_messages = [m for m in state["messages"] if m.type == "tool"][-3:]
-    tool_not_executed_msgs = [
-        m for m in last_tool_messages if isinstance(m.content, str) and m.content.startswith(WRONG_TOOL_CALL_WORD)
-    ]
-    if len(tool_not_executed_msgs) == 3:
+    wrong_tool_calls_in_row = state.get("wrong_tool_calls_in_row")
+    if wrong_tool_calls_in_row is None:
+        last_tool_messages = [m for m in state["messages"] if m.type == "tool"][-3:]
+        wrong_tool_calls_in_row = len(
+            [m for m in last_tool_messages if isinstance(m.content, str) and m.content.startswith(WRONG_TOOL_CALL_WORD)]
+        )
+    if wrong_tool_calls_in_row >= 3:
         print_formatted(
             "Seems like AI been looped. Please suggest it how to introduce change correctly:", color="yellow"
         )
@@ -269,24 +359,26 @@ def load_prompt(prompt_name):
         return f.read()
 
 def save_state_history_to_disk(state, messages_path):
-    """Save messages from state to disk."""
+    """Save messages from state to disk. Only messages changed since the previous save are written (see message_log)."""
     # remove system message
-    messages = state["messages"][1:]
-    messages_string = dumps(messages)
-    with open(messages_path, "w") as f:
-        json.dump(messages_string, f)
+    MessageLog.for_path(messages_path).save(state["messages"][1:])
 
 
 def load_state_history_from_disk(messages_path):
     """Read messages saved by `save_state_history_to_disk` and recreate them.
 
+    History saved in old format (single JSON file next to messages_path) is converted to the new one.
     Returns an empty list when file does not exist.
     """
-    if not os.path.exists(messages_path):
-        return []
-    with open(messages_path, "r") as f:
-        messages_string = json.load(f)
-    return loads(messages_string)
+    log = MessageLog.for_path(messages_path)
+    legacy_path = os.path.splitext(messages_path)[0] + ".json"
+    if not os.path.exists(messages_path) and legacy_path != messages_path and os.path.exists(legacy_path):
+        with open(legacy_path, "r") as f:
+            messages = loads(json.load(f))
+        log.save(messages)
+        os.remove(legacy_path)
+        return messages
+    return log.load()
 
 
 if __name__ == "__main__":